@@ -0,0 +1,173 @@
+from concurrent.futures import ThreadPoolExecutor
+from json import dump as json_dump, load as json_load
+from os import path, remove, replace
+import threading
+import time
+
+from event_logger import Logger
+from track_types import TrackNotFoundException
+from youtube_quota import QuotaExhaustedException
+
+DEFAULT_BACKFILL_WORKERS = 8
+DEFAULT_PROGRESS_INTERVAL = 10
+BACKFILL_USERNAME = 'playlist backfill'
+
+
+class BackfillCheckpoint:
+    """
+    Record of how far a backfill has got, saved after every page so that a backfill interrupted part-way through
+    resumes from the page it was on rather than from the start
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.page_token = None
+        self.processed = 0
+        self.added = 0
+        self.already_present = 0
+        self.not_found = 0
+        self.failed = 0
+        if path.isfile(filepath):
+            with open(filepath, 'r') as file_in:
+                data = json_load(file_in)
+            self.page_token = data['page_token']
+            self.processed = data['processed']
+            self.added = data['added']
+            self.already_present = data['already_present']
+            self.not_found = data['not_found']
+            self.failed = data['failed']
+
+    @property
+    def is_resumed(self):
+        return self.processed > 0
+
+    def save(self):
+        temp_filepath = self.filepath + '.tmp'
+        with open(temp_filepath, 'w') as file_out:
+            json_dump({
+                'page_token': self.page_token,
+                'processed': self.processed,
+                'added': self.added,
+                'already_present': self.already_present,
+                'not_found': self.not_found,
+                'failed': self.failed
+            }, file_out)
+        replace(temp_filepath, self.filepath)
+
+    def complete(self):
+        """
+        Removes the checkpoint once the backfill has finished, so that the next backfill starts from the beginning.
+        :return: None
+        """
+        if path.isfile(self.filepath):
+            remove(self.filepath)
+
+
+class PlaylistBackfill:
+    """
+    Cross-searches every track in one service's playlist and adds what is found to another service's playlist. The
+    source playlist is streamed a page at a time, the tracks on each page are searched for on a bounded pool of workers
+    (their additions being batched by the target playlist's write buffer), and a checkpoint is saved after every page.
+    The backfill's YouTube calls are refused rather than use the quota reserve, and a page cut short by the quota is
+    done again in full when the backfill resumes.
+    """
+
+    def __init__(self, source_type, source_service, target_type, target_service, checkpoint_filepath,
+                 workers=DEFAULT_BACKFILL_WORKERS, progress_interval=DEFAULT_PROGRESS_INTERVAL, postpone=None):
+        """
+        :param source_type: Track type of the playlist being read from
+        :param source_service: Service object for the source track type
+        :param target_type: Track type of the playlist being added to
+        :param target_service: Service object for the target track type
+        :param checkpoint_filepath: Location of the checkpoint file for this backfill
+        :param workers: Number of tracks searched for and added at once
+        :param progress_interval: Minimum number of seconds between progress reports
+        :param postpone: Callable checked before each page, returning True if the backfill should stop there for now
+        """
+        self.source = source_type(None, None, None, source_service)
+        self.source.deferrable = True
+        self.target_type = target_type
+        self.target_service = target_service
+        self.checkpoint = BackfillCheckpoint(checkpoint_filepath)
+        self.workers = workers
+        self.progress_interval = progress_interval
+        self.postpone = postpone
+        self.quota_refused = threading.Event()
+
+    def backfill_entry(self, entry):
+        """
+        Searches for a single source track on the target service and adds it to the target playlist if found.
+        :param entry: PlaylistEntry from the source playlist
+        :return: One of 'added', 'already_present', 'not_found' or 'failed', or 'postponed' if the quota would not
+        cover it
+        """
+        if self.quota_refused.is_set():
+            return 'postponed'
+        track = self.target_type(None, entry.title, BACKFILL_USERNAME, self.target_service)
+        track.duration_ms = entry.duration_ms
+        track.deferrable = True
+        try:
+            if track.add_self_to_own_playlist():
+                return 'added'
+            return 'already_present'
+        except TrackNotFoundException:
+            return 'not_found'
+        except QuotaExhaustedException:
+            self.quota_refused.set()
+            return 'postponed'
+        except Exception as error:
+            Logger.track_processing_failed(track.service_name, entry.title, error)
+            return 'failed'
+
+    def run(self):
+        """
+        Performs the backfill, resuming from the checkpoint if there is one. Should it be postponed part-way through,
+        or the quota run too low to finish a page, the checkpoint is saved at the page it stopped on.
+        :return: The final BackfillCheckpoint, holding the totals for the whole backfill, or None if it was postponed
+        """
+        checkpoint = self.checkpoint
+        if checkpoint.is_resumed:
+            Logger.backfill_resumed(self.source.service_name, self.target_type.__name__, checkpoint.processed)
+
+        started_at = time.monotonic()
+        processed_at_start = checkpoint.processed
+        last_reported = started_at
+        with ThreadPoolExecutor(max_workers=self.workers) as worker_pool:
+            while True:
+                if self.postpone is not None and self.postpone():
+                    return self.stop_for_now()
+                try:
+                    page = self.source.get_own_playlist_page(checkpoint.page_token)
+                except QuotaExhaustedException:
+                    return self.stop_for_now()
+                outcomes = list(worker_pool.map(self.backfill_entry, page.entries))
+                if self.quota_refused.is_set():
+                    # Tracks from the page already added are found present when it is done again
+                    return self.stop_for_now()
+                for outcome in outcomes:
+                    setattr(checkpoint, outcome, getattr(checkpoint, outcome) + 1)
+                checkpoint.processed += len(page.entries)
+
+                if page.next_page_token is None:
+                    break
+                checkpoint.page_token = page.next_page_token
+                checkpoint.save()
+
+                if time.monotonic() - last_reported >= self.progress_interval:
+                    last_reported = time.monotonic()
+                    Logger.backfill_progress(checkpoint, (checkpoint.processed - processed_at_start) /
+                                             (last_reported - started_at))
+
+        elapsed = time.monotonic() - started_at
+        Logger.backfill_progress(checkpoint, (checkpoint.processed - processed_at_start) / elapsed if elapsed else 0)
+        checkpoint.complete()
+        return checkpoint
+
+    def stop_for_now(self):
+        """
+        Saves the checkpoint at the page the backfill has stopped on, for it to carry on from later.
+        :return: None
+        """
+        self.checkpoint.save()
+        Logger.backfill_postponed(self.source.service_name, self.target_type.__name__, self.checkpoint.processed)
+        return None
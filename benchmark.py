@@ -0,0 +1,219 @@
+"""
+Offline end-to-end benchmark of the bot. A MusicBot is started against in-process stand-ins for Slack, Spotify and
+YouTube (see fake_services.py), synthetic link messages are fed through its RTM connection, and the time from each link
+being posted to its last reaction is measured. No network access or live tokens are needed.
+
+    python benchmark.py [--events 500] [--rate 50] [--latency 0.05] [--error-rate 0.01] [--output report.json]
+
+Reports events handled per second, link-to-reaction latency percentiles and the API calls made per event. Exits with a
+non-zero status if any event was not fully handled before the drain timeout.
+"""
+from argparse import ArgumentParser
+from json import dump as json_dump
+from os import chdir, getcwd, mkdir, path
+from random import Random
+from tempfile import TemporaryDirectory
+import sys
+import threading
+import time
+
+from fake_services import FakeServiceBehaviour, FakeCatalogue, FakeSlackClient, FakeSpotify, FakeYoutube, FAKE_USER_ID
+from metrics import percentile
+from music_bot import MusicBot
+from slack_scheduler import TIER_LIMITS
+
+BENCHMARK_CHANNEL = 'CBENCHMARK'
+
+
+def build_link_events(song, service_name, timestamp):
+    """
+    Builds the events Slack sends when a link is posted: the message itself, then the message_changed event once Slack
+    has unfurled the link.
+    :param song: FakeSong linked to
+    :param service_name: 'Spotify' or 'YouTube'
+    :param timestamp: Timestamp of the message
+    :return: List of the two events' JSON
+    """
+    if service_name == 'Spotify':
+        url = 'https://open.spotify.com/track/{}'.format(song.spotify_id)
+        title = song.title
+    else:
+        url = 'https://www.youtube.com/watch?v={}'.format(song.youtube_id)
+        title = song.video_title
+    message = {'type': 'message', 'user': FAKE_USER_ID, 'text': '<{}>'.format(url), 'ts': timestamp}
+    return [
+        dict(message, channel=BENCHMARK_CHANNEL),
+        {
+            'type': 'message',
+            'subtype': 'message_changed',
+            'channel': BENCHMARK_CHANNEL,
+            'ts': timestamp,
+            'message': dict(message, attachments=[{'service_name': service_name, 'title': title, 'from_url': url}])
+        }
+    ]
+
+
+def build_traffic(catalogue, count, spotify_share, seed):
+    """
+    :return: List of the events for each of the given number of links, to songs picked at random from the catalogue
+    """
+    random = Random(seed)
+    base_seconds = int(time.time())
+    events = []
+    for number in range(count):
+        song = random.choice(catalogue.songs)
+        if song.spotify_id is not None and (song.youtube_id is None or random.random() < spotify_share):
+            service_name = 'Spotify'
+        else:
+            service_name = 'YouTube'
+        # Built as a string rather than from a float, as adding microseconds to a float can repeat a timestamp
+        events.append(build_link_events(song, service_name, '{}.{:06d}'.format(base_seconds, number)))
+    return events
+
+
+def call_count_difference(after, before):
+    return {name: after[name] - before.get(name, 0) for name in after if after[name] - before.get(name, 0)}
+
+
+def run_benchmark(args):
+    """
+    Starts a bot against the stand-in services, feeds it the synthetic link events and waits for them to be handled.
+    :param args: Parsed command line arguments
+    :return: Dictionary holding the report
+    """
+    catalogue = FakeCatalogue(args.catalogue_size, args.missing_rate, args.seed)
+    slack = FakeSlackClient(FakeServiceBehaviour(args.slack_latency, args.jitter, args.error_rate, args.rate_limit_rate,
+                                                 args.seed))
+    spotify = FakeSpotify(catalogue, FakeServiceBehaviour(args.latency, args.jitter, args.error_rate,
+                                                          args.rate_limit_rate, args.seed), args.playlist_size)
+    youtube = FakeYoutube(catalogue, FakeServiceBehaviour(args.latency, args.jitter, args.error_rate,
+                                                          args.rate_limit_rate, args.seed), args.playlist_size)
+    slack_tier_limits = {tier: (rate * args.slack_rate_scale, capacity * args.slack_rate_scale)
+                         for tier, (rate, capacity) in TIER_LIMITS.items()}
+
+    bot = MusicBot(None, youtube, None, None, track_workers=args.track_workers, event_workers=args.event_workers,
+                   metrics_port=None, slack_service=slack, spotify_service=spotify,
+                   slack_tier_limits=slack_tier_limits, youtube_daily_quota=args.youtube_quota)
+    bot_thread = threading.Thread(target=bot.start, daemon=True, name='benchmark-bot')
+    started_at = time.monotonic()
+    bot_thread.start()
+    while not slack.connected.wait(0.1):
+        if not bot_thread.is_alive() or time.monotonic() - started_at > args.drain_timeout:
+            raise RuntimeError('Bot failed to start')
+    startup_seconds = time.monotonic() - started_at
+
+    calls_before = {'slack': slack.behaviour.call_counts(), 'spotify': spotify.behaviour.call_counts(),
+                    'youtube': youtube.behaviour.call_counts()}
+    quota_remaining_before = bot.youtube_quota.remaining()
+    expected_reactions = len(bot.track_type_map)
+    events = build_traffic(catalogue, args.events, args.spotify_share, args.seed)
+    posted_at = {}
+
+    first_posted_at = time.monotonic()
+    for number, link_events in enumerate(events):
+        if args.rate:
+            delay = first_posted_at + number / args.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        posted_at[link_events[0]['ts']] = time.monotonic()
+        slack.push_events(link_events)
+
+    latencies = {}
+    last_progress_at = time.monotonic()
+    while len(latencies) < len(events) and time.monotonic() - last_progress_at < args.drain_timeout:
+        for timestamp in posted_at:
+            if timestamp not in latencies:
+                reactions = slack.reactions_for(timestamp)
+                if len(reactions) >= expected_reactions:
+                    latencies[timestamp] = max(added_at for _, added_at in reactions) - posted_at[timestamp]
+                    last_progress_at = time.monotonic()
+        time.sleep(0.01)
+    finished_at = max([posted_at[timestamp] + latency for timestamp, latency in latencies.items()] or
+                      [time.monotonic()])
+
+    bot.stop()
+    bot_thread.join(args.drain_timeout)
+    bot.event_dispatcher.join()
+    bot.shutdown()
+
+    calls_after = {'slack': slack.behaviour.call_counts(), 'spotify': spotify.behaviour.call_counts(),
+                   'youtube': youtube.behaviour.call_counts()}
+    calls = {service: call_count_difference(calls_after[service], calls_before[service]) for service in calls_after}
+    youtube_quota_units = quota_remaining_before - bot.youtube_quota.remaining()
+    sorted_latencies = sorted(latencies.values())
+    return {
+        'events': len(events),
+        'completed': len(latencies),
+        'startup_seconds': startup_seconds,
+        'events_per_second': len(latencies) / (finished_at - first_posted_at) if latencies else 0,
+        'latency_seconds': {
+            'p50': percentile(sorted_latencies, 0.5),
+            'p90': percentile(sorted_latencies, 0.9),
+            'p99': percentile(sorted_latencies, 0.99),
+            'max': sorted_latencies[-1] if sorted_latencies else None
+        },
+        'calls': calls,
+        'calls_per_event': {service: sum(service_calls.values()) / len(events)
+                            for service, service_calls in calls.items()},
+        'youtube_quota_units': youtube_quota_units,
+        'youtube_quota_units_per_event': youtube_quota_units / len(events)
+    }
+
+
+def print_report(report):
+    print('{} of {} events handled, {:.1f} events/s (startup {:.2f} s)'.format(
+        report['completed'], report['events'], report['events_per_second'], report['startup_seconds']))
+    print('link to last reaction: ' + ', '.join(
+        '{} {}'.format(name, '-' if seconds is None else '{:.1f} ms'.format(seconds * 1000))
+        for name, seconds in report['latency_seconds'].items()))
+    for service, service_calls in report['calls'].items():
+        print('{:<8} {:>6.2f} calls/event  {}'.format(
+            service, report['calls_per_event'][service],
+            ', '.join('{} {}'.format(name, count) for name, count in sorted(service_calls.items()))))
+    print('YouTube quota: {} units, {:.1f} units/event'.format(report['youtube_quota_units'],
+                                                               report['youtube_quota_units_per_event']))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Offline benchmark of the bot against stand-in Slack, Spotify and YouTube')
+    parser.add_argument('--events', type=int, default=500, help='Number of link messages posted')
+    parser.add_argument('--rate', type=float, default=50, help='Link messages posted per second, 0 for all at once')
+    parser.add_argument('--spotify-share', type=float, default=0.5, help='Fraction of links that are Spotify links')
+    parser.add_argument('--catalogue-size', type=int, default=5000, help='Number of songs known to the services')
+    parser.add_argument('--playlist-size', type=int, default=1000, help='Number of songs already in each playlist')
+    parser.add_argument('--missing-rate', type=float, default=0.1,
+                        help='Fraction of songs missing from one of the services')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds taken by each Spotify or YouTube call')
+    parser.add_argument('--slack-latency', type=float, default=0.02, help='Seconds taken by each Slack call')
+    parser.add_argument('--jitter', type=float, default=0.02, help='Most seconds added at random to each call')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls failing with a server error')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of calls rejected with a 429')
+    parser.add_argument('--slack-rate-scale', type=float, default=100,
+                        help="Multiple of Slack's real rate limits the bot is held to, 1 for the real limits")
+    parser.add_argument('--youtube-quota', type=int, default=10 ** 9,
+                        help='Daily YouTube quota the bot is held to, by default too large to run out')
+    parser.add_argument('--event-workers', type=int, default=4, help='Number of event workers')
+    parser.add_argument('--track-workers', type=int, default=4, help='Number of track workers')
+    parser.add_argument('--drain-timeout', type=float, default=30,
+                        help='Seconds to wait without progress before giving up on unhandled events')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the catalogue, traffic and failures')
+    parser.add_argument('--output', help='Filepath to write the report to as JSON, for comparison between runs')
+    args = parser.parse_args()
+
+    output_filepath = path.abspath(args.output) if args.output else None
+    original_directory = getcwd()
+    # The bot keeps its mirror, cache and event logs in the working directory, so it is run in an empty one
+    with TemporaryDirectory() as working_directory:
+        chdir(working_directory)
+        mkdir('changelogs')
+        try:
+            benchmark_report = run_benchmark(args)
+        finally:
+            chdir(original_directory)
+
+    print_report(benchmark_report)
+    if output_filepath is not None:
+        with open(output_filepath, 'w') as file_out:
+            json_dump(benchmark_report, file_out, indent=2)
+
+    sys.exit(0 if benchmark_report['completed'] == benchmark_report['events'] else 1)
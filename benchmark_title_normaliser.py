@@ -0,0 +1,79 @@
+"""
+Checks the title normalisation engine against the golden title corpus, then times it. Exits with a non-zero status if
+any title in the corpus no longer normalises to its expected form, so rule changes can be checked for accuracy as well
+as speed.
+
+    python benchmark_title_normaliser.py [--titles 10000] [--corpus title_corpus.json]
+"""
+from argparse import ArgumentParser
+from json import load as json_load
+from re import sub as regex_substitute
+import sys
+import time
+
+from title_normaliser import normalise_title, normalise_titles
+
+DEFAULT_CORPUS_LOCATION = 'title_corpus.json'
+
+
+def legacy_format_spotify_search_string(search_string):
+    """
+    The normalisation previously used ahead of Spotify searches, kept as the baseline for timings.
+    """
+    search_string = search_string.lower()
+    search_string = regex_substitute(r' *\[[^)]*\] *', '', search_string)
+    search_string = regex_substitute(r'\(.*official.*\)', '', search_string)
+    search_string = regex_substitute(r'\(.*lyric.*\)', '', search_string)
+    search_string = regex_substitute(r'\(.*new.*\)', '', search_string)
+    return search_string
+
+
+def check_corpus(corpus):
+    """
+    :param corpus: List of [title, expected normalised title] pairs
+    :return: List of (title, expected, actual) for each title that did not normalise as expected
+    """
+    failures = []
+    for title, expected in corpus:
+        actual = normalise_title(title)
+        if actual != expected:
+            failures.append((title, expected, actual))
+    return failures
+
+
+def time_titles(function, titles):
+    started_at = time.perf_counter()
+    function(titles)
+    return time.perf_counter() - started_at
+
+
+def report(label, seconds, title_count):
+    print('{:<32} {:>9.1f} ms {:>12,.0f} titles/s'.format(label, seconds * 1000, title_count / seconds))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Accuracy check and micro-benchmark for the title normalisation engine')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_LOCATION, help='Golden title corpus filepath')
+    parser.add_argument('--titles', type=int, default=10000, help='Number of titles to normalise in each timing')
+    args = parser.parse_args()
+
+    with open(args.corpus, 'r', encoding='utf-8') as file_in:
+        golden_corpus = json_load(file_in)
+
+    corpus_failures = check_corpus(golden_corpus)
+    for failed_title, expected_title, actual_title in corpus_failures:
+        print('MISMATCH {!r}: expected {!r}, got {!r}'.format(failed_title, expected_title, actual_title))
+    print('{} of {} golden titles normalised as expected'.format(len(golden_corpus) - len(corpus_failures),
+                                                                 len(golden_corpus)))
+
+    # Every title is made unique so that the first timing measures the rules rather than the memoisation
+    benchmark_titles = ['{} {}'.format(golden_corpus[index % len(golden_corpus)][0], index)
+                        for index in range(args.titles)]
+
+    report('legacy regex chain', time_titles(lambda titles: [legacy_format_spotify_search_string(title)
+                                                             for title in titles], benchmark_titles), args.titles)
+    normalise_title.cache_clear()
+    report('engine, cold', time_titles(normalise_titles, benchmark_titles), args.titles)
+    report('engine, memoised', time_titles(normalise_titles, benchmark_titles), args.titles)
+
+    sys.exit(1 if corpus_failures else 0)
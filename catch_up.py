@@ -0,0 +1,160 @@
+from collections import Counter
+from json import dump as json_dump, load as json_load
+from os import path, replace
+import threading
+import time
+
+DEFAULT_CURSORS_LOCATION = 'channel_cursors.json'
+DEFAULT_CURSOR_SAVE_INTERVAL = 10
+DEFAULT_HISTORY_PAGE_SIZE = 200
+DEFAULT_MAX_CATCH_UP_AGE = 24 * 60 * 60
+
+
+class ChannelCursors:
+    """
+    The timestamp of the latest message the bot has handled in each channel, written to disk so that it survives
+    restarts. Used after a disconnection to ask Slack for only the messages posted since. Messages are recorded as in
+    flight from when they are queued until they have been handled, and a channel's cursor never passes one still in
+    flight, so every message up to the cursor has been dealt with. Messages handled ahead of one still in flight are
+    remembered individually until the cursor catches up with them.
+    """
+
+    def __init__(self, filepath=DEFAULT_CURSORS_LOCATION, save_interval=DEFAULT_CURSOR_SAVE_INTERVAL):
+        """
+        :param filepath: Location of the file the cursors are persisted to. None to keep them in memory only.
+        :param save_interval: Minimum number of seconds between writes of the cursors to disk
+        """
+        self.filepath = filepath
+        self.save_interval = save_interval
+        self.cursors = {}
+        self.handled_ahead = {}
+        self.in_flight = {}
+        self.last_saved = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.load()
+
+    def begin(self, channel, timestamp):
+        """
+        Records a message as in flight, queued to be handled.
+        :param channel: The channel the message was posted in
+        :param timestamp: Timestamp of the message
+        :return: None
+        """
+        with self.lock:
+            in_flight = self.in_flight.setdefault(channel, Counter())
+            in_flight[timestamp] += 1
+
+    def complete(self, channel, timestamp, handled=True, save_now=False):
+        """
+        Records a message as no longer in flight, moving the channel's cursor up to the latest handled message that no
+        message still in flight precedes.
+        :param channel: The channel the message was posted in
+        :param timestamp: Timestamp of the message
+        :param handled: Whether the message was handled, rather than given up on after an error
+        :param save_now: Whether to write the cursors to disk straight away, rather than once the save interval is up
+        :return: None
+        """
+        with self.lock:
+            in_flight = self.in_flight.get(channel, Counter())
+            if in_flight[timestamp] > 1:
+                in_flight[timestamp] -= 1
+            else:
+                del in_flight[timestamp]
+            if handled and not self._is_handled(channel, timestamp):
+                self.handled_ahead.setdefault(channel, set()).add(timestamp)
+                self.dirty = True
+            self._advance(channel)
+        if save_now or time.time() - self.last_saved >= self.save_interval:
+            self.save()
+
+    def _advance(self, channel):
+        handled_ahead = self.handled_ahead.get(channel)
+        if not handled_ahead:
+            return
+        in_flight = self.in_flight.get(channel)
+        limit = min(float(timestamp) for timestamp in in_flight) if in_flight else None
+        passed = [timestamp for timestamp in handled_ahead if limit is None or float(timestamp) < limit]
+        if passed:
+            self.cursors[channel] = max(passed, key=float)
+            handled_ahead.difference_update(passed)
+
+    def is_handled(self, channel, timestamp):
+        """
+        :param channel: The channel the message was posted in
+        :param timestamp: Timestamp of the message
+        :return: Whether the message is at or before the channel's cursor, or has been handled ahead of it
+        """
+        with self.lock:
+            return self._is_handled(channel, timestamp)
+
+    def _is_handled(self, channel, timestamp):
+        if channel in self.cursors and float(self.cursors[channel]) >= float(timestamp):
+            return True
+        return timestamp in self.handled_ahead.get(channel, ())
+
+    def items(self):
+        """
+        :return: List of (channel, timestamp of the latest message handled in it)
+        """
+        with self.lock:
+            return list(self.cursors.items())
+
+    def load(self):
+        if self.filepath is None or not path.isfile(self.filepath):
+            return
+        with open(self.filepath, 'r') as file_in:
+            data = json_load(file_in)
+        if 'cursors' not in data:
+            # Saved before messages handled ahead of the cursor were kept, as a plain dictionary of cursors
+            data = {'cursors': data, 'handled_ahead': {}}
+        with self.lock:
+            self.cursors.update(data['cursors'])
+            for channel, timestamps in data['handled_ahead'].items():
+                self.handled_ahead.setdefault(channel, set()).update(timestamps)
+
+    def save(self):
+        """
+        Writes the cursors to disk, if they have changed since they were last saved.
+        :return: None
+        """
+        with self.save_lock:
+            with self.lock:
+                self.last_saved = time.time()
+                if self.filepath is None or not self.dirty:
+                    return
+                data = {'cursors': dict(self.cursors),
+                        'handled_ahead': {channel: sorted(timestamps, key=float)
+                                          for channel, timestamps in self.handled_ahead.items() if timestamps}}
+                self.dirty = False
+            temp_filepath = self.filepath + '.tmp'
+            with open(temp_filepath, 'w') as file_out:
+                json_dump(data, file_out)
+            replace(temp_filepath, self.filepath)
+
+
+def fetch_missed_messages(api_call, channel, oldest, page_size=DEFAULT_HISTORY_PAGE_SIZE):
+    """
+    Reads every message posted to a channel after the given timestamp, paging through conversations.history.
+    :param api_call: Callable used to make Slack API calls, taking the method name and keyword arguments
+    :param channel: The channel to read
+    :param oldest: Timestamp after which messages are read
+    :param page_size: Number of messages requested per page
+    :return: List of the messages' event JSON, oldest first, each with the channel filled in as RTM events have it
+    """
+    messages = []
+    cursor = None
+    while True:
+        response = api_call('conversations.history', channel=channel, oldest=oldest, inclusive=False,
+                            limit=page_size, cursor=cursor)
+        if response is None or not response.get('ok', False):
+            raise RuntimeError('conversations.history failed for {}: {}'.format(
+                channel, None if response is None else response.get('error')))
+        messages.extend(dict(message, channel=channel) for message in response['messages'])
+        cursor = response.get('response_metadata', {}).get('next_cursor')
+        if not response.get('has_more') or not cursor:
+            break
+    # Slack returns the newest messages first
+    messages.sort(key=lambda message: float(message['ts']))
+    return messages
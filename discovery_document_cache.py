@@ -0,0 +1,55 @@
+from hashlib import sha1
+from os import makedirs, path, replace
+import time
+
+from googleapiclient.discovery_cache.base import Cache
+
+DEFAULT_DISCOVERY_CACHE_LOCATION = 'discovery_cache'
+DEFAULT_DISCOVERY_MAX_AGE = 7 * 24 * 60 * 60
+
+
+class DiskDiscoveryCache(Cache):
+    """
+    Keeps the discovery documents googleapiclient builds its service clients from on disk, so that building the YouTube
+    client at startup does not fetch its document over the network every time. Passed to discovery.build as its cache;
+    documents older than the max age are fetched again.
+    """
+
+    def __init__(self, directory=DEFAULT_DISCOVERY_CACHE_LOCATION, max_age=DEFAULT_DISCOVERY_MAX_AGE):
+        """
+        :param directory: Directory the documents are kept in, created when the first one is stored
+        :param max_age: Number of seconds a document is used for before it is fetched again
+        """
+        self.directory = directory
+        self.max_age = max_age
+
+    def get_filepath(self, url):
+        return path.join(self.directory, sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url):
+        """
+        :param url: URL the discovery document is fetched from
+        :return: The document's content, or None if it is not held or has expired
+        """
+        filepath = self.get_filepath(url)
+        try:
+            if time.time() - path.getmtime(filepath) > self.max_age:
+                return None
+            with open(filepath, 'r', encoding='utf-8') as file_in:
+                return file_in.read()
+        except OSError:
+            return None
+
+    def set(self, url, content):
+        """
+        Stores a freshly fetched discovery document, writing it to a temporary file first so that a document is never
+        read half-written.
+        :param url: URL the discovery document was fetched from
+        :param content: The document's content
+        :return: None
+        """
+        filepath = self.get_filepath(url)
+        makedirs(self.directory, exist_ok=True)
+        with open(filepath + '.tmp', 'w', encoding='utf-8') as file_out:
+            file_out.write(content)
+        replace(filepath + '.tmp', filepath)
@@ -0,0 +1,118 @@
+from queue import Queue
+import threading
+import time
+
+from event_logger import Logger
+from metrics import EVENT_QUEUE_WAIT_SECONDS
+
+DEFAULT_EVENT_WORKERS = 4
+DEFAULT_MAX_QUEUED_EVENTS = 1000
+
+
+class QueuedEvent:
+    """
+    An event waiting to be handled, along with when it was put on the queue
+    """
+
+    def __init__(self, event, enqueued_at):
+        self.event = event
+        self.enqueued_at = enqueued_at
+
+
+class EventDispatcher:
+    """
+    Hands events read from the RTM connection over to a pool of worker threads, so that slow handling of one event
+    never holds up reading the next. Each worker has its own bounded queue: events sharing an ordering key (such as
+    the timestamp of the message they relate to) always go to the same worker and are handled in the order they were
+    read, while events without one go to whichever worker has the least waiting.
+    """
+
+    def __init__(self, handler, workers=DEFAULT_EVENT_WORKERS, max_queued_events=DEFAULT_MAX_QUEUED_EVENTS):
+        """
+        :param handler: Callable invoked on a worker thread with each event
+        :param workers: Number of worker threads handling events
+        :param max_queued_events: Total number of events that can be waiting before the reader blocks
+        """
+        self.handler = handler
+        queue_size = max(1, max_queued_events // workers)
+        self.queues = [Queue(maxsize=queue_size) for _ in range(workers)]
+        self.stats_lock = threading.Lock()
+        self.events_handled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.threads = []
+        for worker_number, queue in enumerate(self.queues):
+            thread = threading.Thread(target=self._work, args=(queue,), daemon=True,
+                                      name='event-worker-{}'.format(worker_number))
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, event, ordering_key=None):
+        """
+        Queues an event for handling, blocking if the relevant worker's queue is full.
+        :param event: The event to be handled
+        :param ordering_key: Events with equal keys are handled in order by the same worker. None if order is irrelevant
+        :return: None
+        """
+        if ordering_key is not None:
+            queue = self.queues[hash(ordering_key) % len(self.queues)]
+        else:
+            queue = min(self.queues, key=Queue.qsize)
+        queue.put(QueuedEvent(event, time.monotonic()))
+
+    def _work(self, queue):
+        while True:
+            queued_event = queue.get()
+            if queued_event is None:
+                queue.task_done()
+                return
+            wait = time.monotonic() - queued_event.enqueued_at
+            EVENT_QUEUE_WAIT_SECONDS.observe(wait)
+            with self.stats_lock:
+                self.events_handled += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            try:
+                self.handler(queued_event.event)
+            except Exception as error:
+                Logger.event_handling_failed(queued_event.event, error)
+            finally:
+                queue.task_done()
+
+    def depth(self):
+        """
+        :return: Total number of events currently waiting to be handled
+        """
+        return sum(queue.qsize() for queue in self.queues)
+
+    def stats(self):
+        """
+        :return: Dictionary of the current queue depth, and the number of events handled and the average and longest
+        time they spent waiting in the queue
+        """
+        with self.stats_lock:
+            return {
+                'depth': self.depth(),
+                'workers': len(self.queues),
+                'handled': self.events_handled,
+                'average_wait': self.total_wait / self.events_handled if self.events_handled else 0.0,
+                'max_wait': self.max_wait
+            }
+
+    def join(self):
+        """
+        Blocks until every event queued so far has been handled.
+        :return: None
+        """
+        for queue in self.queues:
+            queue.join()
+
+    def stop(self):
+        """
+        Lets the workers finish the events already queued, then shuts them down.
+        :return: None
+        """
+        for queue in self.queues:
+            queue.put(None)
+        for thread in self.threads:
+            thread.join()
@@ -1,5 +1,4 @@
-from json import dumps as json_dumpstring
-import time
+OUTCOME_EVENT_TYPE = 'musicbot_outcome'
 
 
 class Logger:
@@ -7,8 +6,11 @@ class Logger:
     Utility class used to handle server-side logging in the event of certain actions
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, event_sink=None):
+        """
+        :param event_sink: EventSink to which received events are logged. Events are not logged if none is provided.
+        """
+        self.event_sink = event_sink
 
     @staticmethod
     def song_added(song, playlist_id):
@@ -83,12 +85,44 @@ class Logger:
         pass
 
     @staticmethod
-    def log_event_to_file(event):
+    def failed_to_find_relevant_track(service_name, title):
+        """
+        Server logging when a cross-search fails to return a track to add to the service's playlist.
+        """
+        print('{} Service search for {} did not bring back an appropriate track.'.format(service_name, title))
+        pass
+
+    @staticmethod
+    def track_processing_failed(service_name, title, error):
         """
-        Logging of received event JSON to file.
+        Server logging when adding a track to a service's playlist fails for any reason other than it not being found.
         """
-        with open('eventlogs/{}.json'.format(time.time()), 'w') as event_write:
-            event_write.write(json_dumpstring(event))
+        print('Adding {} to the {} playlist failed: {!r}'.format(title, service_name, error))
+        pass
+
+    @staticmethod
+    def track_metadata_unavailable(service_name, title, error):
+        """
+        Server logging when the details of a track could not be read, so it is matched across services by title alone.
+        """
+        print('Could not read the {} details of {}, matching by title alone: {!r}'.format(service_name, title, error))
+        pass
+
+    def log_event_to_file(self, event):
+        """
+        Logging of received event JSON to file, through the event sink's background writer.
+        """
+        if self.event_sink is not None:
+            self.event_sink.write(event)
+        pass
+
+    def log_outcome_to_file(self, timestamp, outcomes):
+        """
+        Logging of what became of the track posted in a message to file, alongside the received events, so that a
+        replay of the events can be compared against it.
+        """
+        if self.event_sink is not None:
+            self.event_sink.write({'type': OUTCOME_EVENT_TYPE, 'ts': timestamp, 'outcomes': outcomes})
         pass
 
     @staticmethod
@@ -98,3 +132,170 @@ class Logger:
         """
         print('Request for contents of {} playlist received.'.format(service_name))
         pass
+
+    @staticmethod
+    def event_handling_failed(event, error):
+        """
+        Server logging when handling of an event raises, so that one bad event does not take down its worker.
+        """
+        print('Handling of {} event failed: {!r}'.format(event.get('type'), error))
+        pass
+
+    @staticmethod
+    def event_queue_stats(stats):
+        """
+        Server logging of the state of the queue between the RTM reader and the event workers.
+        """
+        print('Event queue: {depth} waiting across {workers} workers, {handled} handled, '
+              '{average_wait:.3f}s average wait, {max_wait:.3f}s longest wait.'.format(**stats))
+        pass
+
+    @staticmethod
+    def user_directory_refresh_failed(error):
+        """
+        Server logging when the background reload of the Slack user directory fails. The existing directory is kept.
+        """
+        print('Refreshing the user directory failed, keeping the existing one: {!r}'.format(error))
+        pass
+
+    @staticmethod
+    def slack_rate_limited(method, retry_after):
+        """
+        Server logging when Slack rejects a call as rate limited. The call is retried once the wait has passed.
+        """
+        print('Slack rate limited {}, retrying after {} seconds.'.format(method, retry_after))
+        pass
+
+    @staticmethod
+    def cross_search_candidate_rejected(service_name, title, candidate_title, score):
+        """
+        Server logging when the best result of a cross-search is not a close enough match to be added.
+        """
+        print('{} search for {} rejected its best match {} (score {:.2f}).'.format(service_name, title,
+                                                                                  candidate_title, score))
+        pass
+
+    @staticmethod
+    def backfill_resumed(source_service_name, target_type_name, processed):
+        """
+        Server logging when a backfill picks up from a checkpoint left by an earlier, interrupted, run.
+        """
+        print('Resuming backfill from {} ({}) after {} tracks.'.format(source_service_name, target_type_name,
+                                                                       processed))
+        pass
+
+    @staticmethod
+    def backfill_postponed(source_service_name, target_type_name, processed):
+        """
+        Server logging when a backfill stops part-way through to be carried on later.
+        """
+        print('Postponing backfill from {} ({}) after {} tracks.'.format(source_service_name, target_type_name,
+                                                                         processed))
+        pass
+
+    @staticmethod
+    def backfill_failed(source_service_name, target_service_name, error):
+        """
+        Server logging when a backfill stops on an error, leaving its checkpoint to be resumed from.
+        """
+        print('Backfill from {} to {} failed: {!r}'.format(source_service_name, target_service_name, error))
+        pass
+
+    @staticmethod
+    def backfill_progress(checkpoint, tracks_per_second):
+        """
+        Server logging of the progress of a running backfill.
+        """
+        print('Backfill: {} tracks checked ({:.1f}/s), {} added, {} already present, {} not found, {} failed.'
+              .format(checkpoint.processed, tracks_per_second, checkpoint.added, checkpoint.already_present,
+                      checkpoint.not_found, checkpoint.failed))
+        pass
+
+    @staticmethod
+    def jobs_resumed(count):
+        """
+        Server logging when tracks left unfinished by an earlier run of the bot are picked up again.
+        """
+        print('Resuming {} unfinished track job(s) from before the restart.'.format(count))
+        pass
+
+    @staticmethod
+    def job_resume_failed(timestamp, error):
+        """
+        Server logging when a job left unfinished by an earlier run of the bot could not be resumed.
+        """
+        print('Resuming the job for message {} failed: {!r}'.format(timestamp, error))
+        pass
+
+    @staticmethod
+    def jobs_retried(count):
+        """
+        Server logging when tracks whose processing failed part-way through are picked up again after their backoff.
+        """
+        print('Retrying {} failed track job(s).'.format(count))
+        pass
+
+    @staticmethod
+    def job_retry_failed(error):
+        """
+        Server logging when checking for failed jobs due to be retried fails.
+        """
+        print('Checking for failed track jobs to retry failed: {!r}'.format(error))
+        pass
+
+    @staticmethod
+    def startup_report(startup_timer):
+        """
+        Server logging of how long each stage of startup took, once the bot has first connected.
+        """
+        print('Started in {:.3f} s: {}.'.format(startup_timer.total(), ', '.join(
+            '{} {:.3f} s'.format(stage, seconds) for stage, seconds in startup_timer.stages)))
+        pass
+
+    @staticmethod
+    def warm_up_failed(stage, error):
+        """
+        Server logging when a stage of the startup work done in the background fails.
+        """
+        print('Startup stage {} failed, carrying on without it: {!r}'.format(stage, error))
+        pass
+
+    @staticmethod
+    def connection_failed():
+        """
+        Server logging when Slack refuses the RTM connection.
+        """
+        print('Unable to communicate through connection.')
+        pass
+
+    @staticmethod
+    def connection_lost(error):
+        """
+        Server logging when the RTM connection drops.
+        """
+        print('Connection to Slack lost: {!r}'.format(error))
+        pass
+
+    @staticmethod
+    def reconnecting(attempts, delay):
+        """
+        Server logging ahead of each attempt to reconnect to Slack.
+        """
+        print('Attempting reconnect number {} in {:.1f} s (No news is good news)'.format(attempts, delay))
+        pass
+
+    @staticmethod
+    def caught_up(channel, count):
+        """
+        Server logging when messages missed while disconnected have been read back from a channel's history.
+        """
+        print('Caught up on {} message(s) in {} posted while disconnected.'.format(count, channel))
+        pass
+
+    @staticmethod
+    def catch_up_failed(channel, error):
+        """
+        Server logging when the history of a channel could not be read back after reconnecting.
+        """
+        print('Catching up on {} failed: {!r}'.format(channel, error))
+        pass
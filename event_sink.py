@@ -0,0 +1,140 @@
+from json import dumps as json_dumpstring, loads as json_loadstring
+from os import listdir, makedirs, path, remove
+from queue import Queue, Empty
+import gzip
+import shutil
+import threading
+import time
+
+DEFAULT_EVENT_LOG_LOCATION = 'eventlogs/'
+DEFAULT_MAX_SEGMENT_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_SEGMENT_AGE = 24 * 60 * 60
+DEFAULT_MAX_BATCH_SIZE = 500
+SEGMENT_PREFIX = 'events-'
+SEGMENT_SUFFIX = '.jsonl'
+COMPRESSED_SUFFIX = '.gz'
+
+
+class EventSink:
+    """
+    Append-only log of received events, written as one JSON object per line into segment files. Writing happens on a
+    background thread in batches, so logging an event never waits on the disk. A segment is closed and a new one begun
+    once it reaches a maximum size or age, and closed segments can optionally be compressed.
+    """
+
+    def __init__(self, directory=DEFAULT_EVENT_LOG_LOCATION, max_segment_bytes=DEFAULT_MAX_SEGMENT_BYTES,
+                 max_segment_age=DEFAULT_MAX_SEGMENT_AGE, compress=False, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+        """
+        :param directory: Directory the segment files are written to
+        :param max_segment_bytes: Size in bytes at which the current segment is closed
+        :param max_segment_age: Number of seconds after which the current segment is closed
+        :param compress: Whether closed segments are gzipped
+        :param max_batch_size: Largest number of events written to disk at once
+        """
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.compress = compress
+        self.max_batch_size = max_batch_size
+        self.queue = Queue()
+        self.segment_file = None
+        self.segment_path = None
+        self.segment_opened_at = None
+        self.segment_count = 0
+        makedirs(directory, exist_ok=True)
+        self.writer_thread = threading.Thread(target=self._write_events, daemon=True, name='event-sink-writer')
+        self.writer_thread.start()
+
+    def write(self, event):
+        """
+        Queues an event to be appended to the log.
+        :param event: The JSON-serialisable event
+        :return: None
+        """
+        self.queue.put(event)
+
+    def close(self):
+        """
+        Writes every event queued so far, then closes the current segment.
+        :return: None
+        """
+        self.queue.put(None)
+        self.writer_thread.join()
+
+    def _write_events(self):
+        closing = False
+        while not closing:
+            try:
+                batch = [self.queue.get(timeout=self.max_segment_age)]
+            except Empty:
+                batch = []
+            while len(batch) < self.max_batch_size and not self.queue.empty():
+                batch.append(self.queue.get())
+
+            lines = []
+            for event in batch:
+                if event is None:
+                    closing = True
+                    break
+                lines.append(json_dumpstring(event) + '\n')
+
+            if self.segment_file is not None and self._segment_is_full():
+                self._close_segment()
+            if lines:
+                if self.segment_file is None:
+                    self._open_segment()
+                self.segment_file.write(''.join(lines))
+                self.segment_file.flush()
+
+        if self.segment_file is not None:
+            self._close_segment()
+
+    def _segment_is_full(self):
+        return (self.segment_file.tell() >= self.max_segment_bytes or
+                time.time() - self.segment_opened_at >= self.max_segment_age)
+
+    def _open_segment(self):
+        self.segment_count += 1
+        self.segment_opened_at = time.time()
+        segment_name = '{}{}-{:06d}{}'.format(SEGMENT_PREFIX,
+                                              time.strftime('%Y%m%dT%H%M%S', time.gmtime(self.segment_opened_at)),
+                                              self.segment_count, SEGMENT_SUFFIX)
+        self.segment_path = path.join(self.directory, segment_name)
+        self.segment_file = open(self.segment_path, 'a')
+
+    def _close_segment(self):
+        self.segment_file.close()
+        if self.compress:
+            with open(self.segment_path, 'rb') as file_in, gzip.open(self.segment_path + COMPRESSED_SUFFIX,
+                                                                     'wb') as file_out:
+                shutil.copyfileobj(file_in, file_out)
+            remove(self.segment_path)
+        self.segment_file = None
+        self.segment_path = None
+
+
+def read_events(directory=DEFAULT_EVENT_LOG_LOCATION):
+    """
+    Streams every logged event back out of a log directory in the order it was written, including any events logged to
+    individual files before the segmented log was introduced.
+    :param directory: Directory containing the event log
+    :return: Generator of the logged events
+    """
+    filenames = listdir(directory)
+
+    legacy_filenames = [filename for filename in filenames
+                        if filename.endswith('.json') and not filename.startswith(SEGMENT_PREFIX)]
+    for filename in sorted(legacy_filenames, key=lambda legacy_filename: float(legacy_filename[:-len('.json')])):
+        with open(path.join(directory, filename), 'r') as event_read:
+            yield json_loadstring(event_read.read())
+
+    segment_filenames = [filename for filename in filenames if filename.startswith(SEGMENT_PREFIX)]
+    for filename in sorted(segment_filenames):
+        if filename.endswith(COMPRESSED_SUFFIX):
+            segment = gzip.open(path.join(directory, filename), 'rt')
+        else:
+            segment = open(path.join(directory, filename), 'r')
+        with segment:
+            for line in segment:
+                if line.strip():
+                    yield json_loadstring(line)
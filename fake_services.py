@@ -0,0 +1,508 @@
+"""
+In-process stand-ins for the Slack RTM and Web APIs, the Spotify Web API and the YouTube Data API, answering the calls
+the bot makes from a synthetic catalogue of songs. Each can be given latency, a rate of failed calls and a rate of rate
+limited calls, so the bot can be benchmarked without network access or live tokens.
+"""
+from collections import Counter, deque
+from random import Random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+from httplib2 import Response
+from spotipy.client import SpotifyException
+from slackclient.server import SlackConnectionError
+
+from title_normaliser import normalise_title
+
+ARTIST_WORDS = ('Velvet', 'Neon', 'Paper', 'Glass', 'Silver', 'Hollow', 'Crimson', 'Static', 'Lunar', 'Wild', 'Quiet',
+                'Electric', 'Golden', 'Broken', 'Midnight', 'Ocean')
+NAME_WORDS = ('Heart', 'Signal', 'River', 'Ghost', 'Summer', 'Machine', 'Echo', 'Fire', 'Garden', 'Highway', 'Dream',
+              'Mirror', 'Light', 'Storm', 'Letter', 'Island')
+VIDEO_SUFFIXES = ('', ' (Official Video)', ' [HD]', ' (Official Audio)', ' (Lyrics)')
+FAKE_USER_ID = 'UBENCHMARK'
+FAKE_USERNAME = 'benchmark'
+
+
+class FakeServiceBehaviour:
+    """
+    How a stand-in service behaves under load: how long each call takes, and how often calls fail or are rejected as
+    rate limited. Also counts the calls made, by name.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=None):
+        """
+        :param latency: Number of seconds every call takes at least
+        :param jitter: Most number of seconds added at random to the latency of each call
+        :param error_rate: Fraction of calls that fail with a server error
+        :param rate_limit_rate: Fraction of calls that are rejected as rate limited
+        :param seed: Seed for the random numbers, so runs can be repeated
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = Random(seed)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def perform(self, call_name):
+        """
+        Counts and waits out a single call.
+        :param call_name: Name of the API call being made
+        :return: 'error' or 'rate_limited' if the call is to fail, otherwise None
+        """
+        with self.lock:
+            self.calls[call_name] += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            roll = self.random.random()
+        if delay:
+            time.sleep(delay)
+        if roll < self.rate_limit_rate:
+            return 'rate_limited'
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 'error'
+        return None
+
+    def call_counts(self):
+        with self.lock:
+            return Counter(self.calls)
+
+
+class FakeSong:
+    """
+    A song in the synthetic catalogue, as it appears on each service
+    """
+
+    def __init__(self, spotify_id, youtube_id, artist, name, duration_ms, video_title):
+        """
+        :param spotify_id: ID of the song on Spotify, None if it is not on Spotify
+        :param youtube_id: ID of the song's video on YouTube, None if it is not on YouTube
+        :param artist: Artist name, as given by Spotify
+        :param name: Track name, as given by Spotify
+        :param duration_ms: Length of the song
+        :param video_title: Title of the song's video
+        """
+        self.spotify_id = spotify_id
+        self.youtube_id = youtube_id
+        self.artist = artist
+        self.name = name
+        self.duration_ms = duration_ms
+        self.video_title = video_title
+
+    @property
+    def title(self):
+        return '{} - {}'.format(self.artist, self.name) if self.artist else self.name
+
+
+class FakeCatalogue:
+    """
+    Every song known to the stand-in services. Some songs are on only one of the two services, so that a share of cross
+    searches finds nothing.
+    """
+
+    def __init__(self, size=0, missing_rate=0.1, seed=None):
+        """
+        :param size: Number of songs generated for the catalogue
+        :param missing_rate: Fraction of generated songs missing from one of the two services
+        :param seed: Seed for the random numbers, so the same catalogue can be generated again
+        """
+        self.songs = []
+        self.by_spotify_id = {}
+        self.by_youtube_id = {}
+        self.by_title = {}
+        random = Random(seed)
+        for number in range(size):
+            artist = '{} {} {}'.format(random.choice(ARTIST_WORDS), random.choice(ARTIST_WORDS), number)
+            name = '{} {}'.format(random.choice(NAME_WORDS), random.choice(NAME_WORDS))
+            missing = random.random() < missing_rate
+            on_spotify = not missing or random.random() < 0.5
+            on_youtube = not missing or not on_spotify
+            self.add_song(FakeSong('spotify{:015d}'.format(number) if on_spotify else None,
+                                   'yt{:09d}'.format(number) if on_youtube else None,
+                                   artist, name, random.randint(120000, 360000),
+                                   '{} - {}{}'.format(artist, name, random.choice(VIDEO_SUFFIXES))))
+
+    def add_song(self, song):
+        """
+        Adds a song to the catalogue, making it findable by its IDs and by searching for either of its titles.
+        :param song: The FakeSong to add
+        :return: None
+        """
+        self.songs.append(song)
+        if song.spotify_id is not None:
+            self.by_spotify_id[song.spotify_id] = song
+        if song.youtube_id is not None:
+            self.by_youtube_id[song.youtube_id] = song
+        self.by_title.setdefault(normalise_title(song.title), song)
+        self.by_title.setdefault(normalise_title(song.video_title), song)
+
+    def search(self, query):
+        """
+        :param query: Search string, as sent by the bot
+        :return: The song the query names, or None if it names none
+        """
+        return self.by_title.get(normalise_title(query))
+
+
+class FakeSlackClient:
+    """
+    Stands in for a SlackClient. Events pushed onto it are returned from rtm_read in order, and every Web API call is
+    answered locally. The time of every reaction added is recorded against the timestamp of its message, which is how
+    the benchmark tells that a link has been fully handled. Messages are kept in their channel's history, so that the
+    connection can be dropped with go_offline and the messages posted meanwhile read back through conversations.history.
+    """
+
+    def __init__(self, behaviour, user_count=50):
+        """
+        :param behaviour: FakeServiceBehaviour for Web API calls
+        :param user_count: Number of users in the fake workspace, besides the one posting links
+        """
+        self.behaviour = behaviour
+        self.members = [{'id': FAKE_USER_ID, 'name': FAKE_USERNAME}] + \
+                       [{'id': 'U{:08d}'.format(number), 'name': 'user{}'.format(number)} for number in range(user_count)]
+        self.events = deque()
+        self.reactions = {}
+        self.reactions_lock = threading.Lock()
+        self.connected = threading.Event()
+        self.online = True
+        self.history = {}
+
+    def push_events(self, events):
+        """
+        Posts events, which are only delivered over RTM while online. New messages are always kept in their channel's
+        history.
+        :param events: List of event JSON
+        :return: None
+        """
+        for event in events:
+            if event.get('type') == 'message' and 'subtype' not in event and 'channel' in event:
+                message = dict(event)
+                del message['channel']
+                self.history.setdefault(event['channel'], []).append(message)
+        if self.online:
+            self.events.extend(events)
+
+    def go_offline(self):
+        """
+        Drops the RTM connection, refusing new ones until go_online is called.
+        :return: None
+        """
+        self.online = False
+        self.connected.clear()
+
+    def go_online(self):
+        self.online = True
+
+    def rtm_connect(self):
+        if not self.online:
+            return False
+        self.connected.set()
+        return True
+
+    def rtm_read(self):
+        if not self.online:
+            # As slackclient does once its websocket has closed
+            raise SlackConnectionError('Unable to send due to closed RTM websocket')
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+    def api_call(self, method, **kwargs):
+        # Loading the user directory is left unaffected, so that usernames are known without a users.info per user
+        outcome = self.behaviour.perform(method) if method != 'users.list' else None
+        if outcome == 'rate_limited':
+            return {'ok': False, 'error': 'ratelimited', 'headers': {'Retry-After': '1'}}
+        if outcome == 'error':
+            return {'ok': False, 'error': 'internal_error'}
+
+        if method == 'users.list':
+            return {'ok': True, 'members': self.members}
+        if method == 'users.info':
+            return {'ok': True, 'user': self.members[0]}
+        if method == 'reactions.add':
+            with self.reactions_lock:
+                self.reactions.setdefault(kwargs['timestamp'], []).append((kwargs['name'], time.monotonic()))
+        if method == 'im.open':
+            return {'ok': True, 'channel': {'id': 'DBENCHMARK'}}
+        if method == 'conversations.history':
+            return self.conversations_history(**kwargs)
+        return {'ok': True}
+
+    def conversations_history(self, channel, oldest=None, limit=100, cursor=None, **kwargs):
+        messages = [message for message in reversed(self.history.get(channel, []))
+                    if oldest is None or float(message['ts']) > float(oldest)]
+        offset = int(cursor) if cursor else 0
+        has_more = offset + limit < len(messages)
+        return {'ok': True, 'messages': messages[offset:offset + limit], 'has_more': has_more,
+                'response_metadata': {'next_cursor': str(offset + limit) if has_more else ''}}
+
+    def reactions_for(self, timestamp):
+        """
+        :param timestamp: Timestamp of the message
+        :return: List of (reaction name, monotonic time added) for each reaction added to the message
+        """
+        with self.reactions_lock:
+            return list(self.reactions.get(timestamp, []))
+
+
+class FakePlaylist:
+    """
+    Contents of a playlist held by a stand-in service, with a version changed by every addition
+    """
+
+    def __init__(self, track_ids):
+        self.track_ids = list(track_ids)
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def add(self, track_ids):
+        with self.lock:
+            self.track_ids.extend(track_ids)
+            self.version += 1
+
+    def page(self, offset, limit):
+        with self.lock:
+            return self.track_ids[offset:offset + limit], offset + limit < len(self.track_ids), self.version
+
+
+class FakeSpotify:
+    """
+    Stands in for the Spotify service, answering the spotipy calls made by SpotifyTrack
+    """
+
+    def __init__(self, catalogue, behaviour, playlist_size=0, initial_track_ids=None):
+        """
+        :param catalogue: FakeCatalogue of songs
+        :param behaviour: FakeServiceBehaviour for every call
+        :param playlist_size: Number of catalogue songs already in each playlist
+        :param initial_track_ids: IDs already in each playlist, in place of the first playlist_size catalogue songs
+        """
+        self.catalogue = catalogue
+        self.behaviour = behaviour
+        self.playlist_size = playlist_size
+        self.initial_track_ids = initial_track_ids
+        self.playlist_contents = {}
+        self.playlist_contents_lock = threading.Lock()
+
+    def _perform(self, call_name):
+        outcome = self.behaviour.perform(call_name)
+        if outcome == 'rate_limited':
+            raise SpotifyException(429, -1, 'API rate limit exceeded', headers={'Retry-After': '1'})
+        if outcome == 'error':
+            raise SpotifyException(500, -1, 'Server error')
+
+    def _get_playlist(self, playlist_id):
+        with self.playlist_contents_lock:
+            if playlist_id not in self.playlist_contents:
+                initial_track_ids = self.initial_track_ids
+                if initial_track_ids is None:
+                    initial_track_ids = [song.spotify_id for song in self.catalogue.songs
+                                         if song.spotify_id is not None][:self.playlist_size]
+                self.playlist_contents[playlist_id] = FakePlaylist(initial_track_ids)
+            return self.playlist_contents[playlist_id]
+
+    def _track_json(self, song):
+        return {'id': song.spotify_id, 'name': song.name, 'duration_ms': song.duration_ms,
+                'artists': [{'name': song.artist}], 'external_ids': {'isrc': 'ZZ' + song.spotify_id[-10:]}}
+
+    def _tracks_page(self, playlist_id, offset, limit):
+        track_ids, has_next, _ = self._get_playlist(playlist_id).page(offset, limit)
+        return {
+            'items': [{'added_at': None, 'added_by': {'id': FAKE_USERNAME},
+                       'track': self._track_json(self.catalogue.by_spotify_id[track_id])} for track_id in track_ids],
+            'next': (playlist_id, offset + limit, limit) if has_next else None
+        }
+
+    def search(self, q, limit=10, type='track'):
+        self._perform('search')
+        song = self.catalogue.search(q)
+        items = [self._track_json(song)] if song is not None and song.spotify_id is not None else []
+        return {'tracks': {'items': items[:limit]}}
+
+    def track(self, track_id):
+        self._perform('track')
+        song = self.catalogue.by_spotify_id.get(track_id)
+        if song is None:
+            raise SpotifyException(404, -1, 'non existing id')
+        return self._track_json(song)
+
+    def tracks(self, tracks):
+        self._perform('tracks')
+        songs = [self.catalogue.by_spotify_id.get(track_id) for track_id in tracks]
+        return {'tracks': [self._track_json(song) if song is not None else None for song in songs]}
+
+    def user_playlist(self, user, playlist_id, fields=None):
+        self._perform('user_playlist')
+        playlist = self._get_playlist(playlist_id)
+        return {'snapshot_id': str(playlist.version), 'tracks': self._tracks_page(playlist_id, 0, 100)}
+
+    def user_playlist_tracks(self, user, playlist_id, fields=None, limit=100, offset=0):
+        self._perform('user_playlist_tracks')
+        return self._tracks_page(playlist_id, offset, limit)
+
+    def next(self, result):
+        self._perform('next')
+        if not result['next']:
+            return None
+        return self._tracks_page(*result['next'])
+
+    def user_playlist_add_tracks(self, user, playlist_id, tracks):
+        self._perform('user_playlist_add_tracks')
+        self._get_playlist(playlist_id).add(tracks)
+        return {'snapshot_id': str(self._get_playlist(playlist_id).version)}
+
+
+class FakeYoutubeRequest:
+    """
+    Stands in for a googleapiclient HttpRequest, performing its call when executed
+    """
+
+    def __init__(self, youtube, call_name, function, kwargs=None):
+        self.youtube = youtube
+        self.call_name = call_name
+        self.function = function
+        self.kwargs = kwargs or {}
+        self.headers = {}
+
+    def execute(self):
+        self.youtube.perform(self.call_name)
+        return self.function(self.headers)
+
+
+class FakeYoutubeResource:
+    """
+    Stands in for one of the YouTube service's resource collections (search(), videos() and so on)
+    """
+
+    def __init__(self, youtube, resource_name):
+        self.youtube = youtube
+        self.resource_name = resource_name
+
+    def list(self, **kwargs):
+        function = getattr(self.youtube, '{}_list'.format(self.resource_name))
+        return FakeYoutubeRequest(self.youtube, self.resource_name + '.list',
+                                  lambda headers: function(headers, **kwargs), kwargs)
+
+    def list_next(self, previous_request, previous_response):
+        next_page_token = previous_response.get('nextPageToken')
+        if not next_page_token:
+            return None
+        return self.list(**dict(previous_request.kwargs, pageToken=next_page_token))
+
+    def insert(self, part, body):
+        return FakeYoutubeRequest(self.youtube, self.resource_name + '.insert',
+                                  lambda headers: self.youtube.playlistItems_insert(body))
+
+
+class FakeYoutubeBatch:
+    """
+    Stands in for a googleapiclient BatchHttpRequest, sending all of its requests in one call
+    """
+
+    def __init__(self, youtube, callback):
+        self.youtube = youtube
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.youtube.perform('batch')
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.function(request.headers), None)
+            except HttpError as error:
+                self.callback(request_id, None, error)
+
+
+class FakeYoutube:
+    """
+    Stands in for the YouTube service built by googleapiclient, answering the calls made by YoutubeVideo
+    """
+
+    def __init__(self, catalogue, behaviour, playlist_size=0, initial_track_ids=None):
+        """
+        :param catalogue: FakeCatalogue of songs
+        :param behaviour: FakeServiceBehaviour for every call
+        :param playlist_size: Number of catalogue songs already in each playlist
+        :param initial_track_ids: IDs already in each playlist, in place of the first playlist_size catalogue songs
+        """
+        self.catalogue = catalogue
+        self.behaviour = behaviour
+        self.playlist_size = playlist_size
+        self.initial_track_ids = initial_track_ids
+        self.playlist_contents = {}
+        self.playlist_contents_lock = threading.Lock()
+
+    def perform(self, call_name):
+        outcome = self.behaviour.perform(call_name)
+        if outcome == 'rate_limited':
+            raise HttpError(Response({'status': '429', 'retry-after': '1'}), b'rateLimitExceeded')
+        if outcome == 'error':
+            raise HttpError(Response({'status': '500'}), b'backendError')
+
+    def _get_playlist(self, playlist_id):
+        with self.playlist_contents_lock:
+            if playlist_id not in self.playlist_contents:
+                initial_track_ids = self.initial_track_ids
+                if initial_track_ids is None:
+                    initial_track_ids = [song.youtube_id for song in self.catalogue.songs
+                                         if song.youtube_id is not None][:self.playlist_size]
+                self.playlist_contents[playlist_id] = FakePlaylist(initial_track_ids)
+            return self.playlist_contents[playlist_id]
+
+    def search(self):
+        return FakeYoutubeResource(self, 'search')
+
+    def videos(self):
+        return FakeYoutubeResource(self, 'videos')
+
+    def playlists(self):
+        return FakeYoutubeResource(self, 'playlists')
+
+    def playlistItems(self):
+        return FakeYoutubeResource(self, 'playlistItems')
+
+    def new_batch_http_request(self, callback):
+        return FakeYoutubeBatch(self, callback)
+
+    def search_list(self, headers, q, part, type, maxResults):
+        song = self.catalogue.search(q)
+        items = []
+        if song is not None and song.youtube_id is not None:
+            items.append({'id': {'kind': 'youtube#video', 'videoId': song.youtube_id},
+                          'snippet': {'title': song.video_title, 'channelTitle': song.artist}})
+        return {'items': items[:maxResults]}
+
+    def videos_list(self, headers, id, part):
+        videos = [self.catalogue.by_youtube_id[video_id] for video_id in id.split(',')
+                  if video_id in self.catalogue.by_youtube_id]
+        return {'items': [{'id': song.youtube_id,
+                           'snippet': {'title': song.video_title, 'channelTitle': song.artist},
+                           'contentDetails': {'duration': 'PT{}M{}S'.format(*divmod((song.duration_ms or 0) // 1000,
+                                                                                    60))}}
+                          for song in videos]}
+
+    def playlists_list(self, headers, part, id):
+        return {'etag': str(self._get_playlist(id).version), 'items': [{'id': id}]}
+
+    def playlistItems_list(self, headers, part, playlistId, maxResults=50, pageToken=None):
+        offset = int(pageToken or 0)
+        video_ids, has_next, version = self._get_playlist(playlistId).page(offset, maxResults)
+        etag = '{}-{}'.format(version, offset)
+        if headers.get('If-None-Match') == etag:
+            raise HttpError(Response({'status': '304'}), b'')
+        return {
+            'etag': etag,
+            'items': [{'snippet': {'title': self.catalogue.by_youtube_id[video_id].video_title,
+                                   'resourceId': {'kind': 'youtube#video', 'videoId': video_id}}}
+                      for video_id in video_ids],
+            'nextPageToken': str(offset + maxResults) if has_next else None
+        }
+
+    def playlistItems_insert(self, body):
+        self._get_playlist(body['snippet']['playlistId']).add([body['snippet']['resourceId']['videoId']])
+        return {'kind': 'youtube#playlistItem'}
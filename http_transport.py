@@ -0,0 +1,115 @@
+from io import IOBase
+from json import dumps as json_dumpstring
+
+from httplib2 import Response, DEFAULT_MAX_REDIRECTS
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_HOSTS = 10
+DEFAULT_CONNECTIONS_PER_HOST = 8
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+
+
+class PooledSession(Session):
+    """
+    requests Session keeping a pool of keep-alive connections to each host it talks to, so that once warm, calls reuse
+    an open TLS connection rather than each paying for a fresh handshake. Every request is given the session's timeouts
+    unless the caller supplies its own. One session is shared by the Slack, Spotify and YouTube clients.
+    """
+
+    def __init__(self, pool_hosts=DEFAULT_POOL_HOSTS, connections_per_host=DEFAULT_CONNECTIONS_PER_HOST,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        """
+        :param pool_hosts: Number of hosts for which connection pools are kept
+        :param connections_per_host: Most connections kept open to a single host, and so the most concurrent requests
+        made to it
+        :param connect_timeout: Number of seconds allowed to establish a connection
+        :param read_timeout: Number of seconds allowed between bytes of the response
+        """
+        super().__init__()
+        self.timeout = (connect_timeout, read_timeout)
+        # Block rather than open extra, unpooled connections when every connection to a host is busy
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=connections_per_host, pool_block=True)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+class PooledHttp:
+    """
+    Stands in for an httplib2.Http object, as expected by the Google API client and oauth2client, making its requests
+    through a PooledSession. Unlike httplib2.Http it may be used from several threads at once.
+    """
+
+    def __init__(self, session):
+        """
+        :param session: The PooledSession requests are made through
+        """
+        self.session = session
+        self.follow_redirects = True
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=DEFAULT_MAX_REDIRECTS,
+                connection_type=None):
+        """
+        Makes a request in the manner of httplib2.Http.request.
+        :return: Tuple of the httplib2 Response and the response body as bytes
+        """
+        response = self.session.request(method, uri, data=body, headers=headers,
+                                        allow_redirects=self.follow_redirects and redirections > 0)
+        info = {key.lower(): value for key, value in response.headers.items()}
+        # requests has already decoded the body, so it must not be decoded again
+        info.pop('content-encoding', None)
+        info['status'] = str(response.status_code)
+        return Response(info), response.content
+
+    def close(self):
+        pass
+
+
+class PooledSlackRequest:
+    """
+    Replacement for the SlackClient's request maker, posting Web API calls through a PooledSession rather than opening a
+    new connection for each call.
+    """
+
+    def __init__(self, session):
+        """
+        :param session: The PooledSession requests are made through
+        """
+        self.session = session
+
+    def do(self, token, request='?', post_data=None, domain='slack.com', timeout=None):
+        """
+        Posts a single Web API call, taking the same arguments as the SlackClient's own request maker.
+        :param token: Slack token the call is authenticated with
+        :param request: The API method called
+        :param post_data: Dictionary of the method's arguments
+        :param domain: Domain of the Slack API
+        :param timeout: Number of seconds allowed for the call, the session's timeouts being used if not given
+        :return: The requests Response
+        """
+        post_data = dict(post_data or {})
+        files = None
+        if isinstance(post_data.get('file'), IOBase):
+            files = {'file': post_data.pop('file')}
+        for key, value in post_data.items():
+            if isinstance(value, (list, dict)):
+                post_data[key] = json_dumpstring(value)
+        post_data['token'] = token
+        return self.session.post('https://{}/api/{}'.format(domain, request), data=post_data, files=files,
+                                 timeout=timeout)
+
+
+def use_pooled_transport(slack_client, session):
+    """
+    Points a SlackClient's Web API calls at the given session.
+    :param slack_client: The SlackClient to be changed
+    :param session: The PooledSession its calls are to be made through
+    :return: None
+    """
+    slack_client.server.api_requester = PooledSlackRequest(session)
@@ -0,0 +1,218 @@
+from json import dumps as json_dumpstring, loads as json_loadstring
+import sqlite3
+import threading
+import time
+
+DEFAULT_JOB_QUEUE_LOCATION = 'job_queue.db'
+DEFAULT_MAX_JOB_ATTEMPTS = 3
+DEFAULT_JOB_RETENTION = 7 * 24 * 60 * 60
+DEFAULT_JOB_RETRY_BACKOFF = 5 * 60
+
+JOB_PENDING = 'pending'
+JOB_DONE = 'done'
+JOB_ABANDONED = 'abandoned'
+
+
+class Job:
+    """
+    A track found in a message, to be added to the playlist of each service, along with the steps of that work which
+    have already been completed
+    """
+
+    def __init__(self, timestamp, channel, service_name, track_id, title, added_by, target_services, event, attempts,
+                 completed_steps):
+        """
+        :param timestamp: Timestamp of the message the track was found in, identifying the job
+        :param channel: The channel the message was posted in
+        :param service_name: Name of the service the track was linked from
+        :param track_id: ID of the track on that service
+        :param title: Title of the track
+        :param added_by: Name of the user who posted the track
+        :param target_services: List of the names of the services the track is to be added to
+        :param event: The source Slack event JSON
+        :param attempts: Number of times processing of the job has been started
+        :param completed_steps: Dictionary of (service name, step name) to the result recorded for the step
+        """
+        self.timestamp = timestamp
+        self.channel = channel
+        self.service_name = service_name
+        self.track_id = track_id
+        self.title = title
+        self.added_by = added_by
+        self.target_services = target_services
+        self.event = event
+        self.attempts = attempts
+        self.completed_steps = completed_steps
+
+    def is_step_completed(self, service_name, step):
+        return (service_name, step) in self.completed_steps
+
+    def get_step_result(self, service_name, step):
+        return self.completed_steps[(service_name, step)]
+
+
+class JobQueue:
+    """
+    Durable record of the tracks the bot has found in messages and of how far it got with each, held in SQLite so that
+    work interrupted by a crash or restart is picked up where it stopped rather than lost or repeated. Jobs are keyed on
+    the timestamp of their message, so a message seen again is not processed a second time. A job whose steps failed
+    is due to be retried after a backoff that doubles with each attempt. Each job is claimed by whatever picks it up,
+    so that it is never being processed twice at once.
+    """
+
+    def __init__(self, db_path=DEFAULT_JOB_QUEUE_LOCATION, retention=DEFAULT_JOB_RETENTION,
+                 retry_backoff=DEFAULT_JOB_RETRY_BACKOFF):
+        """
+        :param db_path: Filepath of the SQLite database
+        :param retention: Seconds for which finished jobs are kept, so that messages seen again in that time are skipped
+        :param retry_backoff: Seconds before a failed job is due to be retried, doubled for each attempt already made
+        """
+        self.retry_backoff = retry_backoff
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        # Jobs claimed from here on belong to this run of the bot, and are being processed rather than left unfinished
+        self.opened_at = time.time()
+        with self.lock, self.connection:
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    timestamp TEXT PRIMARY KEY,
+                    channel TEXT,
+                    service TEXT NOT NULL,
+                    track_id TEXT,
+                    title TEXT,
+                    added_by TEXT,
+                    target_services TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    finished_at REAL,
+                    claimed_at REAL,
+                    retry_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state);
+                CREATE TABLE IF NOT EXISTS job_steps (
+                    timestamp TEXT NOT NULL,
+                    service TEXT NOT NULL,
+                    step TEXT NOT NULL,
+                    result TEXT,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (timestamp, service, step)
+                );
+            ''')
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(jobs)')]
+            if 'claimed_at' not in columns:
+                self.connection.execute('ALTER TABLE jobs ADD COLUMN claimed_at REAL')
+                self.connection.execute('ALTER TABLE jobs ADD COLUMN retry_at REAL')
+                self.connection.execute('UPDATE jobs SET claimed_at = created_at')
+            expired = time.time() - retention
+            self.connection.execute('DELETE FROM job_steps WHERE timestamp IN '
+                                    '(SELECT timestamp FROM jobs WHERE state != ? AND finished_at < ?)',
+                                    (JOB_PENDING, expired))
+            self.connection.execute('DELETE FROM jobs WHERE state != ? AND finished_at < ?', (JOB_PENDING, expired))
+
+    def create(self, timestamp, channel, track, target_services, event):
+        """
+        Records a new job for a track found in a message, unless there is already one for the message.
+        :param timestamp: Timestamp of the message the track was found in
+        :param channel: The channel the message was posted in
+        :param track: The track found in the message
+        :param target_services: List of the names of the services the track is to be added to
+        :param event: The source Slack event JSON
+        :return: The new Job, or None if the message already has one
+        """
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT OR IGNORE INTO jobs (timestamp, channel, service, track_id, title, added_by, target_services, '
+                'event, state, attempts, created_at, claimed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)',
+                (timestamp, channel, track.service_name, track.id, track.title, track.added_by,
+                 json_dumpstring(target_services), json_dumpstring(event), JOB_PENDING, time.time(), time.time()))
+        if cursor.rowcount == 0:
+            return None
+        return Job(timestamp, channel, track.service_name, track.id, track.title, track.added_by, target_services,
+                   event, 1, {})
+
+    def contains(self, timestamp):
+        """
+        :param timestamp: Timestamp of a message
+        :return: Whether a job has been recorded for the message
+        """
+        with self.lock:
+            return self.connection.execute('SELECT 1 FROM jobs WHERE timestamp = ?', (timestamp,)).fetchone() is not None
+
+    def complete_step(self, job, service_name, step, result=None):
+        """
+        Records a step of a job as completed, so that it is not run again should the job be resumed.
+        :param job: The Job the step belongs to
+        :param service_name: Name of the service the step was for
+        :param step: Name of the step
+        :param result: JSON-serialisable result of the step, returned in its place when the job is resumed
+        :return: None
+        """
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO job_steps (timestamp, service, step, result, completed_at) '
+                                    'VALUES (?, ?, ?, ?, ?)',
+                                    (job.timestamp, service_name, step, json_dumpstring(result), time.time()))
+        job.completed_steps[(service_name, step)] = result
+
+    def finish(self, job, succeeded, max_attempts=DEFAULT_MAX_JOB_ATTEMPTS):
+        """
+        Records the end of an attempt at a job. A job with steps that failed is left to be retried, until it has been
+        attempted the given number of times.
+        :param job: The Job
+        :param succeeded: Whether every step of the job has completed
+        :param max_attempts: Number of attempts after which a job that has not succeeded is abandoned
+        :return: None
+        """
+        if succeeded:
+            state = JOB_DONE
+        elif job.attempts >= max_attempts:
+            state = JOB_ABANDONED
+        else:
+            with self.lock, self.connection:
+                self.connection.execute('UPDATE jobs SET retry_at = ? WHERE timestamp = ?',
+                                        (time.time() + self.retry_backoff * 2 ** (job.attempts - 1), job.timestamp))
+            return
+        with self.lock, self.connection:
+            self.connection.execute('UPDATE jobs SET state = ?, finished_at = ? WHERE timestamp = ?',
+                                    (state, time.time(), job.timestamp))
+
+    def start_unfinished(self):
+        """
+        Claims every job left unfinished by an earlier run of the bot, counting this as a new attempt at each. Jobs
+        claimed since the queue was opened are left alone, as they are being processed by this run.
+        :return: List of Job objects, oldest first
+        """
+        return self._claim('claimed_at < ?', (self.opened_at,))
+
+    def start_due(self):
+        """
+        Claims every job whose failed steps are due to be retried, counting this as a new attempt at each.
+        :return: List of Job objects, oldest first
+        """
+        return self._claim('retry_at <= ?', (time.time(),))
+
+    def _claim(self, condition, parameters):
+        condition = 'state = ? AND ' + condition
+        parameters = (JOB_PENDING,) + parameters
+        with self.lock, self.connection:
+            job_rows = self.connection.execute(
+                'SELECT timestamp, channel, service, track_id, title, added_by, target_services, event, attempts + 1 '
+                'FROM jobs WHERE ' + condition + ' ORDER BY created_at', parameters).fetchall()
+            step_rows = self.connection.execute(
+                'SELECT timestamp, service, step, result FROM job_steps WHERE timestamp IN '
+                '(SELECT timestamp FROM jobs WHERE ' + condition + ')', parameters).fetchall()
+            self.connection.execute('UPDATE jobs SET attempts = attempts + 1, claimed_at = ?, retry_at = NULL '
+                                    'WHERE ' + condition, (time.time(),) + parameters)
+
+        completed_steps = {}
+        for timestamp, service_name, step, result in step_rows:
+            completed_steps.setdefault(timestamp, {})[(service_name, step)] = json_loadstring(result)
+        return [Job(timestamp, channel, service_name, track_id, title, added_by, json_loadstring(target_services),
+                    json_loadstring(event), attempts, completed_steps.get(timestamp, {}))
+                for timestamp, channel, service_name, track_id, title, added_by, target_services, event, attempts
+                in job_rows]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
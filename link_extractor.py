@@ -0,0 +1,77 @@
+from html import unescape
+import re
+
+# Every form a link to a single YouTube video or Spotify track takes. Slack wraps links in the raw message text as
+# <url> or <url|label>, so a link ends at whitespace, '|' or '>'.
+_LINK_PATTERN = re.compile(
+    r'(?:https?://)?(?:'
+    r'(?:(?:www|m|music)\.)?youtube(?:-nocookie)?\.com/(?:'
+    r'watch/?\?(?P<watch_query>[^\s|>]*)'
+    r'|(?:shorts|embed|live|v)/(?P<youtube_path_id>[\w-]{11})'
+    r')'
+    r'|youtu\.be/(?P<youtube_short_id>[\w-]{11})'
+    r'|(?:open|play)\.spotify\.com/(?:intl-[a-z]{2}(?:-[a-z]{2})?/)?(?:embed/)?track/(?P<spotify_path_id>[A-Za-z0-9]{22})'
+    r')'
+    r'|spotify:track:(?P<spotify_uri_id>[A-Za-z0-9]{22})',
+    re.IGNORECASE)
+# The ID ends at the next parameter, a fragment such as #t=30, or any other character that cannot be part of it
+_WATCH_VIDEO_ID = re.compile(r'(?:^|&)v=(?P<video_id>[\w-]{11})(?![\w-])')
+
+
+class ExtractedLink:
+    """
+    A link to a track found in the text of a message. Has the same fields as a SlackAttachment, other than the title
+    and artist, which the raw text does not give.
+    """
+
+    def __init__(self, service_name, track_id, from_url):
+        self.service_name = service_name
+        self.id = track_id
+        self.from_url = from_url
+        self.title = None
+        self.artist = None
+
+
+def _link_from_match(match):
+    if match.group('watch_query') is not None:
+        video_id_match = _WATCH_VIDEO_ID.search(unescape(match.group('watch_query')))
+        if video_id_match is None:
+            return None
+        return ExtractedLink('YouTube', video_id_match.group('video_id'), match.group(0))
+    youtube_id = match.group('youtube_path_id') or match.group('youtube_short_id')
+    if youtube_id is not None:
+        return ExtractedLink('YouTube', youtube_id, match.group(0))
+    return ExtractedLink('Spotify', match.group('spotify_path_id') or match.group('spotify_uri_id'), match.group(0))
+
+
+def extract_links(text):
+    """
+    Finds every link to a YouTube video or Spotify track in the raw text of a message: YouTube watch (including within
+    a playlist, or from a timestamp), youtu.be, shorts, embed and YouTube Music links, and Spotify track links (with or
+    without an intl- locale or query string) and URIs.
+    :param text: The message text, as sent by Slack
+    :return: List of ExtractedLink, in the order they appear, without repeats
+    """
+    if not text:
+        return []
+    links = []
+    seen = set()
+    for match in _LINK_PATTERN.finditer(text):
+        link = _link_from_match(match)
+        if link is not None and (link.service_name, link.id) not in seen:
+            seen.add((link.service_name, link.id))
+            links.append(link)
+    return links
+
+
+def extract_track_id(service_name, url):
+    """
+    Reads the track ID from a single link to the given service.
+    :param service_name: 'YouTube' or 'Spotify'
+    :param url: The link
+    :return: The ID, or None if the link is not to a single track on that service
+    """
+    for link in extract_links(url):
+        if link.service_name == service_name:
+            return link.id
+    return None
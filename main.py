@@ -1,6 +1,8 @@
+import time
+PROCESS_STARTED_AT = time.perf_counter()
+
 from os import path
 import sys
-import httplib2
 from argparse import ArgumentParser
 
 from googleapiclient.discovery import build
@@ -8,6 +10,10 @@ from oauth2client.client import flow_from_clientsecrets
 from oauth2client.file import Storage
 from oauth2client.tools import run_flow
 from music_bot import MusicBot
+from http_transport import PooledSession, PooledHttp
+from discovery_document_cache import DiskDiscoveryCache
+from metrics import StartupTimer
+from services import LazyService
 
 CHANGELOG_DIR = 'changelogs/'
 
@@ -32,11 +38,14 @@ https://developers.google.com/api-client-library/python/guide/aaa_client_secrets
                                            DEFAULT_CLIENT_SECRETS_LOCATION)))
 
 
-def get_authenticated_service(client_secrets):
+def get_authenticated_service(client_secrets, http_session):
     """
     Used to create an authenticated Youtube service for subsequent use, passed in to the Bot's constructor to be kept 
     as a member variable. For an unknown reason the authentication process fails when placed in the helpers.py file, or 
-    this would be treated in the same way as the Spotify service creation.
+    this would be treated in the same way as the Spotify service creation. The API's discovery document is read from the
+    on-disk cache where it has been fetched before.
+    :param client_secrets: "Client Secrets" filepath containing YouTube auth information
+    :param http_session: PooledSession the service makes its requests through
     """
     flow = flow_from_clientsecrets(client_secrets, scope=YOUTUBE_READ_WRITE_SCOPE,
                                    message=MISSING_CLIENT_SECRETS_MESSAGE)
@@ -50,7 +59,8 @@ def get_authenticated_service(client_secrets):
 
     sys.modules['win32file'] = None
 
-    return build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION, http=credentials.authorize(httplib2.Http()))
+    return build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION,
+                 http=credentials.authorize(PooledHttp(http_session)), cache=DiskDiscoveryCache())
 
 
 if __name__ == '__main__':
@@ -71,12 +81,17 @@ if __name__ == '__main__':
     slack_token = args.slack_token
     play_login_file = args.play_auth
 
-    carry_on = True
-
-    while carry_on:
-        try:
-            slack = MusicBot(slack_token, get_authenticated_service(youtube_auth_path), spotify_auth_path, play_login_file)
-            #slack = MusicBot(slack_token, youtube_auth_path, spotify_auth_path, play_login_file)
-            slack.start()
-        except ConnectionResetError:
-            print('Thing dun broke. Trying it again.')
+    startup_timer = StartupTimer(PROCESS_STARTED_AT)
+    startup_timer.mark('imports')
+    http_session = PooledSession()
+    # Authenticated with YouTube when first used
+    youtube_service = LazyService(lambda: get_authenticated_service(youtube_auth_path, http_session))
+
+    # The bot reconnects to Slack by itself, keeping its services, caches and indexes, so it is only ever built once
+    slack = MusicBot(slack_token, youtube_service, spotify_auth_path, play_login_file, http_session=http_session,
+                     startup_timer=startup_timer)
+    #slack = MusicBot(slack_token, youtube_auth_path, spotify_auth_path, play_login_file)
+    try:
+        slack.start()
+    finally:
+        slack.shutdown()
@@ -0,0 +1,311 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bisect import bisect_left
+from functools import wraps
+import threading
+import time
+
+DEFAULT_METRICS_PORT = 9464
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in pairs) + '}'
+
+
+class Metric:
+    """
+    Parent class holding what every metric type has in common: its name, help text and the names of its labels
+    """
+
+    metric_type = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def label_values(self, labels):
+        return tuple(labels.get(labelname, '') for labelname in self.labelnames)
+
+    def render_samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        """
+        :return: The metric in Prometheus text exposition format
+        """
+        lines = ['# HELP {} {}'.format(self.name, self.help_text), '# TYPE {} {}'.format(self.name, self.metric_type)]
+        lines.extend(self.render_samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """
+    Value that only ever goes up, such as a number of errors
+    """
+
+    metric_type = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render_samples(self):
+        with self.lock:
+            return ['{}{} {}'.format(self.name, format_labels(self.labelnames, key), value)
+                    for key, value in sorted(self.values.items())]
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down, such as a queue depth. Either set directly, or read from a function every time the
+    metrics are collected.
+    """
+
+    metric_type = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.values = {}
+        self.functions = {}
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.label_values(labels)] = value
+
+    def set_function(self, function, **labels):
+        with self.lock:
+            self.functions[self.label_values(labels)] = function
+
+    def render_samples(self):
+        with self.lock:
+            values = dict(self.values)
+            functions = dict(self.functions)
+        for key, function in functions.items():
+            values[key] = function()
+        return ['{}{} {}'.format(self.name, format_labels(self.labelnames, key), value)
+                for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values, such as call latencies, counted into cumulative buckets so that percentiles can
+    be calculated from them
+    """
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            if key not in self.series:
+                self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            bucket_counts, _, _ = series = self.series[key]
+            bucket_counts[bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render_samples(self):
+        lines = []
+        with self.lock:
+            for key, (bucket_counts, total, observations) in sorted(self.series.items()):
+                cumulative = 0
+                for upper_bound, bucket_count in zip(self.buckets + ('+Inf',), bucket_counts):
+                    cumulative += bucket_count
+                    lines.append('{}_bucket{} {}'.format(self.name,
+                                                         format_labels(self.labelnames, key, ('le', upper_bound)),
+                                                         cumulative))
+                lines.append('{}_sum{} {}'.format(self.name, format_labels(self.labelnames, key), total))
+                lines.append('{}_count{} {}'.format(self.name, format_labels(self.labelnames, key), observations))
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of every metric to be served
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        :return: Every registered metric in Prometheus text exposition format
+        """
+        with self.lock:
+            metrics = list(self.metrics)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+SLACK_CALL_SECONDS = REGISTRY.register(Histogram(
+    'musicbot_slack_api_call_seconds', 'Time taken by calls to the Slack Web API', ('method',)))
+SLACK_CALL_ERRORS = REGISTRY.register(Counter(
+    'musicbot_slack_api_call_errors_total', 'Failed calls to the Slack Web API', ('method', 'error')))
+TRACK_CALL_SECONDS = REGISTRY.register(Histogram(
+    'musicbot_track_service_call_seconds', 'Time taken by calls to the music services', ('service', 'operation')))
+TRACK_CALL_ERRORS = REGISTRY.register(Counter(
+    'musicbot_track_service_call_errors_total', 'Failed calls to the music services', ('service', 'operation', 'error')))
+EVENT_HANDLING_SECONDS = REGISTRY.register(Histogram(
+    'musicbot_event_handling_seconds', 'Time taken to handle a single RTM event', ('type',)))
+EVENT_HANDLING_ERRORS = REGISTRY.register(Counter(
+    'musicbot_event_handling_errors_total', 'RTM events whose handling raised', ('type', 'error')))
+LINK_TO_REACTION_SECONDS = REGISTRY.register(Histogram(
+    'musicbot_link_to_reaction_seconds', 'Time from a link being posted to the reaction for a service being queued',
+    ('service',), buckets=(0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60, 120, 300)))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'musicbot_queue_depth', 'Number of items waiting in each of the bot\'s internal queues', ('queue',)))
+EVENT_QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    'musicbot_event_queue_wait_seconds', 'Time events spend queued before a worker picks them up'))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    'musicbot_cache_hit_ratio', 'Proportion of lookups answered from each cache', ('cache',)))
+CACHE_ENTRIES = REGISTRY.register(Gauge(
+    'musicbot_cache_entries', 'Number of entries held in each cache', ('cache',)))
+YOUTUBE_QUOTA_REMAINING = REGISTRY.register(Gauge(
+    'musicbot_youtube_quota_remaining', 'YouTube Data API quota units left until the quota resets at midnight Pacific'))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    'musicbot_startup_seconds', 'Time taken by each stage of the bot\'s last startup', ('stage',)))
+
+
+def percentile(sorted_values, fraction):
+    """
+    Reads a percentile from raw measurements, for offline reports where histogram buckets would be too coarse.
+    :param sorted_values: The measurements, in ascending order
+    :param fraction: The percentile wanted, as a fraction (0.99 for the 99th percentile)
+    :return: The measurement at that percentile, or None if there are none
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class StartupTimer:
+    """
+    Records how long each stage of the bot's startup takes, from the process starting to the first RTM connection, for
+    the startup report and the startup gauge.
+    """
+
+    def __init__(self, started_at=None):
+        """
+        :param started_at: time.perf_counter() reading taken when startup began. Defaults to now.
+        """
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.last_marked_at = self.started_at
+        self.stages = []
+
+    def mark(self, stage):
+        """
+        Records the end of a stage, which is taken to have begun when the one before it ended.
+        :param stage: Name of the stage
+        :return: None
+        """
+        marked_at = time.perf_counter()
+        self.stages.append((stage, marked_at - self.last_marked_at))
+        STARTUP_SECONDS.set(marked_at - self.last_marked_at, stage=stage)
+        self.last_marked_at = marked_at
+
+    def total(self):
+        return self.last_marked_at - self.started_at
+
+
+class timed:
+    """
+    Context manager recording the time taken by the enclosed block in a histogram, and counting any exception it raises
+    by type in a counter. Both are recorded with the same labels, the counter having an extra error label.
+    """
+
+    def __init__(self, histogram, error_counter=None, **labels):
+        self.histogram = histogram
+        self.error_counter = error_counter
+        self.labels = labels
+        self.started_at = None
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.histogram.observe(time.perf_counter() - self.started_at, **self.labels)
+        if exception_type is not None and self.error_counter is not None:
+            self.error_counter.inc(error=exception_type.__name__, **self.labels)
+        return False
+
+
+def instrumented(histogram, error_counter=None, **labels):
+    """
+    Decorator timing every call of a function as per timed.
+    """
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(histogram, error_counter, **labels):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the contents of the registry at /metrics
+    """
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, message_format, *args):
+        pass
+
+
+class MetricsServer:
+    """
+    Small local HTTP server exposing the metrics in Prometheus text format, run on a background thread
+    """
+
+    def __init__(self, port=DEFAULT_METRICS_PORT, host='127.0.0.1'):
+        self.server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name='metrics-server')
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,20 +1,46 @@
-from httplib2 import Http
 from oauth2client.client import flow_from_clientsecrets, Storage
 from oauth2client.tools import run_flow
 from googleapiclient.discovery import build
 from slackclient import SlackClient
-from auth_data import SpotifyAuthData, PlayLoginData
-from helpers import run_once
-from re import sub as regex_substitute
-from track_types import SpotifyTrack, YoutubeVideo, GooglePlayTrack
-from spotipy.client import SpotifyException
+from slackclient.client import SlackNotConnected
+from slackclient.server import SlackConnectionError
+from services import SpotifyService, SpotifyTokenManager, LazyService
+from http_transport import PooledSession, PooledHttp, use_pooled_transport
+from discovery_document_cache import DiskDiscoveryCache
+from slack_scheduler import SlackScheduler, TIER_LIMITS, PRIORITY_COMMAND, PRIORITY_REPLY, PRIORITY_DEFAULT, PRIORITY_REACTION
+from auth_data import SpotifyAuthData
+from backfill import PlaylistBackfill
+from track_types import Track, SpotifyTrack, YoutubeVideo, GooglePlayTrack, TrackNotFoundException
+from playlist_mirror import PlaylistMirror
+from search_cache import SearchCache
+from track_identity import TrackIdentityIndex
+from track_metadata import TrackMetadataCache
+from job_queue import JobQueue
+from youtube_quota import YoutubeQuota, DEFAULT_DAILY_QUOTA
+from catch_up import ChannelCursors, fetch_missed_messages, DEFAULT_MAX_CATCH_UP_AGE
 from slack_objects import SlackEvent
 from os import listdir, path
 import sys
 from websocket import WebSocketConnectionClosedException
-from spotipy import Spotify, util
 from event_logger import Logger
-from gmusicapi import Mobileclient
+from event_sink import EventSink
+from user_directory import UserDirectory, USER_EVENT_TYPES
+from playlist_writer import DEFAULT_FLUSH_WINDOW
+from event_dispatcher import EventDispatcher, DEFAULT_EVENT_WORKERS, DEFAULT_MAX_QUEUED_EVENTS
+from metrics import MetricsServer, StartupTimer, timed, DEFAULT_METRICS_PORT, EVENT_HANDLING_SECONDS, EVENT_HANDLING_ERRORS, \
+    LINK_TO_REACTION_SECONDS, QUEUE_DEPTH, CACHE_HIT_RATIO, CACHE_ENTRIES, YOUTUBE_QUOTA_REMAINING
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from random import uniform
+import threading
+import time
+
+DEFAULT_TRACK_WORKERS = 4
+DEFAULT_MAX_HANDLED_MESSAGES = 10000
+DEFAULT_LISTING_CHUNK_LINES = 1000
+DEFAULT_RECONNECT_BACKOFF = 1
+DEFAULT_MAX_RECONNECT_BACKOFF = 60
+DEFAULT_JOB_RETRY_INTERVAL = 30
 
 
 class MusicBot:
@@ -23,60 +49,112 @@ class MusicBot:
     functionality.
     """
 
-    @run_once
-    def add_existing_youtube_playlist_to_spotify(self, yt_playlist, spot_playlist):
+    def backfill_playlist(self, source_service_name, target_service_name, channel=None):
+        """
+        Cross-searches every track in one service's playlist and adds those found to the other service's playlist.
+        Catch-up functionality for when support for a service is added, or links have been missed. Resumes from where it
+        stopped if a previous backfill between the same playlists was interrupted.
+        :param source_service_name: Name of the service whose playlist is to be read from, case insensitive
+        :param target_service_name: Name of the service whose playlist is to be added to, case insensitive
+        :param channel: Channel in which to post the outcome, if any
+        :return: The BackfillCheckpoint holding the totals for the backfill, or None if it has been postponed
+        """
+        track_types = {service_name.lower(): track_type for service_name, track_type in self.track_type_map.items()}
+        source_type = track_types[source_service_name.lower()]
+        target_type = track_types[target_service_name.lower()]
+        checkpoint_filepath = 'backfill_{}_to_{}.json'.format(source_service_name.lower(), target_service_name.lower())
+
+        outcome = PlaylistBackfill(source_type, self.service_map[source_type], target_type,
+                                   self.service_map[target_type], checkpoint_filepath,
+                                   postpone=lambda: self.is_quota_low(source_type, target_type)).run()
+        if outcome is None:
+            self.postpone_backfill(source_service_name, target_service_name, channel)
+            return None
+        if channel is not None:
+            self.post_message('Backfill from {} to {} complete: {} tracks checked, {} added, {} already present, '
+                              '{} not found, {} failed.'.format(source_service_name, target_service_name,
+                                                                outcome.processed, outcome.added,
+                                                                outcome.already_present, outcome.not_found,
+                                                                outcome.failed), channel)
+        return outcome
+
+    def postpone_backfill(self, source_service_name, target_service_name, channel):
         """
-        Performs a Spotify cross-search and playlist add for each item currently in the YouTube playlist. Catch-up 
-        functionality seeing as Spotify support was implemented later. Bit filthy and nasty, but excusable for a 
-        single-use thing.
-        :param yt_playlist: The source YouTube playlist from which to acquire tracks to add
-        :param spot_playlist: The destination Spotify playlist to which to add the tracks cross-searched from YouTube
+        Holds a backfill back until the YouTube quota resets, when it resumes from its checkpoint.
         :return: None
         """
-        query_request = self.youtube_service.playlistItems().list(
-            part="snippet", playlistId=yt_playlist, maxResults=50
-        )
-        query_response = query_request.execute()
-        query_request = self.youtube_service.playlistItems().list_next(
-            query_request, query_response
-        )
-        query_response = query_request.execute()
-        videos = query_response['items']
-        tracks_found = []
-        for video in videos:
-            search_string = regex_substitute(r'[[](\w|\s)*[]]', '', video['snippet']['title'])
-            print(search_string)
-            search_response = self.spotify_service.search(search_string, limit=1, type='track')
-            if 'tracks' in search_response:
-                if len(search_response['tracks']['items']) > 0:
-                    found_track = search_response['tracks']['items'][0]
-                    tracks_found.append(SpotifyTrack(found_track['id'],
-                                                     found_track['artists'][0]['name'] + ' - ' + found_track['name'],
-                                                     'existing YouTube playlist'))
-        tracks_in_playlist = self.tracks_in_playlist(spot_playlist)
-        for track in tracks_found:
-            if track.id not in tracks_in_playlist:
-                self.spotify_service.user_playlist_add_tracks('strongohench', spot_playlist, [track.id])
-                self.logger.song_added(track, spot_playlist)
-
-    def api_call(self, *args, **kwargs):
-        """
-        Wrapper function to allow for cleaner access to the Slack service's API methods
-        :param args: Arguments to pass through to the api call
+        delay = self.youtube_quota.seconds_until_reset()
+        if channel is not None:
+            self.post_message('YouTube quota is running low, so the backfill from {} to {} will carry on when it resets '
+                              'in {:.1f} hours.'.format(source_service_name, target_service_name, delay / 3600),
+                              channel)
+        timer = threading.Timer(delay, self.start_backfill, (source_service_name, target_service_name, channel))
+        timer.daemon = True
+        timer.start()
+
+    def is_quota_low(self, *track_types):
+        """
+        :param track_types: Track types that work would call upon
+        :return: Whether the work calls upon YouTube and the YouTube quota is low, so that it should wait if it can
+        """
+        return YoutubeVideo in track_types and self.youtube_quota.is_low()
+
+    def start_backfill(self, source_service_name, target_service_name, channel):
+        """
+        Runs a backfill on its own thread, so that it does not hold up an event worker for its whole duration. Only one
+        backfill between the same pair of services runs at a time.
+        :return: None
+        """
+        backfill_key = (source_service_name.lower(), target_service_name.lower())
+        with self.backfills_lock:
+            if backfill_key in self.running_backfills:
+                self.post_message('A backfill from {} to {} is already running.'.format(*backfill_key), channel)
+                return
+            self.running_backfills.add(backfill_key)
+
+        def run_backfill():
+            try:
+                self.backfill_playlist(source_service_name, target_service_name, channel)
+            except Exception as backfill_error:
+                self.logger.backfill_failed(source_service_name, target_service_name, backfill_error)
+                if channel is not None:
+                    self.post_message('The backfill from {} to {} failed: {}. Starting it again will carry on from '
+                                      'where it stopped.'.format(source_service_name, target_service_name,
+                                                                 backfill_error), channel)
+            finally:
+                with self.backfills_lock:
+                    self.running_backfills.discard(backfill_key)
+
+        threading.Thread(target=run_backfill, daemon=True, name='backfill-{}-{}'.format(*backfill_key)).start()
+
+    def api_call(self, method, priority=PRIORITY_DEFAULT, **kwargs):
+        """
+        Wrapper function to allow for cleaner access to the Slack service's API methods. Calls go through the outbound
+        scheduler so that they respect Slack's rate limits, and this waits for the result.
+        :param method: Name of the Slack API method to call
+        :param priority: Lane in which the call is queued, lower values being sent first
         :param kwargs: Keyword arguments to pass through to the api call
         :return: The result of the api call that the passed parameters have triggered
         """
-        return self.slack_service.api_call(*args, **kwargs)
+        return self.slack_scheduler.call(method, priority, **kwargs)
+
+    def queue_api_call(self, method, priority=PRIORITY_DEFAULT, **kwargs):
+        """
+        Queues a call to one of the Slack service's API methods without waiting for it to be sent.
+        :param method: Name of the Slack API method to call
+        :param priority: Lane in which the call is queued, lower values being sent first
+        :param kwargs: Keyword arguments to pass through to the api call
+        :return: Future resolving to the result of the api call
+        """
+        return self.slack_scheduler.submit(method, priority, **kwargs)
 
     def get_username(self, user_id):
         """
-        Uses the Slack API to retrieve the username of a given user when provided with their Slack User ID
+        Retrieves the username of a given user when provided with their Slack User ID, from the local user directory
         :param user_id: The unique Slack ID of the user in question
         :return: String value of the user's name
         """
-        user_info = self.api_call('users.info', user=user_id)
-        if user_info is not None:
-            return user_info['user']['name']
+        return self.user_directory.get_username(user_id)
 
     def add_reaction(self, channel, timestamp, reaction_name):
         """
@@ -86,7 +164,8 @@ class MusicBot:
         :param reaction_name: The emoji name to add to the message as a reaction. Custom emojis supported in this.
         :return: None
         """
-        self.api_call('reactions.add', name=reaction_name, timestamp=timestamp, channel=channel)
+        self.queue_api_call('reactions.add', PRIORITY_REACTION, name=reaction_name, timestamp=timestamp,
+                            channel=channel)
         pass
 
     def mark_message_as_added_to_playlist(self, channel, timestamp, service):
@@ -133,9 +212,10 @@ class MusicBot:
         :param: Channel in which the message is to be posted. Defaults to the one held on the bot.
         """
         if channel is not None:
-            self.api_call('chat.postMessage', as_user=True, channel=channel, text=message)
+            self.api_call('chat.postMessage', PRIORITY_COMMAND, as_user=True, channel=channel, text=message)
         else:
-            self.api_call('chat.postMessage', as_user=True, channel=self.default_channel, text=message)
+            self.api_call('chat.postMessage', PRIORITY_COMMAND, as_user=True, channel=self.default_channel,
+                          text=message)
 
     def post_reply(self, message_text, channel, timestamp):
         """
@@ -145,7 +225,8 @@ class MusicBot:
         :param timestamp: The timestamp through which to identify the message to which this will be a response
         :return: None
         """
-        self.api_call('chat.postMessage', as_user=True, channel=channel, thread_ts=timestamp, text=message_text)
+        self.api_call('chat.postMessage', PRIORITY_REPLY, as_user=True, channel=channel, thread_ts=timestamp,
+                      text=message_text)
 
     def post_cross_search_failure(self, service, title, channel):
         """
@@ -155,7 +236,7 @@ class MusicBot:
         :param channel: The channel this message is to be posted to
         :return: None
         """
-        self.api_call('chat.postMessage', as_user=True, channel=channel,
+        self.api_call('chat.postMessage', PRIORITY_REPLY, as_user=True, channel=channel,
                       text='Cross searching on ' + service + ' failed to find ' + title)
         pass
 
@@ -215,120 +296,126 @@ class MusicBot:
                             self.post_message('Sorry, service ' + service_name + ' is not currently supported.')
                             self.logger.unrecognised_service(service_name)
 
-    def print_spotify_tracklist(self, channel, playlist=None):
+    def print_tracklist(self, service_name, channel, last=None, added_by=None):
         """
-        Prints the current content of the Spotify playlist to the channel provided as a code snippet
+        Prints the content of a service's playlist to the channel provided as code snippets. The listing is read from
+        the local mirror of the playlist rather than paged through from the service, and is split across several
+        snippets when it is longer than DEFAULT_LISTING_CHUNK_LINES tracks. The mirror is not brought up to date first
+        if doing so would draw on a low YouTube quota.
+        :param service_name: Name of the service whose playlist is to be listed
         :param channel: The channel to be posted to
-        :param playlist: The playlist for which the track listing is to be printed. Defaults to the one held on the bot.
+        :param last: Number of tracks to list from the end of the playlist, or None to list them all
+        :param added_by: Name of the user whose tracks are to be listed, or None to list every user's
         :return: None
         """
-        if playlist is None:
-            playlist = self.spotify_playlist
-            pass
+        track_type = self.track_type_map[service_name]
+        playlist_track = track_type(None, None, None, self.service_map[track_type])
+        synced = not self.is_quota_low(track_type)
+        if synced:
+            # Only syncs the mirror with the service if the playlist index has gone stale
+            playlist_track.get_playlist_index()
+        tracks = self.playlist_mirror.listing(playlist_track.playlist_id, last, added_by)
+        total = self.playlist_mirror.track_count(playlist_track.playlist_id)
 
-        playlist_track_titles = []
-        attempt_successful = False
-        while not attempt_successful:
-            try:
-                playlist_tracks = self.spotify_service.user_playlist('strongohench', playlist, fields='tracks, next')[
-                    'tracks']
-                tracks = playlist_tracks['items']
-                for track in tracks:
-                    playlist_track_titles.append(track['track']['artists'][0]['name'] + ' - ' + track['track']['name'])
-                    pass
-                while playlist_tracks['next']:
-                    playlist_tracks = self.spotify_service.next(playlist_tracks)
-                    tracks = playlist_tracks['items']
-                    for track in tracks:
-                        playlist_track_titles.append(
-                            track['track']['artists'][0]['name'] + ' - ' + track['track']['name'])
-                        pass
-                attempt_successful = True
-            except SpotifyException:
-                self.spotify_service = self.get_spotify_service(self.spotify_auth_data)
-
-        print_string = ''
-        for title in playlist_track_titles:
-            print_string += str(title) + '\n'
-            pass
-
-        output_title = '| SPOTIFY PLAYLIST CONTENTS ({}) TRACKS |\n'.format(len(playlist_track_titles))
-        top_bottom = '-' * (len(output_title) - 1) + '\n'
-
-        print_string = top_bottom + output_title + top_bottom + print_string
-
-        print_string = print_string[:-1]
-
-        self.api_call('files.upload', content=print_string, filename='Spotify_Playlist', mode='snippet',
-                      channels=channel)
-        pass
+        selection = '{} OF {} TRACKS'.format(len(tracks), total) if len(tracks) != total else '{} TRACKS'.format(total)
+        if added_by is not None:
+            selection += ', ADDED BY {}'.format(added_by.upper())
+        if not synced:
+            selection += ', AS OF LAST SYNC'
+        titles = [track.title or track.id for track in tracks]
+        chunks = [titles[start:start + DEFAULT_LISTING_CHUNK_LINES]
+                  for start in range(0, len(titles), DEFAULT_LISTING_CHUNK_LINES)] or [[]]
+
+        for chunk_number, chunk in enumerate(chunks, 1):
+            part = ' PART {} OF {}'.format(chunk_number, len(chunks)) if len(chunks) > 1 else ''
+            output_title = '| {} PLAYLIST CONTENTS ({}){} |'.format(service_name.upper(), selection, part)
+            top_bottom = '-' * len(output_title)
+            filename = '{}_Playlist'.format(service_name)
+            if part:
+                filename += '_{}'.format(chunk_number)
+            self.queue_api_call('files.upload', PRIORITY_COMMAND,
+                                content='\n'.join([top_bottom, output_title, top_bottom] + chunk), filename=filename,
+                                mode='snippet', channels=channel)
 
-    def print_youtube_tracklist(self, channel, playlist=None):
+    def handle_list_command(self, message_text, channel):
         """
-        Prints the current content of the YouTube playlist to the channel provided as a code snippet
-        :param channel: The channel to which the message should be printed
-        :param playlist: The playlist this is to be added to. Defaults to the one held as a member variable on the bot
+        Acts upon a --list command, e.g. '--list spotify --last 50 --by someone', listing the playlist of each service
+        named in it.
+        :param message_text: Text of the message containing the command
+        :param channel: The channel the command was posted in, to which the listings are posted
         :return: None
         """
-        if playlist is None:
-            playlist = self.youtube_playlist
-            pass
-
-        playlist_query = self.youtube_service.playlistItems().list(
-            part="snippet", playlistId=playlist, maxResults=50
-        )
-
-        playlist_video_titles = []
+        arguments = message_text.split()
+        last = None
+        added_by = None
+        try:
+            if '--last' in arguments:
+                last = int(arguments[arguments.index('--last') + 1])
+            if '--by' in arguments:
+                added_by = arguments[arguments.index('--by') + 1]
+        except (IndexError, ValueError):
+            self.post_message('Usage: --list <{}> [--last <number of tracks>] [--by <user>]'.format(
+                '|'.join(sorted(service_name.lower() for service_name in self.track_type_map))), channel)
+            return
+        if added_by is not None and added_by.startswith('<@'):
+            added_by = self.get_username(added_by.strip('<@>').split('|')[0])
 
-        while playlist_query:
-
-            playlist_results = playlist_query.execute()
-            playlist_results_list = playlist_results['items']
-
-            for track in playlist_results_list:
-                playlist_video_titles.append(track['snippet']['title'])
-                pass
-
-            playlist_query = self.youtube_service.playlistItems().list_next(
-                playlist_query, playlist_results
-            )
-
-        print_string = ''
-        for title in playlist_video_titles:
-            print_string += str(title) + '\n'
-            pass
-
-        output_title = '| YOUTUBE PLAYLIST CONTENTS ({}) TRACKS |\n'.format(len(playlist_video_titles))
-        top_bottom = '-' * (len(output_title) - 1) + '\n'
-
-        print_string = top_bottom + output_title + top_bottom + print_string
-
-        print_string = print_string[:-1]
-
-        self.api_call('files.upload', content=print_string, filename='YouTube_Playlist', mode='snippet',
-                      channels=channel)
-        pass
+        requested_services = {argument.lower() for argument in arguments}
+        for service_name in self.track_type_map:
+            if service_name.lower() in requested_services:
+                self.print_tracklist(service_name, channel, last, added_by)
+                self.logger.playlist_contents_requested(service_name.lower())
 
     def scan_for_relevant_attachment(self, event_json):
         """
         Object-based approach used to analyse an incoming event and determine whether or not it contains content to be 
-        added to our playlists, and extracting this information if found.
+        added to our playlists, and extracting this information if found. Links are read from the message text as soon
+        as the message is posted, falling back to Slack's unfurled attachments, and each message is only acted upon
+        once: the unfurl arriving later for a message already handled is ignored.
         :param event_json: The json message representing the inbound event
         :return: A Track object, under the circumstances that the event holds the relevant information to create one
         """
         event = SlackEvent(event_json)
         if event.type is not None and event.type == 'message' and event.message is not None:
-            if event.message.attachments is not None and not event.message.is_reply:
-                self.log_event(event_json)
-                for attachment in event.message.attachments:
-                    if attachment.service_name is not None:
-                        if attachment.service_name in self.track_type_map and attachment.id is not None:
-                            relevant_track_type = self.track_type_map[attachment.service_name]
-                            return relevant_track_type(attachment.id,
-                                                       attachment.title,
-                                                       self.get_username(event.message.user),
-                                                       self.service_map[relevant_track_type])
+            if not event.message.is_reply and not self.is_message_handled(event.message.timestamp):
+                links = [link for link in (event.message.attachments or []) + event.message.links
+                         if link.service_name in self.track_type_map and link.id is not None]
+                if links:
+                    self.log_event(event_json)
+                    relevant_track_type = self.track_type_map[links[0].service_name]
+                    track = relevant_track_type(links[0].id,
+                                                links[0].title,
+                                                self.get_username(event.message.user),
+                                                self.service_map[relevant_track_type])
+                    track.artist = links[0].artist
+                    if track.title is None:
+                        track.get_full_track_info()
+                    if track.title is None:
+                        return None
+                    self.mark_message_handled(event.message.timestamp)
+                    return track
 
+    def is_message_handled(self, timestamp):
+        """
+        :param timestamp: Timestamp identifying the message
+        :return: Whether a track has already been taken from the message, by this run of the bot or an earlier one
+        """
+        with self.handled_messages_lock:
+            if timestamp in self.handled_messages:
+                return True
+        return self.job_queue.contains(timestamp)
+
+    def mark_message_handled(self, timestamp):
+        """
+        Records that a track has been taken from a message, forgetting the oldest messages recorded once more than the
+        bot's limit are held.
+        :param timestamp: Timestamp identifying the message
+        :return: None
+        """
+        with self.handled_messages_lock:
+            self.handled_messages[timestamp] = True
+            while len(self.handled_messages) > self.max_handled_messages:
+                self.handled_messages.popitem(last=False)
 
     def print_newest_unprinted_changelog(self, path):
         """
@@ -363,34 +450,399 @@ class MusicBot:
         """
         self.post_reply(track.link, event.channel, event.message.timestamp)
 
-    def treat_song(self, found_song, source_event):
+    def run_job_step(self, job, service_name, step, action):
+        """
+        Runs a single step of a job, unless it was completed by an earlier attempt at the job, and records it as
+        completed.
+        :param job: The Job the step belongs to, or None to run the step without recording it
+        :param service_name: Name of the service the step is for
+        :param step: Name of the step
+        :param action: Function performing the step, returning a JSON-serialisable result
+        :return: The result of the step, as returned by action or as recorded by the earlier attempt
+        """
+        if job is not None and job.is_step_completed(service_name, step):
+            return job.get_step_result(service_name, step)
+        result = action()
+        if job is not None:
+            self.job_queue.complete_step(job, service_name, step, result)
+        return result
+
+    @staticmethod
+    def find_track(track):
+        """
+        :param track: The track to be found, cross-searching its own service for it if its ID is not already known
+        :return: List of the track's ID and title, or None if it could not be found
+        """
+        if track.id is None and not track.find_self_in_own_service():
+            return None
+        return [track.id, track.title]
+
+    def add_track_and_mark_message(self, track, source_event, reply_with_link, job=None):
+        """
+        The full pipeline for a single service: find the track if necessary, add it to that service's playlist, then
+        reply with the link (for cross-searched tracks) and react to the source message with the outcome. Each of
+        these steps is recorded against the job as it completes, so that a resumed job carries on from the first
+        step not yet done. Adding is safe to repeat, as a track already in the playlist is not added again.
+        :param track: The track to be added to its own service's playlist
+        :param source_event: The message event containing the original link
+        :param reply_with_link: Whether to post the track's link as a thread reply to the original message
+        :param job: The Job the track is being processed for, or None if the steps are not to be recorded
+        :return: True if the track was added, False if it was already present in the playlist
+        """
+        timestamp = source_event.message.timestamp
+        service_name = track.service_name
+        found_track = self.run_job_step(job, service_name, 'find', lambda: self.find_track(track))
+        if found_track is None:
+            self.run_job_step(job, service_name, 'react', lambda: self.mark_song_as_unable_to_be_found(
+                self.default_channel, timestamp, service_name.lower()))
+            raise TrackNotFoundException
+        if track.id != found_track[0]:
+            track.id, track.title = found_track
+            track.format_link()
+
+        added = self.run_job_step(job, service_name, 'add', track.add_self_to_own_playlist)
+        if reply_with_link:
+            self.run_job_step(job, service_name, 'reply',
+                              lambda: self.reply_with_cross_searched_link(source_event, track))
+        self.run_job_step(job, service_name, 'react', lambda: self.mark_message_as_added_to_playlist(
+            self.default_channel, timestamp, service_name.lower()))
+        LINK_TO_REACTION_SECONDS.observe(time.time() - float(timestamp), service=service_name)
+        return added
+
+    def treat_song(self, found_song, source_event, job=None):
         """
         Process the song that has been found: add it to the playlist for its' own service, as well as cross-searching to
-        add to the other supported services
+        add to the other supported services. Each service is handled independently on the bot's worker pool, so the
+        time taken follows the slowest service rather than the total of all of them. The outcome for each service is
+        logged alongside the source event, so that replays of the event log can be checked against it.
+        The details of the song used to match it (its duration and ISRC) are read first, where its service supplies
+        them from the shared metadata cache. It is then looked up in the track identity index: services on which it is
+        already known by an ID are not cross-searched, and a song already in a playlist under another ID (a different
+        release or upload) is not added again.
+        When processed for a job, the steps completed for each service are recorded against the job, and the job is
+        finished once every service has either added the song or found it not to be available.
         :param found_song: The song object created from the Slack event data
         :param source_event: The source Slack event JSON
-        :return: None
+        :param job: The Job the song is being processed for, or None if its progress is not to be recorded
+        :return: Dictionary of service name to the outcome for that service, as per get_track_outcome
         """
 
-        found_song.add_self_to_own_playlist()
-        self.mark_message_as_added_to_playlist(self.default_channel, source_event.message.timestamp, found_song.service_name.lower())
-
-        type_list = []
+        try:
+            found_song.load_track_metadata()
+        except Exception as metadata_error:
+            self.logger.track_metadata_unavailable(found_song.service_name, found_song.title, metadata_error)
+        identity = self.track_identity.resolve(found_song.service_name, found_song.id, found_song.title,
+                                               found_song.isrc, found_song.artist)
+        found_song.equivalent_ids = identity.get_equivalent_ids(found_song.service_name, found_song.id)
+        identity_id = identity.identity_id
+        tracks = {found_song.service_name: found_song}
+        pending_results = {
+            found_song.service_name: self.track_worker_pool.submit(
+                self.add_track_and_mark_message, found_song, source_event, False, job)
+        }
 
         for track_type in self.track_type_map:
             if track_type != found_song.service_name:
-                type_list.append(self.track_type_map[track_type])
+                relevant_track_type = self.track_type_map[track_type]
+                track = relevant_track_type(None, found_song.title, found_song.added_by,
+                                            self.service_map[relevant_track_type])
+                track.duration_ms = found_song.duration_ms
+                known_ids = identity.track_ids.get(track.service_name)
+                if known_ids:
+                    track.id = known_ids[0]
+                    track.title = identity.titles[track.id]
+                    track.equivalent_ids = identity.get_equivalent_ids(track.service_name)
+                    track.format_link()
+                tracks[track.service_name] = track
+                pending_results[track.service_name] = self.track_worker_pool.submit(
+                    self.add_track_and_mark_message, track, source_event, True, job)
 
-        cross_search_tracks = []
+        outcomes = {}
+        for service_name, pending_result in pending_results.items():
+            try:
+                outcome = 'added' if pending_result.result() else 'already_present'
+                error = None
+            except TrackNotFoundException:
+                self.logger.failed_to_find_relevant_track(service_name, found_song.title)
+                outcome = 'not_found'
+                error = None
+            except Exception as pipeline_error:
+                self.logger.track_processing_failed(service_name, found_song.title, pipeline_error)
+                outcome = 'failed'
+                error = pipeline_error
+            outcomes[service_name] = self.get_track_outcome(tracks[service_name], outcome, error)
+            if outcome in ('added', 'already_present'):
+                track = tracks[service_name]
+                # Linking a track by its ISRC can merge the song into another, which the rest of the links then join
+                identity_id = self.track_identity.link(identity_id, service_name, track.id, track.title, track.isrc)
 
-        for track_type in type_list:
-            cross_search_tracks.append(track_type(None, found_song.title, found_song.added_by, self.service_map[track_type]))
+        self.logger.log_outcome_to_file(source_event.message.timestamp, outcomes)
+        if job is not None:
+            self.job_queue.finish(job, all(outcome['outcome'] != 'failed' for outcome in outcomes.values()))
+        return outcomes
 
-        for track in cross_search_tracks:
-            track.add_self_to_own_playlist()
-            self.reply_with_cross_searched_link(source_event, track)
-            self.mark_message_as_added_to_playlist(self.default_channel, source_event.message.timestamp, track.service_name.lower())
+    @staticmethod
+    def get_track_outcome(track, outcome, error=None):
+        """
+        Describes what became of a track in a form that can be logged and compared.
+        :param track: The track that was processed
+        :param outcome: One of 'added', 'already_present', 'not_found' or 'failed'
+        :param error: The exception that caused the failure, for failed tracks
+        :return: Dictionary holding the outcome, the track's ID and title, and the error if any
+        """
+        track_outcome = {'outcome': outcome, 'track_id': track.id, 'title': track.title}
+        if error is not None:
+            track_outcome['error'] = repr(error)
+        return track_outcome
+
+    def preload_playlist_indexes(self):
+        """
+        Loads the membership index for the playlist of each supported service, so that the first link posted does not
+        pay for a full scan of the playlist. With the local mirror in place this only fetches what has changed since
+        the bot last ran.
+        :return: None
+        """
+        for track_type in self.service_map:
+            track_type(None, None, None, self.service_map[track_type]).get_playlist_index().ensure_fresh()
 
+    def warm_up(self):
+        """
+        The startup work the bot can connect and read events without: loading the user directory, bringing the playlist
+        indexes up to date, posting the newest changelog and resuming unfinished jobs. Run in the background so that it
+        does not hold up the first RTM connection; anything needed before it has finished is loaded when first used.
+        Once done, the user directory is refreshed and failed jobs retried in the background from then on.
+        :return: None
+        """
+        stages = [
+            ('user_directory', self.user_directory.load),
+            ('playlist_indexes', self.preload_playlist_indexes),
+            ('changelog', lambda: self.print_newest_unprinted_changelog(self.default_changelog_location)),
+            ('unfinished_jobs', self.resume_unfinished_jobs)
+        ]
+        for stage, action in stages:
+            try:
+                action()
+            except Exception as warm_up_error:
+                self.logger.warm_up_failed(stage, warm_up_error)
+        self.user_directory.start_refreshing()
+        self.start_retrying_jobs()
+
+    def resume_unfinished_jobs(self):
+        """
+        Picks up the tracks an earlier run of the bot had not finished processing when it stopped, running only the steps
+        of each that had not yet been completed.
+        :return: None
+        """
+        jobs = self.job_queue.start_unfinished()
+        if jobs:
+            self.logger.jobs_resumed(len(jobs))
+        self.resume_jobs(jobs)
+
+    def start_retrying_jobs(self):
+        """
+        Starts retrying failed jobs in the background, checking for those due every retry interval until the bot is
+        stopped, if not already doing so.
+        :return: None
+        """
+        if self.job_retry_thread is not None and self.job_retry_thread.is_alive():
+            return
+        self.job_retry_thread = threading.Thread(target=self._retry_jobs, daemon=True, name='job-retry')
+        self.job_retry_thread.start()
+
+    def _retry_jobs(self):
+        while not self.stop_requested.wait(self.job_retry_interval):
+            try:
+                self.retry_due_jobs()
+            except Exception as retry_error:
+                self.logger.job_retry_failed(retry_error)
+
+    def retry_due_jobs(self):
+        """
+        Picks up the tracks whose processing failed part-way through, such as on a server error or with the YouTube
+        quota used up, once their backoff has passed. Only the steps that had not been completed are run again.
+        :return: None
+        """
+        jobs = self.job_queue.start_due()
+        if jobs:
+            self.logger.jobs_retried(len(jobs))
+        self.resume_jobs(jobs)
+
+    def resume_jobs(self, jobs):
+        """
+        Runs the steps not yet completed of each of the given jobs, one job at a time.
+        :param jobs: List of Job objects claimed from the job queue
+        :return: None
+        """
+        for job in jobs:
+            try:
+                track_type = self.track_type_map[job.service_name]
+                found_song = track_type(job.track_id, job.title, job.added_by, self.service_map[track_type])
+                self.mark_message_handled(job.timestamp)
+                self.treat_song(found_song, SlackEvent(job.event), job)
+            except Exception as resume_error:
+                self.logger.job_resume_failed(job.timestamp, resume_error)
+                self.job_queue.finish(job, False)
+
+    @staticmethod
+    def get_event_ordering_key(event):
+        """
+        Determines which events need handling in the order they were received: everything relating to the same message
+        (the message itself, its later edits and unfurls, reactions to it) shares that message's timestamp, and changes
+        to the same user share that user's ID.
+        :param event: The source inbound Slack event JSON
+        :return: The timestamp or user ID the event relates to, or None if it relates to neither
+        """
+        if 'message' in event and 'ts' in event['message']:
+            return event['message']['ts']
+        if 'item' in event and 'ts' in event['item']:
+            return event['item']['ts']
+        if event.get('type') in USER_EVENT_TYPES:
+            return event['user']['id']
+        return event.get('ts')
+
+    def handle_event(self, event):
+        """
+        Acts upon a single event read from the RTM connection. Called from the event worker threads.
+        :param event: The source inbound Slack event JSON
+        :return: None
+        """
+        handled = False
+        try:
+            with timed(EVENT_HANDLING_SECONDS, EVENT_HANDLING_ERRORS, type=event['type']):
+                self.handle_event_untimed(event)
+            handled = True
+        finally:
+            if self.is_channel_message(event):
+                # Commands have no job to record that they have been run, so the cursor is saved as soon as they are
+                self.channel_cursors.complete(event['channel'], event['ts'], handled,
+                                              save_now='--' in event.get('text', ''))
+
+    @staticmethod
+    def is_channel_message(event):
+        """
+        :param event: The source inbound Slack event JSON
+        :return: Whether the event is a message in a channel, as tracked by the channel cursors
+        """
+        return event.get('type') == 'message' and 'channel' in event and 'ts' in event
+
+    def dispatch_event(self, event):
+        """
+        Queues an event to be handled by the event workers, recording messages as in flight so that the channel cursor
+        does not pass them before they have been handled.
+        :param event: The source inbound Slack event JSON
+        :return: None
+        """
+        if self.is_channel_message(event):
+            self.channel_cursors.begin(event['channel'], event['ts'])
+        self.event_dispatcher.put(event, self.get_event_ordering_key(event))
+
+    def handle_event_untimed(self, event):
+        """
+        Acts upon a single event, as per handle_event but without recording how long it took.
+        :param event: The source inbound Slack event JSON
+        :return: None
+        """
+        if event['type'] in USER_EVENT_TYPES:
+            self.user_directory.handle_event(event)
+            return
+
+        slack_event = SlackEvent(event)
+        song = self.scan_for_relevant_attachment(event)
+        if song is not None:
+            job = self.job_queue.create(slack_event.message.timestamp, slack_event.channel, song,
+                                        list(self.track_type_map), event)
+            if job is not None:
+                try:
+                    self.treat_song(song, slack_event, job)
+                except Exception:
+                    # Left as it is, the job would be neither retried nor abandoned
+                    self.job_queue.finish(job, False)
+                    raise
+
+        elif event['type'] == 'message' and 'text' in event and 'channel' in event:
+            message_text = event['text']
+            message_channel = event['channel']
+            if 'ts' in event and self.channel_cursors.is_handled(message_channel, event['ts']):
+                # A command caught up again after a restart has already been run
+                return
+            if '--list' in message_text:
+                self.handle_list_command(message_text, message_channel)
+            elif message_text.startswith('--backfill'):
+                service_names = {service_name.lower() for service_name in self.track_type_map}
+                arguments = message_text.lower().split()[1:]
+                if len(arguments) == 2 and set(arguments) <= service_names and arguments[0] != arguments[1]:
+                    self.start_backfill(arguments[0], arguments[1], message_channel)
+                else:
+                    self.post_message('Usage: --backfill <{}> <{}>'.format('|'.join(sorted(service_names)),
+                                                                           '|'.join(sorted(service_names))),
+                                      message_channel)
+            elif '--request' in message_text and message_text.split('--request')[0] == '':
+                with open('request_feature.txt', 'a') as file_out:
+                    file_out.write(self.get_username(event['user']) + ': ' + message_text[len(
+                        '--request '):] + '\n')
+                self.post_message('Feature request logged. Ty bitch.', message_channel)
+                pass
+
+    def read_events(self):
+        """
+        Reads events from the RTM connection until it closes, handing those the bot acts upon to the event dispatcher.
+        Nothing is handled on this thread, so slow handling never delays reading from the websocket.
+        :return: None
+        """
+        last_stats_logged = time.monotonic()
+        while self.running:
+            events = self.slack_service.rtm_read()
+            for event in events:
+                if event.get('type') in self.handled_event_types:
+                    self.dispatch_event(event)
+            if time.monotonic() - last_stats_logged >= self.queue_stats_interval:
+                self.logger.event_queue_stats(self.event_dispatcher.stats())
+                last_stats_logged = time.monotonic()
+            if not events:
+                time.sleep(self.idle_read_interval)
+
+    def catch_up(self):
+        """
+        Reads the messages posted to each channel since the last one the bot handled there, such as those posted while
+        it was disconnected, and hands them to the event dispatcher as though they had been read from the RTM
+        connection. Messages that turn out to have been handled already are skipped as usual. Gaps longer than the
+        bot's max catch-up age are only read back that far.
+        :return: None
+        """
+        oldest_allowed = time.time() - self.max_catch_up_age
+        for channel, timestamp in self.channel_cursors.items():
+            if float(timestamp) < oldest_allowed:
+                timestamp = '{:.6f}'.format(oldest_allowed)
+            try:
+                messages = fetch_missed_messages(self.api_call, channel, timestamp)
+            except Exception as catch_up_error:
+                self.logger.catch_up_failed(channel, catch_up_error)
+                continue
+            for message in messages:
+                self.dispatch_event(message)
+            if messages:
+                self.logger.caught_up(channel, len(messages))
+
+    def get_reconnect_delay(self, attempts):
+        """
+        :param attempts: Number of reconnection attempts made since the connection was last up
+        :return: Seconds to wait before the next attempt, drawn at random up to an exponentially growing limit so that
+        reconnections do not all land on Slack at once
+        """
+        return uniform(0, min(self.max_reconnect_backoff, self.reconnect_backoff * 2 ** attempts))
+
+    def register_metrics(self):
+        """
+        Registers the gauges read from the bot's queues and caches whenever metrics are collected.
+        :return: None
+        """
+        QUEUE_DEPTH.set_function(self.event_dispatcher.depth, queue='events')
+        QUEUE_DEPTH.set_function(lambda: self.slack_scheduler.stats()['waiting'], queue='slack_calls')
+        CACHE_HIT_RATIO.set_function(lambda: self.search_cache.stats()['hit_rate'], cache='search')
+        CACHE_ENTRIES.set_function(lambda: self.search_cache.stats()['entries'], cache='search')
+        CACHE_HIT_RATIO.set_function(lambda: self.track_metadata.stats()['hit_rate'], cache='track_metadata')
+        CACHE_ENTRIES.set_function(lambda: self.track_metadata.stats()['entries'], cache='track_metadata')
+        YOUTUBE_QUOTA_REMAINING.set_function(self.youtube_quota.remaining)
 
     def start(self):
         """
@@ -398,71 +850,69 @@ class MusicBot:
         channels as well as group conversations).
         """
         # self.post_message('VERSION UPDATE')
-        self.print_newest_unprinted_changelog(self.default_changelog_location)
-        # self.add_existing_youtube_playlist_to_spotify(self.youtube_playlist, self.spotify_playlist)
+        if self.metrics_port is not None and self.metrics_server is None:
+            self.metrics_server = MetricsServer(self.metrics_port)
+            self.metrics_server.start()
+            self.startup_timer.mark('metrics_server')
+        threading.Thread(target=self.warm_up, daemon=True, name='warm-up').start()
+        self.running = True
+        self.stop_requested.clear()
         attempts = 0
-        while True:
+        while self.running:
             try:
                 if self.slack_service.rtm_connect():
+                    if not self.startup_reported:
+                        self.startup_timer.mark('rtm_connect')
+                        self.logger.startup_report(self.startup_timer)
+                        self.startup_reported = True
                     attempts = 0
-                    while True:
-                        for event in self.slack_service.rtm_read():
-                            slack_event = SlackEvent(event)
-                            song = self.scan_for_relevant_attachment(event)
-                            if song is not None:
-                                self.treat_song(song, slack_event)
-
-                            elif 'type' in event:
-                                if event['type'] == 'message':
-
-                                    if 'text' in event:
-                                        message_text = event['text']
-                                    message_channel = event['channel']
-                                    if '--list' in message_text:
-                                        if 'spotify' in str.lower(message_text):
-                                            self.print_spotify_tracklist(message_channel)
-                                            self.logger.playlist_contents_requested('spotify')
-                                            pass
-                                        if 'youtube' in str.lower(message_text):
-                                            self.print_youtube_tracklist(message_channel)
-                                            self.logger.playlist_contents_requested('youtube')
-                                            pass
-                                    elif '--request' in message_text and message_text.split('--request')[0] == '':
-                                        with open('request_feature.txt', 'a') as file_out:
-                                            file_out.write(self.get_username(event['user']) + ': ' + message_text[len(
-                                                '--request '):] + '\n')
-                                        self.post_message('Feature request logged. Ty bitch.', message_channel)
-                                        pass
-
+                    threading.Thread(target=self.catch_up, daemon=True, name='catch-up').start()
+                    self.read_events()
                 else:
-                    print('Unable to communicate through connection. Restarting will probably resolve this issue.')
-            except WebSocketConnectionClosedException:
-                if attempts < 5:
-                    attempts += 1
-                    print('Websocket closed, attempting reconnect number {} (No news is good news)'.format(attempts))
-                else:
-                    print('Retries exceeded. Bailing.')
-                    break
+                    self.logger.connection_failed()
+            except (WebSocketConnectionClosedException, SlackConnectionError, SlackNotConnected, OSError) \
+                    as connection_error:
+                self.logger.connection_lost(connection_error)
+            if self.running:
+                delay = self.get_reconnect_delay(attempts)
+                attempts += 1
+                self.logger.reconnecting(attempts, delay)
+                self.stop_requested.wait(delay)
+        self.running = False
+
+    def stop(self):
+        """
+        Asks a running bot to stop reading events, after which start returns. Events already read are still handled.
+        :return: None
+        """
+        self.running = False
+        self.stop_requested.set()
+
+    def shutdown(self):
+        """
+        Flushes everything the bot holds in memory that is due to be written to disk, the event log and the search
+        cache, and stops serving metrics.
+        :return: None
+        """
+        self.event_sink.close()
+        self.search_cache.save()
+        self.channel_cursors.save()
+        self.youtube_quota.save()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
 
     @staticmethod
-    def get_spotify_service(spotify_auth_data):
+    def get_spotify_service(spotify_auth_data, http_session):
         """
-        Used at initialisation to create an authenticated Spotify service for subsequent use, kept as a member variable 
-        on the bot itself.
-        Also used during runtime if the service times out to reacquire.
+        Used at initialisation to create an authenticated Spotify service for subsequent use, kept as a member variable
+        on the bot itself and shared with every SpotifyTrack. The service's token manager refreshes the access token
+        ahead of its expiry, so the service never needs to be reacquired at runtime.
         :param spotify_auth_data: Instance of a SpotifyAuthData containing login information for acquisition of the Spotify service
+        :param http_session: PooledSession the service makes its requests through
         :return: The authenticated Spotify service for use in relevant API calls
         """
-
-        token = util.prompt_for_user_token(spotify_auth_data.username,
-                                           spotify_auth_data.scope,
-                                           client_id=spotify_auth_data.client_id,
-                                           client_secret=spotify_auth_data.client_secret,
-                                           redirect_uri=spotify_auth_data.redirect_uri)
-
-        service = Spotify(auth=token)
-
-        return service
+        return SpotifyService(SpotifyTokenManager(spotify_auth_data), http_session)
 
     @staticmethod
     def get_play_service(login_information):
@@ -471,6 +921,8 @@ class MusicBot:
         :param login_information: PlayLoginData object containing login information to authenticate as the correct user
         :return: Authenticated service object
         """
+        # Imported here rather than with everything else, as it is slow to import and Play Music is not yet in use
+        from gmusicapi import Mobileclient
         play_api = Mobileclient()
         if play_api.login(login_information.username, login_information.password, Mobileclient.FROM_MAC_ADDRESS):
             return play_api
@@ -478,11 +930,13 @@ class MusicBot:
             raise Exception('Unable to acquire Google Play Music service')
 
     @staticmethod
-    def get_youtube_service(client_secrets):
+    def get_youtube_service(client_secrets, http_session):
         """
         Used to create an authenticated Youtube service for subsequent use, passed in to the Bot's constructor to be kept
         as a member variable. For an unknown reason the authentication process fails when placed in the helpers.py file, or
         this would be treated in the same way as the Spotify service creation.
+        :param client_secrets: "Client Secrets" filepath containing YouTube auth information
+        :param http_session: PooledSession the service makes its requests through
         """
         flow = flow_from_clientsecrets(client_secrets, scope='https://www.googleapis.com/auth/youtube',
                                        message='Youtube fail')
@@ -496,21 +950,74 @@ class MusicBot:
 
         sys.modules['win32file'] = None
 
-        return build('youtube', 'v3', http=credentials.authorize(Http()))
+        return build('youtube', 'v3', http=credentials.authorize(PooledHttp(http_session)), cache=DiskDiscoveryCache())
 
 
     #def __init__(self, token, youtube_auth_path, spotify_auth_path, play_login_file):
-    def __init__(self, token, youtube, spotify_auth_path, play_login_file):
-        self.slack_service = SlackClient(token)
+    def __init__(self, token, youtube, spotify_auth_path, play_login_file, track_workers=DEFAULT_TRACK_WORKERS,
+                 event_workers=DEFAULT_EVENT_WORKERS, max_queued_events=DEFAULT_MAX_QUEUED_EVENTS,
+                 write_buffer_window=DEFAULT_FLUSH_WINDOW, metrics_port=DEFAULT_METRICS_PORT, http_session=None,
+                 slack_service=None, spotify_service=None, slack_tier_limits=TIER_LIMITS, startup_timer=None,
+                 youtube_daily_quota=DEFAULT_DAILY_QUOTA):
+        """
+        The Slack and Spotify services are normally created here from the token and auth data provided, but can be
+        passed in ready made instead (stand-ins for benchmarking, for example), in which case the token and auth data
+        are not used. The Spotify service is only authenticated when it is first used.
+        The startup timer, if given, is carried on from the startup stages that came before the bot was created.
+        """
+        self.startup_timer = startup_timer if startup_timer is not None else StartupTimer()
+        self.http_session = http_session if http_session is not None else PooledSession()
+        if slack_service is None:
+            slack_service = SlackClient(token)
+            use_pooled_transport(slack_service, self.http_session)
+        self.slack_service = slack_service
+        self.slack_scheduler = SlackScheduler(self.slack_service, tier_limits=slack_tier_limits)
         #self.youtube_service = self.get_youtube_service(youtube_auth_path)  # youtube
         self.youtube_service = youtube
-        self.spotify_auth_data = SpotifyAuthData(spotify_auth_path)
-        self.play_auth_data = PlayLoginData(play_login_file)
-        self.spotify_service = self.get_spotify_service(self.spotify_auth_data)
-        #self.play_service = None  # self.get_play_service(self.play_auth_data)
+        if spotify_service is None:
+            spotify_service = LazyService(lambda: self.get_spotify_service(SpotifyAuthData(spotify_auth_path),
+                                                                           self.http_session))
+        self.spotify_service = spotify_service
+        self.play_login_file = play_login_file
+        #self.play_service = None  # self.get_play_service(PlayLoginData(self.play_login_file))
         self.default_channel = 'C1WV7ME66'
         self.default_changelog_location = 'changelogs/'
-        self.logger = Logger()
+        self.event_sink = EventSink()
+        self.logger = Logger(self.event_sink)
+        self.playlist_mirror = PlaylistMirror()
+        Track.playlist_mirror = self.playlist_mirror
+        self.search_cache = SearchCache()
+        Track.search_cache = self.search_cache
+        self.track_metadata = TrackMetadataCache(
+            lambda track_ids: SpotifyTrack.get_tracks_info(self.spotify_service, track_ids))
+        SpotifyTrack.metadata_cache = self.track_metadata
+        self.track_identity = TrackIdentityIndex()
+        self.job_queue = JobQueue()
+        self.channel_cursors = ChannelCursors()
+        self.job_retry_interval = DEFAULT_JOB_RETRY_INTERVAL
+        self.job_retry_thread = None
+        self.youtube_quota = YoutubeQuota(daily_quota=youtube_daily_quota)
+        YoutubeVideo.quota = self.youtube_quota
+        self.max_catch_up_age = DEFAULT_MAX_CATCH_UP_AGE
+        self.reconnect_backoff = DEFAULT_RECONNECT_BACKOFF
+        self.max_reconnect_backoff = DEFAULT_MAX_RECONNECT_BACKOFF
+        Track.write_buffer_window = write_buffer_window
+        self.track_worker_pool = ThreadPoolExecutor(max_workers=track_workers)
+        self.user_directory = UserDirectory(self.api_call)
+        self.handled_event_types = {'message'}.union(USER_EVENT_TYPES)
+        self.handled_messages = OrderedDict()
+        self.handled_messages_lock = threading.Lock()
+        self.max_handled_messages = DEFAULT_MAX_HANDLED_MESSAGES
+        self.event_dispatcher = EventDispatcher(self.handle_event, event_workers, max_queued_events)
+        self.queue_stats_interval = 60
+        self.running_backfills = set()
+        self.backfills_lock = threading.Lock()
+        self.idle_read_interval = 0.1
+        self.running = False
+        self.stop_requested = threading.Event()
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self.register_metrics()
         self.youtube_playlist = 'PLDQ8Lg2Wj2nGKAL_7nLp8ELghxJgxVdRM'
         self.spotify_playlist = '3RBeSdvsH57tbsqNZHS44A'
         self.track_type_map = {
@@ -522,4 +1029,6 @@ class MusicBot:
             SpotifyTrack: self.spotify_service,
             YoutubeVideo: self.youtube_service#,
             #GooglePlayTrack: self.play_service
-        }
\ No newline at end of file
+        }
+        self.startup_reported = False
+        self.startup_timer.mark('construct')
\ No newline at end of file
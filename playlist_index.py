@@ -0,0 +1,127 @@
+import threading
+import time
+
+DEFAULT_MAX_INDEX_AGE = 6 * 60 * 60
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class PlaylistIndex:
+    """
+    In-memory set of the unique IDs of the tracks held in a single playlist. Loaded once, kept up to date as the bot
+    adds tracks itself, and only fully re-synced from the service once it is considered stale, so duplicate checks are
+    a local set lookup rather than a full walk of the playlist. Tracks being added are reserved in the index while
+    their insert is in progress, so that a concurrent addition of the same track finds it already present.
+    """
+
+    def __init__(self, playlist_id, loader, max_age=DEFAULT_MAX_INDEX_AGE):
+        """
+        :param playlist_id: The unique ID of the playlist this index represents
+        :param loader: Callable returning an iterable of every track ID currently in the playlist
+        :param max_age: Number of seconds after a sync at which the index is considered stale. None to never expire.
+        """
+        self.playlist_id = playlist_id
+        self.loader = loader
+        self.max_age = max_age
+        self.track_ids = set()
+        # Reservations are kept apart from the synced IDs, so that a re-sync during an insert does not drop them
+        self.reserved_ids = set()
+        self.last_synced = None
+        self.lock = threading.RLock()
+
+    def is_stale(self):
+        """
+        :return: True if the index has never been loaded, or was last loaded longer ago than the maximum age
+        """
+        if self.last_synced is None:
+            return True
+        return self.max_age is not None and time.time() - self.last_synced > self.max_age
+
+    def sync(self):
+        """
+        Replaces the contents of the index with the full, current contents of the playlist as returned by the loader.
+        :return: None
+        """
+        with self.lock:
+            self.track_ids = set(self.loader())
+            self.last_synced = time.time()
+
+    def ensure_fresh(self):
+        """
+        Re-syncs the index only if it is stale.
+        :return: None
+        """
+        with self.lock:
+            if self.is_stale():
+                self.sync()
+
+    def invalidate(self):
+        """
+        Marks the index as stale so that the next lookup triggers a full re-sync.
+        :return: None
+        """
+        with self.lock:
+            self.last_synced = None
+
+    def add(self, track_id):
+        """
+        Records a track as present in the playlist following a successful insert, in place of any reservation of it.
+        :param track_id: The unique ID of the track that has been added
+        :return: None
+        """
+        with self.lock:
+            self.track_ids.add(track_id)
+            self.reserved_ids.discard(track_id)
+
+    def try_reserve(self, track_id, equivalent_ids=()):
+        """
+        Claims a track for adding to the playlist, unless it or an equivalent is already present or reserved. The
+        reservation is replaced by add once the insert succeeds, or withdrawn with release should it fail.
+        :param track_id: The unique ID of the track about to be added
+        :param equivalent_ids: IDs of tracks any of which in the playlist means the track is already present
+        :return: True if the track has been reserved, False if it is already present or being added
+        """
+        self.ensure_fresh()
+        with self.lock:
+            if any(self._contains(candidate_id) for candidate_id in [track_id] + list(equivalent_ids)):
+                return False
+            self.reserved_ids.add(track_id)
+            return True
+
+    def release(self, track_id):
+        """
+        Withdraws the reservation of a track whose insert failed.
+        :param track_id: The unique ID of the track
+        :return: None
+        """
+        with self.lock:
+            self.reserved_ids.discard(track_id)
+
+    def _contains(self, track_id):
+        return track_id in self.track_ids or track_id in self.reserved_ids
+
+    def __contains__(self, track_id):
+        self.ensure_fresh()
+        with self.lock:
+            return self._contains(track_id)
+
+    def __len__(self):
+        self.ensure_fresh()
+        with self.lock:
+            return len(self.track_ids)
+
+
+def get_playlist_index(playlist_id, loader, max_age=DEFAULT_MAX_INDEX_AGE):
+    """
+    Retrieves the shared index for a playlist, creating it on first use. Playlist IDs are unique across services, so a
+    single registry serves every track type.
+    :param playlist_id: The unique ID of the playlist
+    :param loader: Callable used to (re)load the full contents of the playlist should the index need creating or syncing
+    :param max_age: Staleness threshold in seconds, only applied when the index is first created
+    :return: The PlaylistIndex for the playlist
+    """
+    with _indexes_lock:
+        if playlist_id not in _indexes:
+            _indexes[playlist_id] = PlaylistIndex(playlist_id, loader, max_age)
+        return _indexes[playlist_id]
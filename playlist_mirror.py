@@ -0,0 +1,228 @@
+import sqlite3
+import threading
+import time
+
+DEFAULT_MIRROR_LOCATION = 'playlist_mirror.db'
+
+
+class MirrorPage:
+    """
+    Details held about a single page of a playlist as it was last read from the service, used to avoid re-reading pages
+    that have not changed since.
+    """
+
+    def __init__(self, page_number, page_token, etag, next_page_token):
+        self.page_number = page_number
+        self.page_token = page_token
+        self.etag = etag
+        self.next_page_token = next_page_token
+
+
+class MirrorTrack:
+    """
+    A single track as held in the local mirror of a playlist
+    """
+
+    def __init__(self, track_id, title, added_by, added_at, service):
+        self.id = track_id
+        self.title = title
+        self.added_by = added_by
+        self.added_at = added_at
+        self.service = service
+
+
+class PlaylistMirror:
+    """
+    Local on-disk copy of the contents of each playlist, held in SQLite so that it survives restarts of the bot. Each
+    track type is responsible for keeping its own playlists in sync with the service, using whatever versioning the
+    service provides to read only what has changed.
+    """
+
+    def __init__(self, db_path=DEFAULT_MIRROR_LOCATION):
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS tracks (
+                    playlist_id TEXT NOT NULL,
+                    service TEXT NOT NULL,
+                    page_number INTEGER,
+                    position INTEGER,
+                    track_id TEXT NOT NULL,
+                    title TEXT,
+                    added_by TEXT,
+                    added_at TEXT
+                );
+                CREATE INDEX IF NOT EXISTS tracks_by_playlist ON tracks (playlist_id, page_number, position);
+                CREATE TABLE IF NOT EXISTS pages (
+                    playlist_id TEXT NOT NULL,
+                    page_number INTEGER NOT NULL,
+                    page_token TEXT,
+                    etag TEXT,
+                    next_page_token TEXT,
+                    PRIMARY KEY (playlist_id, page_number)
+                );
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    playlist_id TEXT PRIMARY KEY,
+                    service TEXT NOT NULL,
+                    version TEXT,
+                    synced_at REAL
+                );
+            ''')
+
+    def get_sync_version(self, playlist_id):
+        """
+        :param playlist_id: The unique ID of the playlist
+        :return: The service-provided version marker (snapshot ID, etag) the mirror was last synced against, or None
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT version FROM sync_state WHERE playlist_id = ?',
+                                          (playlist_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_sync_version(self, playlist_id, service, version):
+        """
+        Records the version marker the mirror is now in sync with, and drops any tracks recorded locally since the
+        last sync, as they will have been read back from the service as part of this one.
+        :param playlist_id: The unique ID of the playlist
+        :param service: Name of the service the playlist belongs to
+        :param version: The service-provided version marker
+        :return: None
+        """
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM tracks WHERE playlist_id = ? AND page_number IS NULL', (playlist_id,))
+            self.connection.execute('INSERT OR REPLACE INTO sync_state (playlist_id, service, version, synced_at) '
+                                    'VALUES (?, ?, ?, ?)', (playlist_id, service, version, time.time()))
+
+    def get_page(self, playlist_id, page_number):
+        """
+        :param playlist_id: The unique ID of the playlist
+        :param page_number: Zero-based index of the page within the playlist
+        :return: MirrorPage holding what is known about the page, or None if it has never been read
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT page_token, etag, next_page_token FROM pages '
+                                          'WHERE playlist_id = ? AND page_number = ?',
+                                          (playlist_id, page_number)).fetchone()
+        if row is None:
+            return None
+        return MirrorPage(page_number, row[0], row[1], row[2])
+
+    def replace_page(self, playlist_id, service, page_number, tracks, page_token=None, etag=None,
+                     next_page_token=None):
+        """
+        Replaces the stored contents of a single page of a playlist. Users recorded against tracks added by the bot are
+        kept, as the services only know the playlist owner as the one adding them.
+        :param playlist_id: The unique ID of the playlist
+        :param service: Name of the service the playlist belongs to
+        :param page_number: Zero-based index of the page within the playlist
+        :param tracks: List of MirrorTrack objects in the order they appear on the page
+        :param page_token: The token used to request this page, if the service uses them
+        :param etag: The etag returned with the page, if the service provides them
+        :param next_page_token: The token for the following page, if the service uses them
+        :return: None
+        """
+        with self.lock, self.connection:
+            known_users = dict(self.connection.execute(
+                'SELECT track_id, added_by FROM tracks WHERE playlist_id = ? AND added_by IS NOT NULL',
+                (playlist_id,)).fetchall())
+            self.connection.execute('DELETE FROM tracks WHERE playlist_id = ? AND page_number = ?',
+                                    (playlist_id, page_number))
+            self.connection.executemany(
+                'INSERT INTO tracks (playlist_id, service, page_number, position, track_id, title, added_by, added_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(playlist_id, service, page_number, position, track.id, track.title,
+                  known_users.get(track.id, track.added_by), track.added_at)
+                 for position, track in enumerate(tracks)])
+            self.connection.execute('INSERT OR REPLACE INTO pages '
+                                    '(playlist_id, page_number, page_token, etag, next_page_token) '
+                                    'VALUES (?, ?, ?, ?, ?)',
+                                    (playlist_id, page_number, page_token, etag, next_page_token))
+
+    def truncate_pages(self, playlist_id, page_count):
+        """
+        Removes every page from the given page number onwards, for when a playlist has shrunk since the last sync.
+        :param playlist_id: The unique ID of the playlist
+        :param page_count: The number of pages the playlist now has
+        :return: None
+        """
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM tracks WHERE playlist_id = ? AND page_number >= ?',
+                                    (playlist_id, page_count))
+            self.connection.execute('DELETE FROM pages WHERE playlist_id = ? AND page_number >= ?',
+                                    (playlist_id, page_count))
+
+    def add_track(self, playlist_id, service, track_id, title, added_by):
+        """
+        Records a track the bot has just added to a playlist, ahead of it being read back in the next sync.
+        :param playlist_id: The unique ID of the playlist
+        :param service: Name of the service the playlist belongs to
+        :param track_id: The unique ID of the track that has been added
+        :param title: Title of the track
+        :param added_by: Name of the user who submitted the track
+        :return: None
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO tracks (playlist_id, service, page_number, position, track_id, title, added_by, added_at) '
+                'VALUES (?, ?, NULL, NULL, ?, ?, ?, ?)',
+                (playlist_id, service, track_id, title, added_by,
+                 time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())))
+
+    def track_ids(self, playlist_id):
+        """
+        :param playlist_id: The unique ID of the playlist
+        :return: List of the unique IDs of every track held for the playlist
+        """
+        with self.lock:
+            rows = self.connection.execute('SELECT track_id FROM tracks WHERE playlist_id = ?',
+                                           (playlist_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def tracks(self, playlist_id):
+        """
+        :param playlist_id: The unique ID of the playlist
+        :return: List of MirrorTrack objects for the playlist, in playlist order
+        """
+        with self.lock:
+            rows = self.connection.execute('SELECT track_id, title, added_by, added_at, service FROM tracks '
+                                           'WHERE playlist_id = ? '
+                                           'ORDER BY page_number IS NULL, page_number, position, rowid',
+                                           (playlist_id,)).fetchall()
+        return [MirrorTrack(*row) for row in rows]
+
+    def listing(self, playlist_id, last=None, added_by=None):
+        """
+        Reads a listing of the playlist straight from the mirror, filtered and limited within the query so that only
+        the tracks to be listed are read, however large the playlist.
+        :param playlist_id: The unique ID of the playlist
+        :param last: Number of tracks to list from the end of the playlist, or None to list them all
+        :param added_by: Name of the user whose tracks are to be listed (case insensitive), or None for every user's
+        :return: List of MirrorTrack objects, in playlist order
+        """
+        query = 'SELECT track_id, title, added_by, added_at, service FROM tracks WHERE playlist_id = ?'
+        parameters = [playlist_id]
+        if added_by is not None:
+            query += ' AND added_by = ? COLLATE NOCASE'
+            parameters.append(added_by)
+        # Read from the end of the playlist backwards, so the most recent tracks can be limited to in the query
+        query += ' ORDER BY page_number IS NULL DESC, page_number DESC, position DESC, rowid DESC'
+        if last is not None:
+            query += ' LIMIT ?'
+            parameters.append(last)
+        with self.lock:
+            rows = self.connection.execute(query, parameters).fetchall()
+        return [MirrorTrack(*row) for row in reversed(rows)]
+
+    def track_count(self, playlist_id):
+        """
+        :param playlist_id: The unique ID of the playlist
+        :return: Number of tracks held for the playlist
+        """
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM tracks WHERE playlist_id = ?',
+                                           (playlist_id,)).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
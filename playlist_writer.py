@@ -0,0 +1,109 @@
+from concurrent.futures import Future
+import threading
+import time
+
+DEFAULT_FLUSH_WINDOW = 0.02
+DEFAULT_MAX_BATCH_SIZE = 50
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+class PendingAdd:
+    """
+    A track waiting to be written to a playlist, along with the Future through which its outcome is reported
+    """
+
+    def __init__(self, track):
+        self.track = track
+        self.future = Future()
+
+
+class PlaylistWriteBuffer:
+    """
+    Collects tracks to be added to a single playlist and writes them in batches, once the first of them has waited for
+    the flush window or as soon as the batch size cap is reached. A track added while nothing else is pending or being
+    written goes out at once, so tracks only wait on one another when they arrive together. Every track is given its
+    own Future, so each caller still learns whether its own track was added.
+    """
+
+    def __init__(self, playlist_id, flush_function, flush_window=DEFAULT_FLUSH_WINDOW,
+                 max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+        """
+        :param playlist_id: The unique ID of the playlist this buffer writes to
+        :param flush_function: Callable taking a list of tracks, adding them to the playlist, and returning a list of
+        the same length holding None for each track added or the exception that prevented it
+        :param flush_window: Number of seconds the first track in a batch waits for others to join it
+        :param max_batch_size: Number of tracks at which a batch is written without waiting any longer
+        """
+        self.playlist_id = playlist_id
+        self.flush_function = flush_function
+        self.flush_window = flush_window
+        self.max_batch_size = max_batch_size
+        self.pending = []
+        self.first_pending_at = None
+        self.condition = threading.Condition()
+        self.flush_thread = threading.Thread(target=self._flush_when_due, daemon=True,
+                                             name='playlist-writer-{}'.format(playlist_id))
+        self.flush_thread.start()
+
+    def submit(self, track):
+        """
+        Queues a track to be added to the playlist. A track already waiting to be written is not queued twice.
+        :param track: The track to be added
+        :return: Future resolving to the track once it has been added, or raising the reason it was not
+        """
+        with self.condition:
+            for pending_add in self.pending:
+                if pending_add.track.id == track.id:
+                    return pending_add.future
+            pending_add = PendingAdd(track)
+            self.pending.append(pending_add)
+            if self.first_pending_at is None:
+                self.first_pending_at = time.monotonic()
+            self.condition.notify()
+            return pending_add.future
+
+    def _flush_when_due(self):
+        while True:
+            with self.condition:
+                was_idle = not self.pending
+                while not self.pending:
+                    self.condition.wait()
+                # Tracks added to an idle buffer are written at once, as no others are known to be on their way
+                while not was_idle and len(self.pending) < self.max_batch_size:
+                    remaining = self.first_pending_at + self.flush_window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = self.pending[:self.max_batch_size]
+                self.pending = self.pending[self.max_batch_size:]
+                self.first_pending_at = time.monotonic() if self.pending else None
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            errors = self.flush_function([pending_add.track for pending_add in batch])
+        except Exception as error:
+            errors = [error] * len(batch)
+        for pending_add, error in zip(batch, errors):
+            if error is None:
+                pending_add.future.set_result(pending_add.track)
+            else:
+                pending_add.future.set_exception(error)
+
+
+def get_write_buffer(playlist_id, flush_function, flush_window=DEFAULT_FLUSH_WINDOW,
+                     max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+    """
+    Retrieves the shared write buffer for a playlist, creating it on first use.
+    :param playlist_id: The unique ID of the playlist
+    :param flush_function: Callable used to write a batch of tracks, only used when the buffer is first created
+    :param flush_window: Seconds a batch waits to fill, only used when the buffer is first created
+    :param max_batch_size: Largest batch written at once, only used when the buffer is first created
+    :return: The PlaylistWriteBuffer for the playlist
+    """
+    with _buffers_lock:
+        if playlist_id not in _buffers:
+            _buffers[playlist_id] = PlaylistWriteBuffer(playlist_id, flush_function, flush_window, max_batch_size)
+        return _buffers[playlist_id]
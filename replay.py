@@ -0,0 +1,352 @@
+"""
+Replays a recorded event log through the bot, in its original order and with its original timing sped up, so that
+production bursts and regressions can be reproduced offline.
+
+    python replay.py [--eventlogs eventlogs/] [--speed 10] [--max-gap 5] [--fake] [--output report.json]
+
+In dry-run mode (the default) each event is parsed and scanned for a link, and the link's title normalised, without any
+service being called. With --fake the full pipeline is run (SlackEvent parsing, scan_for_relevant_attachment and
+treat_song) against the stand-in services of fake_services.py, seeded with the songs and playlist contents the log
+records. Reports how long each stage took, and every difference from the outcomes recorded in the log. Exits with a
+non-zero status if there were any differences.
+"""
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from json import dump as json_dump
+from os import chdir, getcwd, mkdir, path
+from tempfile import TemporaryDirectory
+import sys
+import threading
+import time
+
+from event_dispatcher import EventDispatcher
+from event_logger import OUTCOME_EVENT_TYPE
+from event_sink import read_events, DEFAULT_EVENT_LOG_LOCATION
+from fake_services import FakeServiceBehaviour, FakeCatalogue, FakeSong, FakeSlackClient, FakeSpotify, FakeYoutube
+from metrics import percentile
+from music_bot import MusicBot
+from slack_objects import SlackEvent
+from slack_scheduler import TIER_LIMITS
+from title_normaliser import normalise_title
+
+REPLAYED_SERVICE_NAMES = ('Spotify', 'YouTube')
+# Failures are transient by nature, so a recorded failure is not compared against what the replay did
+UNCOMPARED_OUTCOMES = ('failed',)
+
+
+class StageTimings:
+    """
+    How long each stage of handling took, for every event replayed
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def timed_stage(self, stage):
+        started_at = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started_at
+        with self.lock:
+            self.seconds.setdefault(stage, []).append(elapsed)
+
+    def summary(self):
+        """
+        :return: Dictionary of stage to its count, mean, 50th and 99th percentile and maximum in seconds
+        """
+        with self.lock:
+            stage_seconds = {stage: sorted(seconds) for stage, seconds in self.seconds.items()}
+        return {stage: {'count': len(seconds), 'mean': sum(seconds) / len(seconds), 'p50': percentile(seconds, 0.5),
+                        'p99': percentile(seconds, 0.99), 'max': seconds[-1]}
+                for stage, seconds in stage_seconds.items()}
+
+
+def load_recording(directory):
+    """
+    Reads an event log, separating the received events from the outcomes recorded for them.
+    :param directory: Directory containing the event log
+    :return: Tuple of the list of events, in order, and a dictionary of message timestamp to its recorded outcomes
+    """
+    events = []
+    recorded_outcomes = {}
+    for event in read_events(directory):
+        if event.get('type') == OUTCOME_EVENT_TYPE:
+            recorded_outcomes[event['ts']] = event['outcomes']
+        else:
+            events.append(event)
+    return events, recorded_outcomes
+
+
+def get_event_time(event):
+    """
+    :return: When the event was received, as a Unix time, or None if the event does not say
+    """
+    event_time = event.get('event_ts') or event.get('ts') or (event.get('message') or {}).get('ts')
+    return float(event_time) if event_time is not None else None
+
+
+def find_link(slack_event):
+    """
+    Finds the first link to a supported service in a message, as scan_for_relevant_attachment does, but without
+    creating a Track (which would call the service).
+    :param slack_event: The parsed SlackEvent
+    :return: The SlackAttachment or ExtractedLink of the link, or None if the message holds none
+    """
+    if slack_event.type != 'message' or slack_event.message is None:
+        return None
+    if slack_event.message.is_reply:
+        return None
+    for link in (slack_event.message.attachments or []) + slack_event.message.links:
+        if link.service_name in REPLAYED_SERVICE_NAMES and link.id is not None:
+            return link
+    return None
+
+
+def build_replay_catalogue(events, recorded_outcomes):
+    """
+    Seeds a catalogue for the stand-in services with every song the log records, under the IDs and titles recorded for
+    it on each service, so that replayed searches can find what the original searches found.
+    :param events: The recorded events
+    :param recorded_outcomes: Dictionary of message timestamp to its recorded outcomes
+    :return: Tuple of the FakeCatalogue and a dictionary of service name to the IDs already in its playlist when the
+    log began
+    """
+    catalogue = FakeCatalogue()
+    initial_track_ids = {service_name: [] for service_name in REPLAYED_SERVICE_NAMES}
+    seen_track_ids = set()
+    for event in events:
+        slack_event = SlackEvent(event)
+        link = find_link(slack_event)
+        if link is None:
+            continue
+        outcomes = recorded_outcomes.get(slack_event.message.timestamp, {})
+        track_ids = {}
+        # Links read from the message text have no title, but the title fetched for them is recorded in the outcome
+        titles = {link.service_name: link.title or outcomes.get(link.service_name, {}).get('title')}
+        if titles[link.service_name] is None:
+            continue
+        for service_name in REPLAYED_SERVICE_NAMES:
+            outcome = outcomes.get(service_name, {})
+            if service_name == link.service_name:
+                track_ids[service_name] = link.id
+            elif outcome.get('outcome') in ('added', 'already_present'):
+                track_ids[service_name] = outcome['track_id']
+                titles[service_name] = outcome['title']
+            # A track first recorded as already present must have been in the playlist before the log began
+            if track_ids.get(service_name) is not None and track_ids[service_name] not in seen_track_ids:
+                seen_track_ids.add(track_ids[service_name])
+                if outcome.get('outcome') == 'already_present':
+                    initial_track_ids[service_name].append(track_ids[service_name])
+
+        if ((track_ids.get('Spotify') is None or track_ids['Spotify'] in catalogue.by_spotify_id) and
+                (track_ids.get('YouTube') is None or track_ids['YouTube'] in catalogue.by_youtube_id)):
+            continue
+        spotify_title = titles.get('Spotify', titles.get('YouTube'))
+        artist, _, name = spotify_title.rpartition(' - ')
+        catalogue.add_song(FakeSong(track_ids.get('Spotify'), track_ids.get('YouTube'), artist, name, None,
+                                    titles.get('YouTube', spotify_title)))
+    return catalogue, initial_track_ids
+
+
+class EventReplay:
+    """
+    Feeds recorded events through the bot's handling stages on a pool of workers, at the pace they were received
+    (sped up), timing each stage and comparing what happens against the outcomes recorded for each message.
+    """
+
+    def __init__(self, events, recorded_outcomes, bot=None, speed=10, max_gap=5, workers=4):
+        """
+        :param events: The recorded events, in order
+        :param recorded_outcomes: Dictionary of message timestamp to its recorded outcomes
+        :param bot: MusicBot, built on stand-in services, to run the full pipeline on. None for a dry run.
+        :param speed: How many times faster than real time the events are replayed. 0 to replay them all at once.
+        :param max_gap: Longest gap between two events, in recorded seconds, before the gap is cut short
+        :param workers: Number of events handled at once
+        """
+        self.events = events
+        self.recorded_outcomes = recorded_outcomes
+        self.bot = bot
+        self.speed = speed
+        self.max_gap = max_gap
+        self.workers = workers
+        self.timings = StageTimings()
+        self.results_lock = threading.Lock()
+        self.links = 0
+        self.matched = 0
+        self.unrecorded = 0
+        self.differences = []
+
+    def replay_event(self, event):
+        """
+        Handles a single recorded event and compares the result with its recorded outcome. Called from the workers.
+        :param event: The recorded event
+        :return: None
+        """
+        with self.timings.timed_stage('total'):
+            with self.timings.timed_stage('parse'):
+                slack_event = SlackEvent(event)
+
+            if self.bot is None:
+                with self.timings.timed_stage('scan'):
+                    link = find_link(slack_event)
+                if link is None:
+                    return
+                # Links read from the message text have no title, so the one recorded for the link is used instead
+                title = link.title or self.recorded_outcomes.get(slack_event.message.timestamp, {}).get(
+                    link.service_name, {}).get('title')
+                with self.timings.timed_stage('normalise'):
+                    normalise_title(title)
+                outcomes = None
+            else:
+                with self.timings.timed_stage('scan'):
+                    song = self.bot.scan_for_relevant_attachment(event)
+                if song is None:
+                    return
+                with self.timings.timed_stage('treat'):
+                    outcomes = self.bot.treat_song(song, slack_event)
+
+        self.compare(slack_event.message.timestamp, outcomes)
+
+    def compare(self, timestamp, outcomes):
+        """
+        Records how a replayed link's outcomes compare with those recorded for it.
+        :param timestamp: Timestamp of the message holding the link
+        :param outcomes: Dictionary of service name to replayed outcome, or None on a dry run
+        :return: None
+        """
+        recorded = self.recorded_outcomes.get(timestamp)
+        differences = []
+        if recorded is not None and outcomes is not None:
+            for service_name, recorded_outcome in recorded.items():
+                if recorded_outcome['outcome'] in UNCOMPARED_OUTCOMES:
+                    continue
+                replayed_outcome = outcomes.get(service_name, {})
+                if (replayed_outcome.get('outcome') != recorded_outcome['outcome'] or
+                        replayed_outcome.get('track_id') != recorded_outcome['track_id']):
+                    differences.append({'ts': timestamp, 'service': service_name, 'recorded': recorded_outcome,
+                                        'replayed': replayed_outcome})
+
+        with self.results_lock:
+            self.links += 1
+            if recorded is None:
+                self.unrecorded += 1
+            elif differences:
+                self.differences.extend(differences)
+            else:
+                self.matched += 1
+
+    def run(self):
+        """
+        Replays every event, waiting for all of them to be handled.
+        :return: Dictionary holding the report
+        """
+        dispatcher = EventDispatcher(self.replay_event, self.workers)
+        started_at = time.monotonic()
+        replay_offset = 0
+        previous_event_time = None
+        for event in self.events:
+            event_time = get_event_time(event)
+            if self.speed and event_time is not None:
+                if previous_event_time is not None:
+                    replay_offset += min(max(event_time - previous_event_time, 0), self.max_gap) / self.speed
+                previous_event_time = event_time
+                delay = started_at + replay_offset - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            dispatcher.put(event, MusicBot.get_event_ordering_key(event))
+        dispatcher.join()
+        dispatcher.stop()
+
+        elapsed = time.monotonic() - started_at
+        return {
+            'mode': 'dry-run' if self.bot is None else 'fake',
+            'events': len(self.events),
+            'links': self.links,
+            'seconds': elapsed,
+            'events_per_second': len(self.events) / elapsed if elapsed else 0,
+            'stages': self.timings.summary(),
+            'matched': self.matched,
+            'unrecorded': self.unrecorded,
+            'differences': self.differences
+        }
+
+
+def build_fake_bot(events, recorded_outcomes, args):
+    """
+    Creates a bot on stand-in services seeded from the recording, with the user directory loaded as start() would.
+    """
+    catalogue, initial_track_ids = build_replay_catalogue(events, recorded_outcomes)
+    slack = FakeSlackClient(FakeServiceBehaviour(args.slack_latency, args.jitter, seed=args.seed))
+    spotify = FakeSpotify(catalogue, FakeServiceBehaviour(args.latency, args.jitter, seed=args.seed),
+                          initial_track_ids=initial_track_ids['Spotify'])
+    youtube = FakeYoutube(catalogue, FakeServiceBehaviour(args.latency, args.jitter, seed=args.seed),
+                          initial_track_ids=initial_track_ids['YouTube'])
+    slack_tier_limits = {tier: (rate * args.slack_rate_scale, capacity * args.slack_rate_scale)
+                         for tier, (rate, capacity) in TIER_LIMITS.items()}
+    bot = MusicBot(None, youtube, None, None, metrics_port=None, slack_service=slack, spotify_service=spotify,
+                   slack_tier_limits=slack_tier_limits, youtube_daily_quota=10 ** 9)
+    bot.user_directory.load()
+    return bot
+
+
+def print_report(report, max_differences=20):
+    print('{mode}: {events} events, {links} links replayed in {seconds:.2f} s ({events_per_second:.1f} events/s)'
+          .format(**report))
+    for stage, stage_timings in sorted(report['stages'].items()):
+        print('{:<10} {:>6} x  mean {:>8.2f} ms  p50 {:>8.2f} ms  p99 {:>8.2f} ms  max {:>8.2f} ms'.format(
+            stage, stage_timings['count'], stage_timings['mean'] * 1000, stage_timings['p50'] * 1000,
+            stage_timings['p99'] * 1000, stage_timings['max'] * 1000))
+    if report['mode'] == 'fake':
+        print('{} links matched their recorded outcome, {} differed, {} had no recorded outcome'.format(
+            report['matched'], len({difference['ts'] for difference in report['differences']}),
+            report['unrecorded']))
+    for difference in report['differences'][:max_differences]:
+        print('DIFFERENCE {ts} {service}: recorded {recorded}, replayed {replayed}'.format(**difference))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Replays a recorded event log through the bot and compares the outcomes')
+    parser.add_argument('--eventlogs', default=DEFAULT_EVENT_LOG_LOCATION, help='Directory of the event log to replay')
+    parser.add_argument('--speed', type=float, default=10,
+                        help='Times faster than real time to replay the events, 0 for all at once')
+    parser.add_argument('--max-gap', type=float, default=5,
+                        help='Longest gap between events, in recorded seconds, before it is cut short')
+    parser.add_argument('--workers', type=int, default=4, help='Number of events handled at once')
+    parser.add_argument('--fake', action='store_true',
+                        help='Run the full pipeline against stand-in services rather than a dry run')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds taken by each Spotify or YouTube call')
+    parser.add_argument('--slack-latency', type=float, default=0.0, help='Seconds taken by each Slack call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Most seconds added at random to each call')
+    parser.add_argument('--slack-rate-scale', type=float, default=1,
+                        help="Multiple of Slack's real rate limits the bot is held to")
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the stand-in services')
+    parser.add_argument('--output', help='Filepath to write the report to as JSON')
+    args = parser.parse_args()
+
+    recorded_events, outcomes_by_timestamp = load_recording(args.eventlogs)
+    output_filepath = path.abspath(args.output) if args.output else None
+
+    if args.fake:
+        original_directory = getcwd()
+        # The bot keeps its mirror, cache and event logs in the working directory, so it is run in an empty one
+        with TemporaryDirectory() as working_directory:
+            chdir(working_directory)
+            mkdir('changelogs')
+            try:
+                replay_bot = build_fake_bot(recorded_events, outcomes_by_timestamp, args)
+                replay_report = EventReplay(recorded_events, outcomes_by_timestamp, replay_bot, args.speed,
+                                            args.max_gap, args.workers).run()
+                replay_bot.shutdown()
+            finally:
+                chdir(original_directory)
+    else:
+        replay_report = EventReplay(recorded_events, outcomes_by_timestamp, None, args.speed, args.max_gap,
+                                    args.workers).run()
+
+    print_report(replay_report)
+    if output_filepath is not None:
+        with open(output_filepath, 'w') as file_out:
+            json_dump(replay_report, file_out, indent=2)
+
+    sys.exit(1 if replay_report['differences'] else 0)
@@ -0,0 +1,154 @@
+from collections import OrderedDict
+from json import dump as json_dump, load as json_load
+from os import path, replace
+import threading
+import time
+
+DEFAULT_SEARCH_CACHE_LOCATION = 'search_cache.json'
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_HIT_TTL = 30 * 24 * 60 * 60
+DEFAULT_MISS_TTL = 24 * 60 * 60
+DEFAULT_SAVE_INTERVAL = 30
+
+
+class SearchCacheEntry:
+    """
+    The outcome of a single cross-search, either the track that was found or a record that nothing was
+    """
+
+    def __init__(self, track_id, title, expires_at):
+        self.track_id = track_id
+        self.title = title
+        self.expires_at = expires_at
+
+    @property
+    def is_miss(self):
+        return self.track_id is None
+
+
+class SearchCache:
+    """
+    Least-recently-used cache of cross-search results, keyed on the service searched and the normalised title searched
+    for. Searches that found nothing are cached as well (for a shorter time by default) so that reposts of songs that
+    are not available on a service do not trigger a fresh search either. The cache is written to disk so it survives
+    restarts of the bot.
+    """
+
+    def __init__(self, filepath=DEFAULT_SEARCH_CACHE_LOCATION, max_entries=DEFAULT_MAX_ENTRIES,
+                 hit_ttl=DEFAULT_HIT_TTL, miss_ttl=DEFAULT_MISS_TTL, save_interval=DEFAULT_SAVE_INTERVAL):
+        """
+        :param filepath: Location of the file the cache is persisted to. None to keep the cache in memory only.
+        :param max_entries: Number of entries held before the least recently used are evicted
+        :param hit_ttl: Number of seconds a successful search result is kept for
+        :param miss_ttl: Number of seconds a failed search is remembered for
+        :param save_interval: Minimum number of seconds between writes of the cache to disk
+        """
+        self.filepath = filepath
+        self.max_entries = max_entries
+        self.hit_ttl = hit_ttl
+        self.miss_ttl = miss_ttl
+        self.save_interval = save_interval
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.last_saved = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def make_key(service_name, normalised_title):
+        return '{}|{}'.format(service_name, normalised_title)
+
+    def get(self, key):
+        """
+        :param key: Cache key as created by make_key
+        :return: The SearchCacheEntry held for the key, or None if there is no unexpired entry
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at < time.time():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def store(self, key, track_id, title):
+        """
+        Records a successful search result.
+        :param key: Cache key as created by make_key
+        :param track_id: The unique ID of the track found
+        :param title: The title of the track found
+        :return: None
+        """
+        self._put(key, SearchCacheEntry(track_id, title, time.time() + self.hit_ttl))
+
+    def store_miss(self, key):
+        """
+        Records that a search found nothing.
+        :param key: Cache key as created by make_key
+        :return: None
+        """
+        self._put(key, SearchCacheEntry(None, None, time.time() + self.miss_ttl))
+
+    def _put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+        if time.time() - self.last_saved >= self.save_interval:
+            self.save()
+
+    def stats(self):
+        """
+        :return: Dictionary of the number of entries held, and hits and misses since the cache was created
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def load(self):
+        """
+        Reads any previously saved entries back in from disk, discarding those that have since expired.
+        :return: None
+        """
+        if self.filepath is None or not path.isfile(self.filepath):
+            return
+        with open(self.filepath, 'r') as file_in:
+            data = json_load(file_in)
+        now = time.time()
+        with self.lock:
+            for key, track_id, title, expires_at in data:
+                if expires_at >= now:
+                    self.entries[key] = SearchCacheEntry(track_id, title, expires_at)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def save(self):
+        """
+        Writes the cache to disk, in least to most recently used order, if it has changed since it was last saved.
+        :return: None
+        """
+        with self.save_lock:
+            with self.lock:
+                self.last_saved = time.time()
+                if self.filepath is None or not self.dirty:
+                    return
+                data = [[key, entry.track_id, entry.title, entry.expires_at] for key, entry in self.entries.items()]
+                self.dirty = False
+            temp_filepath = self.filepath + '.tmp'
+            with open(temp_filepath, 'w') as file_out:
+                json_dump(data, file_out)
+            replace(temp_filepath, self.filepath)
@@ -1,23 +1,135 @@
 #TODO: Have wrapper classes here for YouTube, Spotify and Play api services toegther with add to self methods
-from auth_data import SpotifyAuthData
 from spotipy import util, Spotify
+from spotipy.client import SpotifyException
+from spotipy.oauth2 import SpotifyOAuth
+import threading
+import time
 
-def GetSpotifyService(auth_path=r'C:\Users\willro\PycharmProjects\MusicBot\client_secrets\spotify_auth_data.json'):
+DEFAULT_REFRESH_MARGIN = 300
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_RETRY_BACKOFF = 0.5
+DEFAULT_MAX_RETRY_BACKOFF = 8
+
+
+class SpotifyTokenManager:
+    """
+    Holds the Spotify access token for the whole bot. The token is refreshed using the refresh token shortly before it
+    expires, so requests are not made with a token about to lapse and the user is only ever prompted to log in once.
+    """
+
+    def __init__(self, auth_data, refresh_margin=DEFAULT_REFRESH_MARGIN):
+        """
+        :param auth_data: SpotifyAuthData holding the login information
+        :param refresh_margin: Number of seconds before expiry at which the token is refreshed
+        """
+        self.oauth = SpotifyOAuth(auth_data.client_id, auth_data.client_secret, auth_data.redirect_uri,
+                                  scope=auth_data.scope, cache_path='.cache-' + auth_data.username)
+        self.refresh_margin = refresh_margin
+        self.token_lock = threading.Lock()
+        self.token_info = self.oauth.get_cached_token()
+        if not self.token_info:
+            # Prompts the user to log in, caching the token (and its refresh token) for the OAuth object to read back
+            util.prompt_for_user_token(auth_data.username, auth_data.scope, client_id=auth_data.client_id,
+                                       client_secret=auth_data.client_secret, redirect_uri=auth_data.redirect_uri)
+            self.token_info = self.oauth.get_cached_token()
+        if not self.token_info:
+            raise Exception('Unable to acquire a Spotify access token')
+
+    def get_access_token(self):
+        """
+        :return: A valid access token, refreshed first if it is due to expire within the refresh margin
+        """
+        with self.token_lock:
+            if self.token_info['expires_at'] - time.time() < self.refresh_margin:
+                self.refresh()
+            return self.token_info['access_token']
+
+    def force_refresh(self):
+        """
+        Refreshes the access token regardless of its expiry time, used when Spotify has rejected it.
+        :return: None
+        """
+        with self.token_lock:
+            self.refresh()
+
+    def refresh(self):
+        self.token_info = self.oauth.refresh_access_token(self.token_info['refresh_token'])
+
+
+class SpotifyService:
     """
-    This is going to be a bit of a nasty workaround for the time being
-    TODO: Make this not gross
-    :param auth_path: Path to Spotify authentication data
-    :return: Authenticated Spotify service for use in
+    Stands in for a spotipy Spotify client, making each call with the token manager's current token. A call rejected
+    as unauthorised (401) forces a token refresh and is retried with a bounded exponential backoff; every other failure
+    is raised to the caller straight away.
     """
 
-    spotify_auth_data = SpotifyAuthData(auth_path)
+    def __init__(self, token_manager, requests_session=True, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff=DEFAULT_RETRY_BACKOFF, max_backoff=DEFAULT_MAX_RETRY_BACKOFF):
+        """
+        :param token_manager: SpotifyTokenManager shared by everything using the service
+        :param requests_session: requests Session the client makes its calls through, kept when the client is
+        re-created for a new token so that its connections stay open
+        :param max_retries: Number of times an unauthorised call is retried before the error is raised
+        :param backoff: Number of seconds waited before the first retry, doubling for each retry after
+        :param max_backoff: Longest wait between retries
+        """
+        self.token_manager = token_manager
+        self.requests_session = requests_session
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.client_lock = threading.Lock()
+        self.client = None
+        self.client_token = None
+
+    def get_client(self):
+        token = self.token_manager.get_access_token()
+        with self.client_lock:
+            if token != self.client_token:
+                self.client = Spotify(auth=token, requests_session=self.requests_session)
+                self.client_token = token
+            return self.client
+
+    def __getattr__(self, name):
+        if not callable(getattr(Spotify, name, None)):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            attempt = 0
+            while True:
+                try:
+                    return getattr(self.get_client(), name)(*args, **kwargs)
+                except SpotifyException as error:
+                    if error.http_status != 401 or attempt >= self.max_retries:
+                        raise
+                time.sleep(min(self.backoff * 2 ** attempt, self.max_backoff))
+                attempt += 1
+                self.token_manager.force_refresh()
+
+        return call
+
+
+class LazyService:
+    """
+    Stands in for a service client that is only created when it is first used, so that authenticating with a service
+    (and importing its client library) does not hold up the bot's startup. The client is created once, by whichever
+    thread uses it first.
+    """
 
-    token = util.prompt_for_user_token(spotify_auth_data.username,
-                                       spotify_auth_data.scope,
-                                       client_id=spotify_auth_data.client_id,
-                                       client_secret=spotify_auth_data.client_secret,
-                                       redirect_uri=spotify_auth_data.redirect_uri)
+    def __init__(self, factory):
+        """
+        :param factory: Callable taking no arguments that creates the service client
+        """
+        self.factory = factory
+        self.service = None
+        self.service_lock = threading.Lock()
 
-    service = Spotify(auth=token)
+    def get_service(self):
+        if self.service is None:
+            with self.service_lock:
+                if self.service is None:
+                    self.service = self.factory()
+        return self.service
 
-    return service
\ No newline at end of file
+    def __getattr__(self, name):
+        return getattr(self.get_service(), name)
@@ -1,4 +1,5 @@
 from event_logger import Logger
+from link_extractor import extract_links, extract_track_id
 
 
 # Object to hold the individual attachments in a message
@@ -9,25 +10,10 @@ class SlackAttachment:
         self.service_name = attachment_json['service_name']
         self.title = attachment_json['title']
         self.from_url = attachment_json['from_url']
+        # The YouTube channel or Spotify artist, where Slack's unfurl gives one
+        self.artist = attachment_json.get('author_name')
         # self.service_icon = attachment_json['service_icon']
-        self.id = None
-        if self.service_name == 'YouTube':
-            temp_id = ''
-            if '.be/' in self.from_url:
-                temp_id = self.from_url.split('.be/')[1]
-                pass
-            elif 'watch' in self.from_url:
-                temp_id = self.from_url.split('?v=')[1]
-                pass
-            self.id = temp_id.split('&')[0]
-            pass
-        elif self.service_name == 'Spotify' and 'track' in self.from_url:
-            if '?' in self.from_url:
-                self.from_url = self.from_url.split('?')[0]
-            if self.from_url.count(':') > 1:
-                self.id = self.from_url.split(':')[-1]
-            else:
-                self.id = self.from_url.split('track/')[1]
+        self.id = extract_track_id(self.service_name, self.from_url)
         pass
 
 
@@ -61,6 +47,8 @@ class SlackMessage:
         else:
             self.user = None
         self.text = message_json['text']
+        # Links in the text itself, available before Slack has unfurled them into attachments
+        self.links = extract_links(self.text)
         self.timestamp = message_json['ts']
         self.attachments = None
         if 'attachments' in message_json:
@@ -85,3 +73,7 @@ class SlackEvent:
         if 'message' in event_json:
             self.message = SlackMessage(event_json['message'])
             pass
+        elif self.type == 'message' and 'subtype' not in event_json and 'text' in event_json and 'ts' in event_json:
+            # A newly posted message, which carries its content at the top level of the event
+            self.message = SlackMessage(event_json)
+            pass
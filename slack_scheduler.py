@@ -0,0 +1,218 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from json import dumps as json_dumpstring
+from itertools import count
+import threading
+import time
+
+from event_logger import Logger
+from metrics import timed, SLACK_CALL_SECONDS, SLACK_CALL_ERRORS
+
+PRIORITY_COMMAND = 0
+PRIORITY_REPLY = 1
+PRIORITY_DEFAULT = 2
+PRIORITY_REACTION = 3
+
+# Requests per second allowed for each of Slack's Web API rate limit tiers, with the burst each may make up to
+TIER_LIMITS = {
+    'tier1': (1 / 60, 1),
+    'tier2': (20 / 60, 3),
+    'tier3': (50 / 60, 5),
+    'tier4': (100 / 60, 10),
+    'post_message': (1, 3)
+}
+
+METHOD_TIERS = {
+    'chat.postMessage': 'post_message',
+    'files.upload': 'tier2',
+    'users.list': 'tier2',
+    'conversations.history': 'tier3',
+    'reactions.add': 'tier3',
+    'im.open': 'tier3',
+    'users.info': 'tier4'
+}
+DEFAULT_TIER = 'tier3'
+DEFAULT_RETRY_AFTER = 1
+DEFAULT_SENDERS = 4
+
+
+def copy_outcome(source, target):
+    """
+    Resolves one Future with the result or exception of another, already completed, Future.
+    """
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing a steady number of requests per second, with short bursts up to its capacity. Can be paused
+    outright when Slack asks for requests to stop for a while.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_filled = time.monotonic()
+        self.paused_until = 0
+
+    def time_until_available(self):
+        """
+        :return: Number of seconds until a request can be made, 0 if one can be made now
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_filled) * self.rate)
+        self.last_filled = now
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class ScheduledCall:
+    """
+    A Slack API call waiting to be sent, and the Future its response is delivered through
+    """
+
+    def __init__(self, priority, sequence, method, kwargs, key):
+        self.priority = priority
+        self.sequence = sequence
+        self.method = method
+        self.kwargs = kwargs
+        self.key = key
+        self.future = Future()
+
+
+class SlackScheduler:
+    """
+    Single route for every outbound Slack Web API call. Calls are queued in priority lanes and sent as fast as the rate
+    limit tier of their method allows, so replies to commands go out ahead of reactions during a burst. Identical calls
+    still waiting to be sent are merged into one, and calls rejected as rate limited are put back and retried once
+    Slack's Retry-After has passed, rather than being lost.
+    """
+
+    def __init__(self, slack_service, senders=DEFAULT_SENDERS, tier_limits=TIER_LIMITS):
+        """
+        :param slack_service: The SlackClient through which calls are made
+        :param senders: Number of calls that can be in flight at once
+        :param tier_limits: Dictionary of rate limit tier to its requests per second and burst, as per TIER_LIMITS
+        """
+        self.slack_service = slack_service
+        self.buckets = {tier: TokenBucket(rate, capacity) for tier, (rate, capacity) in tier_limits.items()}
+        self.waiting = []
+        self.waiting_by_key = {}
+        self.sequence = count()
+        self.rate_limited_calls = 0
+        self.merged_calls = 0
+        self.condition = threading.Condition()
+        self.sender_pool = ThreadPoolExecutor(max_workers=senders)
+        self.schedule_thread = threading.Thread(target=self._schedule, daemon=True, name='slack-scheduler')
+        self.schedule_thread.start()
+
+    @staticmethod
+    def get_tier(method):
+        return METHOD_TIERS.get(method, DEFAULT_TIER)
+
+    def submit(self, method, priority=PRIORITY_DEFAULT, **kwargs):
+        """
+        Queues a call to the Slack API. If an identical call is already waiting, the two are merged and it is sent once.
+        :param method: Name of the Slack API method
+        :param priority: Lane to queue the call in, lower values being sent first
+        :param kwargs: Arguments to the API method
+        :return: Future resolving to the response of the call
+        """
+        key = method + json_dumpstring(kwargs, sort_keys=True, default=str)
+        with self.condition:
+            existing_call = self.waiting_by_key.get(key)
+            if existing_call is not None:
+                self.merged_calls += 1
+                if priority < existing_call.priority:
+                    existing_call.priority = priority
+                return existing_call.future
+            scheduled_call = ScheduledCall(priority, next(self.sequence), method, kwargs, key)
+            self.waiting.append(scheduled_call)
+            self.waiting_by_key[key] = scheduled_call
+            self.condition.notify()
+            return scheduled_call.future
+
+    def call(self, method, priority=PRIORITY_DEFAULT, **kwargs):
+        """
+        Queues a call to the Slack API and waits for its response.
+        :return: The response of the call
+        """
+        return self.submit(method, priority, **kwargs).result()
+
+    def _next_ready_call(self):
+        """
+        Picks the highest priority waiting call whose rate limit allows it to be sent now.
+        :return: Tuple of the call to send (or None) and the number of seconds until one could next be sent
+        """
+        shortest_wait = None
+        for scheduled_call in sorted(self.waiting, key=lambda waiting: (waiting.priority, waiting.sequence)):
+            wait = self.buckets[self.get_tier(scheduled_call.method)].time_until_available()
+            if wait == 0:
+                return scheduled_call, 0
+            if shortest_wait is None or wait < shortest_wait:
+                shortest_wait = wait
+        return None, shortest_wait
+
+    def _schedule(self):
+        while True:
+            with self.condition:
+                scheduled_call, wait = self._next_ready_call()
+                while scheduled_call is None:
+                    self.condition.wait(wait)
+                    scheduled_call, wait = self._next_ready_call()
+                self.buckets[self.get_tier(scheduled_call.method)].take()
+                self.waiting.remove(scheduled_call)
+                del self.waiting_by_key[scheduled_call.key]
+            self.sender_pool.submit(self._send, scheduled_call)
+
+    def _send(self, scheduled_call):
+        try:
+            with timed(SLACK_CALL_SECONDS, SLACK_CALL_ERRORS, method=scheduled_call.method):
+                response = self.slack_service.api_call(scheduled_call.method, **scheduled_call.kwargs)
+        except Exception as error:
+            scheduled_call.future.set_exception(error)
+            return
+
+        if response is not None and not response.get('ok', True):
+            SLACK_CALL_ERRORS.inc(method=scheduled_call.method, error=response.get('error'))
+
+        if response is not None and response.get('error') == 'ratelimited':
+            retry_after = float(response.get('headers', {}).get('Retry-After', DEFAULT_RETRY_AFTER))
+            Logger.slack_rate_limited(scheduled_call.method, retry_after)
+            with self.condition:
+                self.rate_limited_calls += 1
+                self.buckets[self.get_tier(scheduled_call.method)].pause(retry_after)
+                existing_call = self.waiting_by_key.get(scheduled_call.key)
+                if existing_call is not None:
+                    existing_call.future.add_done_callback(
+                        lambda completed: copy_outcome(completed, scheduled_call.future))
+                else:
+                    self.waiting.append(scheduled_call)
+                    self.waiting_by_key[scheduled_call.key] = scheduled_call
+                self.condition.notify()
+            return
+
+        scheduled_call.future.set_result(response)
+
+    def stats(self):
+        """
+        :return: Dictionary of the number of calls waiting, merged into others and rejected as rate limited
+        """
+        with self.condition:
+            return {
+                'waiting': len(self.waiting),
+                'merged': self.merged_calls,
+                'rate_limited': self.rate_limited_calls
+            }
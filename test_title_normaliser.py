@@ -0,0 +1,21 @@
+from json import load as json_load
+from os import path
+
+import pytest
+
+from title_normaliser import normalise_title, normalise_titles
+
+CORPUS_LOCATION = path.join(path.dirname(path.abspath(__file__)), 'title_corpus.json')
+
+with open(CORPUS_LOCATION, 'r', encoding='utf-8') as corpus_file:
+    GOLDEN_CORPUS = json_load(corpus_file)
+
+
+@pytest.mark.parametrize('title, expected', GOLDEN_CORPUS)
+def test_golden_title_normalises_as_expected(title, expected):
+    assert normalise_title(title) == expected
+
+
+def test_batch_normalisation_matches_single_titles():
+    titles = [title for title, _ in GOLDEN_CORPUS]
+    assert normalise_titles(titles) == [expected for _, expected in GOLDEN_CORPUS]
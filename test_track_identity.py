@@ -0,0 +1,67 @@
+import pytest
+
+from track_identity import TrackIdentityIndex, make_fingerprint, MATCHED_BY_ID, MATCHED_BY_ISRC, \
+    MATCHED_BY_FINGERPRINT, MATCHED_BY_SEARCH
+
+
+@pytest.fixture
+def index(tmp_path):
+    track_identity = TrackIdentityIndex(str(tmp_path / 'track_identity.db'))
+    yield track_identity
+    track_identity.close()
+
+
+def test_fingerprint_needs_an_artist():
+    assert make_fingerprint('Song') is None
+    assert make_fingerprint('Song', 'Artist') == make_fingerprint('Artist - Song (feat. Someone)')
+
+
+def test_same_isrc_resolves_to_one_song(index):
+    first = index.resolve('Spotify', 'T1', 'Artist - Song', 'X')
+    second = index.resolve('Spotify', 'T2', 'Artist - Song (Remastered)', 'X')
+    assert second.identity_id == first.identity_id
+    assert second.track_ids == {'Spotify': ['T1', 'T2']}
+    assert second.matched_by == {'T1': MATCHED_BY_ISRC, 'T2': MATCHED_BY_ISRC}
+
+
+def test_isrc_learnt_later_merges_the_songs(index):
+    first = index.resolve('Spotify', 'T1', 'Artist - Song', 'X')
+    second = index.resolve('Spotify', 'T2', 'Artist - Song', None)
+    assert second.identity_id != first.identity_id
+
+    merged = index.resolve('Spotify', 'T2', 'Artist - Song', 'X')
+    assert merged.identity_id == first.identity_id
+    assert merged.track_ids == {'Spotify': ['T1', 'T2']}
+    assert merged.matched_by['T2'] == MATCHED_BY_ISRC
+    assert index.get(second.identity_id).identity_id == first.identity_id
+
+
+def test_link_returns_the_song_merged_into(index):
+    first = index.resolve('Spotify', 'T1', 'Artist - Song', 'X')
+    second = index.resolve('YouTube', 'V1', 'Artist - Song (Official Video)')
+    assert second.identity_id != first.identity_id
+
+    identity_id = index.link(second.identity_id, 'Spotify', 'T2', 'Artist - Song', 'X')
+    assert identity_id == first.identity_id
+    assert index.get(identity_id).track_ids == {'Spotify': ['T1', 'T2'], 'YouTube': ['V1']}
+
+    # A link made with the ID from before the merge still reaches the merged song
+    assert index.link(second.identity_id, 'YouTube', 'V2', 'Artist - Song (Lyrics)') == first.identity_id
+    assert index.get(first.identity_id).matched_by['V2'] == MATCHED_BY_SEARCH
+
+
+def test_different_isrc_is_not_merged(index):
+    first = index.resolve('Spotify', 'T1', 'Artist - Song', 'X')
+    identity_id = index.link(first.identity_id, 'Spotify', 'T2', 'Artist - Song', 'Y')
+    assert identity_id == first.identity_id
+    assert index.get(identity_id).isrc == 'X'
+    assert index.get(identity_id).matched_by['T2'] == MATCHED_BY_SEARCH
+
+
+def test_fingerprint_match_is_not_equivalent_on_the_same_service(index):
+    first = index.resolve('YouTube', 'V1', 'Artist - Song')
+    second = index.resolve('YouTube', 'V2', 'Artist - Song (Official Video)')
+    assert second.identity_id == first.identity_id
+    assert second.matched_by == {'V1': MATCHED_BY_ID, 'V2': MATCHED_BY_FINGERPRINT}
+    assert second.get_equivalent_ids('YouTube', 'V2') == []
+    assert second.get_equivalent_ids('YouTube', 'V1') == ['V1']
@@ -0,0 +1,60 @@
+from functools import lru_cache
+import re
+
+DEFAULT_MEMO_SIZE = 16384
+
+# Words which, when found inside brackets, mark the bracketed text as describing the upload rather than the song
+_NOISE_WORDS = r'(?:official|lyrics?|video|audio|hd|hq|4k|remaster(?:ed)?|visuali[sz]er|new|explicit|clean|full)'
+
+# Declarative rule table, applied in a single left-to-right pass. Each rule is a name, the characters a match can begin
+# with, the pattern it matches and what matched text is replaced with. Where rules overlap at the same position the
+# earliest in the table wins. The first characters let the combined pattern skip most positions without trying every
+# rule at each of them.
+TITLE_RULES = (
+    ('square_brackets', '[', r'\[[^\]]*\]', ' '),
+    ('curly_brackets', '{', r'\{[^}]*\}', ' '),
+    ('noise_parentheses', '(', r'\([^()]*\b' + _NOISE_WORDS + r'\b[^()]*\)', ' '),
+    ('topic_suffix', '-', r'-\s*topic\s*$', ''),
+    ('official_suffix', '-|~', r'(?<=\s)[-|~]\s*(?:official\s+)?(?:music\s+|lyrics?\s+)?(?:video|audio|visuali[sz]er)\b.*$',
+     ''),
+    ('official_phrase', 'o', r'\bofficial\s+(?:music\s+|lyrics?\s+)?(?:video|audio|visuali[sz]er)\b', ' '),
+    ('lyric_video', 'l', r'\blyrics?\s+video\b', ' '),
+    ('quality_tag', 'hu417', r'\b(?:hd|hq|4k|uhd|1080p|720p|480p)\b', ' '),
+    ('featuring', 'f', r'\b(?:featuring|feat|ft)\b\.?', 'feat'),
+    ('quotes', '"“”', r'["“”]', ''),
+    ('dashes', '–—', r'[–—]', '-'),
+)
+
+_FIRST_CHARACTERS = ''.join(sorted(set(''.join(first_characters for _, first_characters, _, _ in TITLE_RULES))))
+_TITLE_PATTERN = re.compile('(?=[{}])(?:{})'.format(
+    re.escape(_FIRST_CHARACTERS),
+    '|'.join('(?P<{}>{})'.format(name, pattern) for name, _, pattern, _ in TITLE_RULES)))
+_REPLACEMENTS = {name: replacement for name, _, _, replacement in TITLE_RULES}
+_SEPARATORS = ' -|~:'
+
+
+def _replace_match(match):
+    return _REPLACEMENTS[match.lastgroup]
+
+
+@lru_cache(maxsize=DEFAULT_MEMO_SIZE)
+def normalise_title(title):
+    """
+    Reduces a track or video title to the form used for searching and comparison: lower case, without text describing
+    the upload (official video, lyrics, HD, Topic channel suffixes and so on), with every way of marking a featured
+    artist written as 'feat' and with whitespace collapsed. Results are memoised.
+    :param title: The title as posted or as returned by a service
+    :return: The normalised title
+    """
+    if title is None:
+        return ''
+    return ' '.join(_TITLE_PATTERN.sub(_replace_match, title.lower()).split()).strip(_SEPARATORS)
+
+
+def normalise_titles(titles):
+    """
+    Normalises many titles at once, as per normalise_title.
+    :param titles: Iterable of titles
+    :return: List of the normalised titles, in the same order
+    """
+    return [normalise_title(title) for title in titles]
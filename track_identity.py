@@ -0,0 +1,219 @@
+import re
+import sqlite3
+import threading
+
+from title_normaliser import normalise_title
+
+DEFAULT_IDENTITY_LOCATION = 'track_identity.db'
+
+# How a track came to be recorded against its song
+MATCHED_BY_ID = 'id'
+MATCHED_BY_ISRC = 'isrc'
+MATCHED_BY_FINGERPRINT = 'fingerprint'
+MATCHED_BY_SEARCH = 'search'
+
+_FEATURING_CLAUSE = re.compile(r'\(?\bfeat\b[^()\-]*\)?')
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def make_fingerprint(title, artist=None):
+    """
+    Reduces a song's artist and title to the words identifying it, for matching the same song across services when no
+    ISRC is known: the normalised "artist - title" without featured artists or punctuation. A title already leading
+    with its artist is used as it is; any other has the artist put in front. Words marking a different version (remix,
+    live...) are kept, so different versions keep different fingerprints.
+    :param title: The title as posted or as returned by a service
+    :param artist: Name of the song's artist, where its service gives one
+    :return: The fingerprint, or None if no artist is known, as a title alone does not identify a song
+    """
+    normalised_title = normalise_title(title)
+    if ' - ' not in normalised_title:
+        if not artist:
+            return None
+        normalised_title = '{} - {}'.format(normalise_title(artist), normalised_title)
+    fingerprint = ' '.join(_NON_WORD.sub(' ', _FEATURING_CLAUSE.sub(' ', normalised_title)).split())
+    return fingerprint or None
+
+
+class CanonicalTrack:
+    """
+    A single song, along with every track ID it is known by on each service
+    """
+
+    def __init__(self, identity_id, isrc, fingerprint, track_ids, titles, matched_by):
+        """
+        :param identity_id: Local ID of the song
+        :param isrc: International Standard Recording Code of the song, if known
+        :param fingerprint: Fingerprint of the song's artist and title, as per make_fingerprint
+        :param track_ids: Dictionary of service name to the list of IDs the song is known by on that service
+        :param titles: Dictionary of track ID to the title given to it by its service
+        :param matched_by: Dictionary of track ID to how the track was matched to the song, one of the MATCHED_BY values
+        """
+        self.identity_id = identity_id
+        self.isrc = isrc
+        self.fingerprint = fingerprint
+        self.track_ids = track_ids
+        self.titles = titles
+        self.matched_by = matched_by
+
+    def get_equivalent_ids(self, service, track_id=None):
+        """
+        Lists the IDs on a service that can stand in for one another, any of which in a playlist meaning the song is
+        present. A fingerprint match is good enough to find a song on another service, but not to take two tracks on
+        the same service for the same song, so tracks matched by fingerprint alone are left out.
+        :param service: Name of the service
+        :param track_id: ID of the track the equivalents are wanted for, if it is one of the song's own
+        :return: List of track IDs, empty if the track itself was matched by fingerprint alone
+        """
+        if track_id is not None and self.matched_by.get(track_id) == MATCHED_BY_FINGERPRINT:
+            return []
+        return [equivalent_id for equivalent_id in self.track_ids.get(service, [])
+                if self.matched_by.get(equivalent_id) != MATCHED_BY_FINGERPRINT]
+
+
+class TrackIdentityIndex:
+    """
+    Maps the IDs of tracks on every service onto the songs they are recordings of, so that the same song reached
+    through a different Spotify release or YouTube upload is recognised rather than cross-searched and added again.
+    Songs are keyed on their ISRC where Spotify gives one, and otherwise on a fingerprint of their artist and title.
+    Held in SQLite so that it survives restarts of the bot.
+    """
+
+    def __init__(self, db_path=DEFAULT_IDENTITY_LOCATION):
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+        # Songs merged into another while this index is open, so that an ID already handed out still finds its song
+        self.merged_ids = {}
+        with self.lock, self.connection:
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS identities (
+                    identity_id INTEGER PRIMARY KEY,
+                    isrc TEXT UNIQUE,
+                    fingerprint TEXT
+                );
+                CREATE INDEX IF NOT EXISTS identities_by_fingerprint ON identities (fingerprint);
+                CREATE TABLE IF NOT EXISTS service_tracks (
+                    service TEXT NOT NULL,
+                    track_id TEXT NOT NULL,
+                    identity_id INTEGER NOT NULL,
+                    title TEXT,
+                    matched_by TEXT,
+                    PRIMARY KEY (service, track_id)
+                );
+                CREATE INDEX IF NOT EXISTS service_tracks_by_identity ON service_tracks (identity_id);
+            ''')
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(service_tracks)')]
+            if 'matched_by' not in columns:
+                # Indexes created before matches were recorded by kind cannot tell fingerprint matches apart
+                self.connection.execute('ALTER TABLE service_tracks ADD COLUMN matched_by TEXT')
+
+    def get(self, identity_id):
+        """
+        :param identity_id: Local ID of the song
+        :return: The CanonicalTrack for the song
+        """
+        with self.lock:
+            identity_id = self._current_identity_id(identity_id)
+            isrc, fingerprint = self.connection.execute('SELECT isrc, fingerprint FROM identities WHERE identity_id = ?',
+                                                        (identity_id,)).fetchone()
+            rows = self.connection.execute('SELECT service, track_id, title, matched_by FROM service_tracks '
+                                           'WHERE identity_id = ? ORDER BY rowid', (identity_id,)).fetchall()
+        track_ids = {}
+        titles = {}
+        matched_by = {}
+        for service, track_id, title, track_matched_by in rows:
+            track_ids.setdefault(service, []).append(track_id)
+            titles[track_id] = title
+            matched_by[track_id] = track_matched_by
+        return CanonicalTrack(identity_id, isrc, fingerprint, track_ids, titles, matched_by)
+
+    def _current_identity_id(self, identity_id):
+        while identity_id in self.merged_ids:
+            identity_id = self.merged_ids[identity_id]
+        return identity_id
+
+    def _find_identity_id(self, service, track_id, isrc, fingerprint):
+        row = self.connection.execute('SELECT identity_id, matched_by FROM service_tracks '
+                                      'WHERE service = ? AND track_id = ?', (service, track_id)).fetchone()
+        if row is not None:
+            return row
+        if isrc is not None:
+            row = self.connection.execute('SELECT identity_id FROM identities WHERE isrc = ?', (isrc,)).fetchone()
+            if row is not None:
+                return row[0], MATCHED_BY_ISRC
+        if fingerprint is not None:
+            # A song whose ISRC is known to differ is a different recording, however alike the titles are
+            row = self.connection.execute('SELECT identity_id FROM identities WHERE fingerprint = ? AND '
+                                          '(isrc IS NULL OR isrc = ?) ORDER BY identity_id',
+                                          (fingerprint, isrc)).fetchone()
+            if row is not None:
+                return row[0], MATCHED_BY_FINGERPRINT
+        return None, None
+
+    def resolve(self, service, track_id, title, isrc=None, artist=None):
+        """
+        Finds the song a track is a recording of, by its ID, then its ISRC, then the fingerprint of its artist and
+        title, recording the song if it is new and the track against it if the track is.
+        :param service: Name of the service the track is on
+        :param track_id: ID of the track on that service
+        :param title: Title of the track
+        :param isrc: ISRC of the track, if known
+        :param artist: Name of the track's artist, if known
+        :return: The CanonicalTrack for the song
+        """
+        fingerprint = make_fingerprint(title, artist)
+        with self.lock, self.connection:
+            identity_id, matched_by = self._find_identity_id(service, track_id, isrc, fingerprint)
+            if identity_id is None:
+                identity_id = self.connection.execute('INSERT INTO identities (isrc, fingerprint) VALUES (?, ?)',
+                                                      (isrc, fingerprint)).lastrowid
+                matched_by = MATCHED_BY_ID
+            identity_id = self._link(identity_id, service, track_id, title, isrc, matched_by)
+            return self.get(identity_id)
+
+    def link(self, identity_id, service, track_id, title, isrc=None):
+        """
+        Records a track as a recording of the given song, such as the track found when cross-searching for it.
+        :param identity_id: Local ID of the song
+        :param service: Name of the service the track is on
+        :param track_id: ID of the track on that service
+        :param title: Title of the track
+        :param isrc: ISRC of the track, if known
+        :return: Local ID of the song, which differs from the one given if the track's ISRC showed it to be the same
+        song as another, and the two were merged
+        """
+        with self.lock, self.connection:
+            identity_id = self._current_identity_id(identity_id)
+            row = self.connection.execute('SELECT identity_id, matched_by FROM service_tracks '
+                                          'WHERE service = ? AND track_id = ?', (service, track_id)).fetchone()
+            # A track already recorded against the song keeps the kind of match it was recorded by
+            matched_by = row[1] if row is not None and row[0] == identity_id else MATCHED_BY_SEARCH
+            return self._link(identity_id, service, track_id, title, isrc, matched_by)
+
+    def _link(self, identity_id, service, track_id, title, isrc, matched_by):
+        self.connection.execute('INSERT OR REPLACE INTO service_tracks (service, track_id, identity_id, title, '
+                                'matched_by) VALUES (?, ?, ?, ?, ?)',
+                                (service, track_id, identity_id, title, matched_by))
+        if isrc is None:
+            return identity_id
+        row = self.connection.execute('SELECT identity_id FROM identities WHERE isrc = ?', (isrc,)).fetchone()
+        if row is None:
+            if self.connection.execute('UPDATE identities SET isrc = ? WHERE identity_id = ? AND isrc IS NULL',
+                                       (isrc, identity_id)).rowcount == 0:
+                # The song's ISRC is another, so the track stays matched only as well as it was
+                return identity_id
+        elif row[0] != identity_id:
+            # The same recording had been recorded as two songs, found through different services. Merge them.
+            self.connection.execute('UPDATE service_tracks SET identity_id = ? WHERE identity_id = ?',
+                                    (row[0], identity_id))
+            self.connection.execute('DELETE FROM identities WHERE identity_id = ?', (identity_id,))
+            self.merged_ids[identity_id] = row[0]
+            identity_id = row[0]
+        # The track's ISRC is now the song's, which settles that it is a recording of it
+        self.connection.execute('UPDATE service_tracks SET matched_by = ? WHERE service = ? AND track_id = ?',
+                                (MATCHED_BY_ISRC, service, track_id))
+        return identity_id
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
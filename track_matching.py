@@ -0,0 +1,108 @@
+from difflib import SequenceMatcher
+import re
+
+from title_normaliser import normalise_title
+
+DEFAULT_CANDIDATE_COUNT = 5
+DEFAULT_CONFIDENCE_THRESHOLD = 0.6
+
+# Words marking a different version of a song. A candidate containing one the source title does not is penalised.
+VERSION_MARKERS = ('cover', 'remix', 'live', 'acoustic', 'karaoke', 'instrumental', 'sped up', 'slowed', 'nightcore',
+                   'reaction', 'tutorial', '8d audio', 'bass boosted')
+VERSION_MARKER_PENALTY = 0.25
+
+DURATION_TOLERANCE_MS = 5000
+DURATION_MATCH_BONUS = 0.1
+DURATION_MISMATCH_LIMIT_MS = 30000
+DURATION_MISMATCH_PENALTY = 0.2
+
+_VERSION_MARKER_PATTERNS = {marker: re.compile(r'\b{}\b'.format(re.escape(marker))) for marker in VERSION_MARKERS}
+_ISO_DURATION = re.compile(r'P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?')
+
+
+class Candidate:
+    """
+    A single search result under consideration as the match for a cross-searched track
+    """
+
+    def __init__(self, track_id, title, duration_ms=None):
+        self.id = track_id
+        self.title = title
+        self.duration_ms = duration_ms
+        self.score = None
+
+
+def parse_iso_duration(duration):
+    """
+    Converts an ISO 8601 duration, as used by the YouTube API (e.g. PT4M13S), to milliseconds.
+    :param duration: The ISO 8601 duration string
+    :return: Number of milliseconds, or None if the string could not be parsed
+    """
+    match = _ISO_DURATION.fullmatch(duration or '')
+    if match is None:
+        return None
+    parts = {name: int(value) if value else 0 for name, value in match.groupdict().items()}
+    return (((parts['days'] * 24 + parts['hours']) * 60 + parts['minutes']) * 60 + parts['seconds']) * 1000
+
+
+def title_similarity(source_title, candidate_title):
+    """
+    Compares two normalised titles, both as strings and as sets of words so that the same words in a different order
+    (artist and title swapped round, for example) still score highly.
+    :return: Similarity between 0 and 1
+    """
+    sequence_ratio = SequenceMatcher(None, source_title, candidate_title).ratio()
+    source_words = set(source_title.replace('-', ' ').split())
+    candidate_words = set(candidate_title.replace('-', ' ').split())
+    if not source_words or not candidate_words:
+        return sequence_ratio
+    word_overlap = len(source_words & candidate_words) / len(source_words | candidate_words)
+    return max(sequence_ratio, word_overlap)
+
+
+def score_candidate(source_title, candidate, source_duration_ms=None):
+    """
+    Scores how likely a candidate is to be the same recording as the source: title similarity, adjusted by how closely
+    the durations match where both are known, and penalised for each version marker (cover, remix, live...) present in
+    the candidate but not the source.
+    :param source_title: Title of the track being searched for
+    :param candidate: The Candidate to score
+    :param source_duration_ms: Duration of the track being searched for, if known
+    :return: The candidate's score, nominally between 0 and 1
+    """
+    normalised_source = normalise_title(source_title)
+    normalised_candidate = normalise_title(candidate.title)
+    score = title_similarity(normalised_source, normalised_candidate)
+
+    if source_duration_ms is not None and candidate.duration_ms is not None:
+        difference = abs(source_duration_ms - candidate.duration_ms)
+        if difference <= DURATION_TOLERANCE_MS:
+            score += DURATION_MATCH_BONUS
+        elif difference >= DURATION_MISMATCH_LIMIT_MS:
+            score -= DURATION_MISMATCH_PENALTY
+
+    for pattern in _VERSION_MARKER_PATTERNS.values():
+        if pattern.search(normalised_candidate) and not pattern.search(normalised_source):
+            score -= VERSION_MARKER_PENALTY
+
+    return score
+
+
+def choose_best_candidate(source_title, candidates, source_duration_ms=None,
+                          threshold=DEFAULT_CONFIDENCE_THRESHOLD):
+    """
+    Ranks the candidates returned by a search against the track being searched for.
+    :param source_title: Title of the track being searched for
+    :param candidates: List of Candidate objects
+    :param source_duration_ms: Duration of the track being searched for, if known
+    :param threshold: Lowest score a candidate may have and still be accepted
+    :return: Tuple of the best candidate (or None if none reaches the threshold) and the best candidate considered
+    """
+    best_candidate = None
+    for candidate in candidates:
+        candidate.score = score_candidate(source_title, candidate, source_duration_ms)
+        if best_candidate is None or candidate.score > best_candidate.score:
+            best_candidate = candidate
+    if best_candidate is None or best_candidate.score < threshold:
+        return None, best_candidate
+    return best_candidate, best_candidate
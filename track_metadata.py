@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+import threading
+import time
+
+DEFAULT_MAX_METADATA_ENTRIES = 10000
+DEFAULT_METADATA_BATCH_WINDOW = 0.05
+# Largest number of IDs Spotify's tracks endpoint accepts in one request
+DEFAULT_METADATA_BATCH_SIZE = 50
+
+
+class TrackMetadata:
+    """
+    The details of a single Spotify track, as returned by its track endpoints
+    """
+
+    def __init__(self, track_id, name, artists, album, duration_ms, isrc):
+        """
+        :param track_id: The unique ID of the track
+        :param name: Name of the track, without its artists
+        :param artists: List of the names of the track's artists, main artist first
+        :param album: Name of the album the track is on
+        :param duration_ms: Length of the track
+        :param isrc: International Standard Recording Code of the track, if Spotify gives one
+        """
+        self.id = track_id
+        self.name = name
+        self.artists = artists
+        self.album = album
+        self.duration_ms = duration_ms
+        self.isrc = isrc
+
+    @property
+    def title(self):
+        return '{} - {}'.format(self.artists[0], self.name) if self.artists else self.name
+
+    @staticmethod
+    def from_json(track_json):
+        """
+        :param track_json: A full track object from the Spotify API
+        :return: TrackMetadata holding its details
+        """
+        return TrackMetadata(track_json['id'],
+                             track_json['name'],
+                             [artist['name'] for artist in track_json.get('artists', [])],
+                             track_json.get('album', {}).get('name'),
+                             track_json.get('duration_ms'),
+                             track_json.get('external_ids', {}).get('isrc'))
+
+
+class TrackMetadataCache:
+    """
+    Least-recently-used cache of Spotify track metadata. Tracks not held are fetched in the background, the IDs asked
+    for within the batch window being fetched together through the multi-track endpoint, so that nothing needs to wait
+    on a request of its own. Metadata already in hand, such as that returned with search results, is added as it is
+    seen.
+    """
+
+    def __init__(self, fetch_function, max_entries=DEFAULT_MAX_METADATA_ENTRIES,
+                 batch_window=DEFAULT_METADATA_BATCH_WINDOW, max_batch_size=DEFAULT_METADATA_BATCH_SIZE):
+        """
+        :param fetch_function: Callable taking a list of track IDs and returning a list of the same length holding the
+        track JSON for each, or None for tracks that do not exist
+        :param max_entries: Number of tracks held before the least recently used are evicted
+        :param batch_window: Number of seconds the first ID in a batch waits for others to join it
+        :param max_batch_size: Number of IDs at which a batch is fetched without waiting any longer
+        """
+        self.fetch_function = fetch_function
+        self.max_entries = max_entries
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.entries = OrderedDict()
+        self.pending = OrderedDict()
+        self.in_flight = {}
+        self.first_pending_at = None
+        self.hits = 0
+        self.misses = 0
+        self.condition = threading.Condition()
+        self.fetch_thread = threading.Thread(target=self._fetch_when_due, daemon=True, name='track-metadata')
+        self.fetch_thread.start()
+
+    def put(self, metadata):
+        """
+        Adds metadata obtained elsewhere to the cache.
+        :param metadata: TrackMetadata for the track
+        :return: None
+        """
+        with self.condition:
+            self._store(metadata)
+
+    def _store(self, metadata):
+        self.entries[metadata.id] = metadata
+        self.entries.move_to_end(metadata.id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def request(self, track_ids):
+        """
+        Asks for the metadata of several tracks without waiting for it, queueing those not held to be fetched. A track
+        already waiting to be fetched is not queued twice.
+        :param track_ids: List of track IDs
+        :return: Dictionary of track ID to a Future resolving to its TrackMetadata, or None if the track does not exist
+        """
+        futures = {}
+        with self.condition:
+            for track_id in track_ids:
+                if track_id in self.entries:
+                    self.entries.move_to_end(track_id)
+                    self.hits += 1
+                    future = Future()
+                    future.set_result(self.entries[track_id])
+                elif track_id in self.in_flight:
+                    future = self.in_flight[track_id]
+                elif track_id in self.pending:
+                    future = self.pending[track_id]
+                else:
+                    self.misses += 1
+                    future = Future()
+                    self.pending[track_id] = future
+                    if self.first_pending_at is None:
+                        self.first_pending_at = time.monotonic()
+                    self.condition.notify()
+                futures[track_id] = future
+        return futures
+
+    def get(self, track_id):
+        """
+        :param track_id: The unique ID of the track
+        :return: TrackMetadata for the track, fetched first if not held, or None if the track does not exist
+        """
+        return self.request([track_id])[track_id].result()
+
+    def _fetch_when_due(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                while len(self.pending) < self.max_batch_size:
+                    remaining = self.first_pending_at + self.batch_window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = OrderedDict()
+                while self.pending and len(batch) < self.max_batch_size:
+                    track_id, future = self.pending.popitem(last=False)
+                    batch[track_id] = future
+                self.in_flight.update(batch)
+                self.first_pending_at = time.monotonic() if self.pending else None
+            self._fetch(batch)
+
+    def _fetch(self, batch):
+        try:
+            results = [TrackMetadata.from_json(track_json) if track_json is not None else None
+                       for track_json in self.fetch_function(list(batch))]
+        except Exception as error:
+            with self.condition:
+                for track_id in batch:
+                    del self.in_flight[track_id]
+            for future in batch.values():
+                future.set_exception(error)
+            return
+        with self.condition:
+            for metadata in results:
+                if metadata is not None:
+                    self._store(metadata)
+            for track_id in batch:
+                del self.in_flight[track_id]
+        for future, metadata in zip(batch.values(), results):
+            future.set_result(metadata)
+
+    def stats(self):
+        """
+        :return: Dictionary of the number of entries held, and hits and misses since the cache was created
+        """
+        with self.condition:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
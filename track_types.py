@@ -2,9 +2,16 @@
 # Todo: TrackTypes should hold a copy (reference technically) of their relevant service to perform these kinds of
 # actions with
 
-from services import GetSpotifyService
+from playlist_index import get_playlist_index
+from playlist_mirror import MirrorTrack
+from playlist_writer import get_write_buffer
+from metrics import instrumented, TRACK_CALL_SECONDS, TRACK_CALL_ERRORS
 from spotipy import SpotifyException
-from re import sub as regex_substitute
+from googleapiclient.errors import HttpError
+from title_normaliser import normalise_title
+from track_matching import Candidate, choose_best_candidate, parse_iso_duration, DEFAULT_CANDIDATE_COUNT
+from track_metadata import TrackMetadata
+from event_logger import Logger
 
 
 class TrackNotFoundException(Exception):
@@ -13,12 +20,42 @@ class TrackNotFoundException(Exception):
     """
 
 
+class PlaylistEntry:
+    """
+    A single track as read from a page of a playlist, without any of the behaviour of a full Track
+    """
+
+    def __init__(self, track_id, title, duration_ms=None):
+        self.id = track_id
+        self.title = title
+        self.duration_ms = duration_ms
+
+
+class PlaylistPage:
+    """
+    One page of a playlist's contents, along with the token from which the following page can be requested
+    """
+
+    def __init__(self, entries, next_page_token):
+        self.entries = entries
+        self.next_page_token = next_page_token
+
+
 class Track:
     """
     Parent class from which to inherit the base fields required for the functionality provided by the bot
     Intended to be extended by the individual service type implementations.
     """
 
+    # Shared PlaylistMirror, set by the bot, from which playlist contents are read when present
+    playlist_mirror = None
+    # Shared SearchCache, set by the bot, consulted before any cross-search when present
+    search_cache = None
+    # Seconds to hold playlist additions for so they can be written in batches. None to write each one immediately
+    write_buffer_window = None
+    # Largest number of tracks the service accepts in a single batched addition
+    max_batch_size = 1
+
     def __init__(self, track_id, title, username, service, playlist):
         self.id = track_id
         self.title = title
@@ -27,16 +64,108 @@ class Track:
         self.service = service
         self.service_name = ''
         self.playlist_id = playlist
+        self.duration_ms = None
+        self.isrc = None
+        # Name of the track's main artist, where its service gives one apart from the title
+        self.artist = None
+        # Other IDs on this track's service known to be the same song, any of which in the playlist means it is present
+        self.equivalent_ids = []
+        # Whether the track is for work that can wait, such as a backfill, whose calls are not to use the quota reserve
+        self.deferrable = False
 
     def get_own_current_playlist(self):
         raise NotImplementedError
 
+    def get_full_track_info(self):
+        raise NotImplementedError
+
+    def load_track_metadata(self):
+        """
+        Fills in the details used to match the track across services (its duration and ISRC) where the service can
+        supply them without a request of the track's own. Does nothing for services that cannot.
+        """
+        pass
+
+    def get_own_playlist_page(self, page_token=None):
+        raise NotImplementedError
+
     def search_own_service_for_track_title(self):
         raise NotImplementedError
 
+    def normalise_search_title(self, title):
+        raise NotImplementedError
+
+    def format_link(self):
+        raise NotImplementedError
+
     def add_self_to_own_service(self):
         raise NotImplementedError
 
+    @staticmethod
+    def add_tracks_to_own_service(tracks):
+        raise NotImplementedError
+
+    def queue_self_for_own_service(self):
+        """
+        Adds the track to its own service's playlist through the playlist's write buffer, so that it is written in the
+        same request as any other tracks added around the same time. Blocks until the track has been written.
+        :return: None
+        """
+        if self.write_buffer_window is None:
+            self.add_self_to_own_service()
+            return
+        write_buffer = get_write_buffer(self.playlist_id, self.add_tracks_to_own_service, self.write_buffer_window,
+                                        self.max_batch_size)
+        write_buffer.submit(self).result()
+
+    def find_self_in_own_service(self):
+        """
+        Cross-searches the track's own service for the held title, answering from the search cache where a result (or
+        the lack of one) has already been recorded for the same normalised title.
+        :return: True if a track has been found, otherwise False
+        """
+        if self.search_cache is None:
+            return self.search_own_service_for_track_title()
+
+        cache_key = self.search_cache.make_key(self.service_name, self.normalise_search_title(self.title))
+        cached_result = self.search_cache.get(cache_key)
+        if cached_result is not None:
+            if cached_result.is_miss:
+                return False
+            self.id = cached_result.track_id
+            self.title = cached_result.title
+            self.format_link()
+            return True
+
+        if self.search_own_service_for_track_title():
+            self.search_cache.store(cache_key, self.id, self.title)
+            return True
+        self.search_cache.store_miss(cache_key)
+        return False
+
+    def sync_playlist_mirror(self):
+        raise NotImplementedError
+
+    def get_playlist_from_mirror(self):
+        """
+        Brings the local mirror of this track's playlist up to date with the service, fetching only what has changed
+        since the last sync, and reads the playlist contents from it.
+        :return: List of the unique IDs of the tracks currently in the playlist
+        """
+        self.sync_playlist_mirror()
+        return self.playlist_mirror.track_ids(self.playlist_id)
+
+    def get_playlist_index(self):
+        """
+        Retrieves the shared membership index for this track's playlist, which is loaded only when it is first used or
+        has gone stale. The index is loaded from the local mirror where one has been set up, or otherwise from a full
+        scan of the playlist using this track's own get_own_current_playlist.
+        :return: The PlaylistIndex for the playlist this track belongs to
+        """
+        if self.playlist_mirror is not None:
+            return get_playlist_index(self.playlist_id, self.get_playlist_from_mirror)
+        return get_playlist_index(self.playlist_id, self.get_own_current_playlist)
+
     def add_self_to_own_playlist(self):
         """
         Generic method utilising the other overridden methods for an instance of this class to add itself to its own 
@@ -45,14 +174,21 @@ class Track:
         has was already present and therefore did not need to be added.
         """
         if self.id is None:
-            if not self.search_own_service_for_track_title():
+            if not self.find_self_in_own_service():
                 raise TrackNotFoundException
-        playlist = self.get_own_current_playlist()
-        if self.id not in playlist:
-            self.add_self_to_own_service()
-            return True
-        else:
+        playlist_index = self.get_playlist_index()
+        # Reserved before writing, so that the same track posted twice at once is only added once
+        if not playlist_index.try_reserve(self.id, self.equivalent_ids):
             return False
+        try:
+            self.queue_self_for_own_service()
+        except Exception:
+            playlist_index.release(self.id)
+            raise
+        playlist_index.add(self.id)
+        if self.playlist_mirror is not None:
+            self.playlist_mirror.add_track(self.playlist_id, self.service_name, self.id, self.title, self.added_by)
+        return True
 
 
 class YoutubeVideo(Track):
@@ -61,9 +197,88 @@ class YoutubeVideo(Track):
     submission or parsed from a search result
     """
 
+    max_batch_size = 50
+    # Shared YoutubeQuota, set by the bot, charged for every call made when present
+    quota = None
+
     def format_link(self):
         self.link = 'https://www.youtube.com/watch?v={}'.format(self.id)
 
+    def execute_request(self, request, operation, count=1, deferrable=None):
+        """
+        Charges a request to the daily quota and executes it. Should YouTube reject it for exceeding the quota, the
+        quota is recorded as used up so that nothing else is attempted until it resets.
+        :param request: The HttpRequest or BatchHttpRequest to execute
+        :param operation: The API method called, as named in youtube_quota.QUOTA_COSTS
+        :param count: Number of calls the request makes, for batches
+        :param deferrable: Whether the request can wait, as per YoutubeQuota.charge. None for this track's own setting
+        :return: The response to the request
+        """
+        if self.quota is None:
+            return request.execute()
+        self.quota.charge(operation, count, self.deferrable if deferrable is None else deferrable)
+        try:
+            return request.execute()
+        except HttpError as error:
+            if error.resp.status == 403 and b'quotaExceeded' in (error.content or b''):
+                self.quota.exhaust()
+            raise
+
+    @staticmethod
+    def format_youtube_search_string(search_string):
+        """
+        Reduces a title to the same normalised form used for Spotify searches, so that the same song posted with
+        different casing, spacing or featured artist notation maps to the same search.
+        :return: Search string formatted to be suitable to provide to a YouTube video search
+        """
+        return normalise_title(search_string)
+
+    def normalise_search_title(self, title):
+        return self.format_youtube_search_string(title)
+
+    @staticmethod
+    def format_video_title(snippet):
+        """
+        Videos uploaded automatically to an artist's Topic channel are titled with the track name alone, so the artist
+        is taken from the channel name and added to the front.
+        :param snippet: The snippet of the video, as returned by the YouTube API
+        :return: The video's title
+        """
+        title = snippet['title']
+        channel_title = snippet.get('channelTitle', '')
+        if channel_title.endswith(' - Topic'):
+            title = '{} - {}'.format(channel_title[:-len(' - Topic')], title)
+        return title
+
+    @staticmethod
+    def format_channel_artist(channel_title):
+        """
+        :param channel_title: Name of the channel a video was uploaded to
+        :return: The channel name without the ' - Topic' or 'VEVO' that marks an artist's own channels, or None if the
+        video has no channel name
+        """
+        if not channel_title:
+            return None
+        if channel_title.endswith(' - Topic'):
+            return channel_title[:-len(' - Topic')]
+        if channel_title.endswith('VEVO') and len(channel_title) > len('VEVO'):
+            return channel_title[:-len('VEVO')]
+        return channel_title
+
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='YouTube', operation='track_info')
+    def get_full_track_info(self):
+        """
+        Fetches the title and duration of the held video, for videos known only by their ID. The title is left as None
+        if the video does not exist.
+        """
+        video_response = self.execute_request(self.service.videos().list(id=self.id, part='snippet,contentDetails'),
+                                              'videos.list')
+        for video in video_response.get('items', []):
+            self.title = self.format_video_title(video['snippet'])
+            self.artist = self.format_channel_artist(video['snippet'].get('channelTitle'))
+            self.duration_ms = parse_iso_duration(video['contentDetails']['duration'])
+
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='YouTube', operation='list')
     def get_own_current_playlist(self):
         """
         Retrieves list of all videos currently present in the Youtube playlist. Used to prevent attempting to add 
@@ -77,7 +292,7 @@ class YoutubeVideo(Track):
         video_list = []
 
         while video_request:
-            video_query_return = video_request.execute()
+            video_query_return = self.execute_request(video_request, 'playlistItems.list')
             video_response = video_query_return['items']
             for video in video_response:
                 video_list.append(video['snippet']['resourceId']['videoId'])
@@ -88,29 +303,121 @@ class YoutubeVideo(Track):
             )
         return video_list
 
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='YouTube', operation='list_page')
+    def get_own_playlist_page(self, page_token=None):
+        """
+        Retrieves a single page of the YouTube playlist, for working through the playlist a page at a time.
+        :param page_token: Token of the page to retrieve, as returned with the previous page. None for the first page.
+        :return: PlaylistPage holding the videos on the page
+        """
+        video_query_return = self.execute_request(self.service.playlistItems().list(
+            part="snippet", playlistId=self.playlist_id, maxResults=50, pageToken=page_token
+        ), 'playlistItems.list')
+        entries = [PlaylistEntry(video['snippet']['resourceId']['videoId'], video['snippet']['title'])
+                   for video in video_query_return['items']]
+        return PlaylistPage(entries, video_query_return.get('nextPageToken'))
+
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='YouTube', operation='sync')
+    def sync_playlist_mirror(self):
+        """
+        Brings the local mirror of the YouTube playlist up to date. The playlist's own etag is checked first, and if it
+        has changed each page is requested with the etag it was last read with, so only pages that have changed since
+        are downloaded and replaced.
+        :return: None
+        """
+        mirror = self.playlist_mirror
+        playlist_response = self.execute_request(
+            self.service.playlists().list(part='contentDetails', id=self.playlist_id), 'playlists.list')
+        version = playlist_response['etag']
+        if version == mirror.get_sync_version(self.playlist_id):
+            return
+
+        page_number = 0
+        page_token = None
+        while True:
+            stored_page = mirror.get_page(self.playlist_id, page_number)
+            video_request = self.service.playlistItems().list(
+                part="snippet", playlistId=self.playlist_id, maxResults=50, pageToken=page_token
+            )
+            if stored_page is not None and stored_page.page_token == page_token and stored_page.etag is not None:
+                video_request.headers['If-None-Match'] = stored_page.etag
+
+            try:
+                video_query_return = self.execute_request(video_request, 'playlistItems.list')
+                next_page_token = video_query_return.get('nextPageToken')
+                videos = [MirrorTrack(video['snippet']['resourceId']['videoId'],
+                                      video['snippet']['title'],
+                                      None,
+                                      video['snippet'].get('publishedAt'),
+                                      self.service_name)
+                          for video in video_query_return['items']]
+                mirror.replace_page(self.playlist_id, self.service_name, page_number, videos, page_token,
+                                    video_query_return.get('etag'), next_page_token)
+            except HttpError as error:
+                if error.resp.status != 304:
+                    raise
+                next_page_token = stored_page.next_page_token
+
+            page_number += 1
+            if not next_page_token:
+                break
+            page_token = next_page_token
+
+        mirror.truncate_pages(self.playlist_id, page_number)
+        mirror.set_sync_version(self.playlist_id, self.service_name, version)
+
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='YouTube', operation='search')
     def search_own_service_for_track_title(self):
         """
-        Performs a search of the YouTube service based on the track information held in the local variables
+        Performs a search of the YouTube service based on the track information held in the local variables. A handful
+        of candidate videos are fetched in a single request and ranked locally against the title searched for, with
+        their durations fetched to compare as well if the duration of the track being searched for is known.
         :return: True if a track has been successfully found, otherwise False
         """
 
-        search_term = self.title
+        search_term = self.format_youtube_search_string(self.title)
 
-        search_response = self.service.search().list(
+        search_response = self.execute_request(self.service.search().list(
             q=search_term,
             part='id,snippet',
-            maxResults=10
-        ).execute()
+            type='video',
+            maxResults=DEFAULT_CANDIDATE_COUNT
+        ), 'search.list')
 
+        candidates = []
+        artists = {}
         for search_result in search_response.get('items', []):
             if search_result['id']['kind'] == 'youtube#video':
-                self.id = search_result['id']['videoId']
-                self.title = search_result['snippet']['title']
-                self.format_link()
-                return True
+                artists[search_result['id']['videoId']] = \
+                    self.format_channel_artist(search_result['snippet'].get('channelTitle'))
+                candidates.append(Candidate(search_result['id']['videoId'],
+                                            self.format_video_title(search_result['snippet'])))
+
+        if candidates and self.duration_ms is not None:
+            video_response = self.execute_request(self.service.videos().list(
+                id=','.join(candidate.id for candidate in candidates),
+                part='contentDetails'
+            ), 'videos.list')
+            durations = {video['id']: parse_iso_duration(video['contentDetails']['duration'])
+                         for video in video_response.get('items', [])}
+            for candidate in candidates:
+                candidate.duration_ms = durations.get(candidate.id)
+
+        found_video, best_candidate = choose_best_candidate(self.title, candidates, self.duration_ms)
+        if found_video is None:
+            if best_candidate is not None:
+                Logger.cross_search_candidate_rejected(self.service_name, self.title, best_candidate.title,
+                                                       best_candidate.score)
+            return False
 
-        return False
+        self.id = found_video.id
+        self.title = found_video.title
+        self.duration_ms = found_video.duration_ms
+        self.artist = artists.get(found_video.id)
+        self.format_link()
+        return True
 
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='YouTube', operation='insert')
     def add_self_to_own_service(self):
         """
         Barebones call to the YouTube API to add the currently held track to the playlist.
@@ -131,7 +438,44 @@ class YoutubeVideo(Track):
             }
         }
 
-        self.service.playlistItems().insert(part='snippet', body=add_action_body).execute()
+        self.execute_request(self.service.playlistItems().insert(part='snippet', body=add_action_body),
+                             'playlistItems.insert')
+
+    @staticmethod
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='YouTube', operation='batch_insert')
+    def add_tracks_to_own_service(tracks):
+        """
+        Adds several videos to their playlist in a single BatchHttpRequest. All of the videos are expected to share the
+        same service and playlist.
+        :param tracks: List of YoutubeVideo objects to be added, at most 50
+        :return: List holding None for each video added, or the exception raised for it
+        """
+        service = tracks[0].service
+        errors = [None] * len(tracks)
+
+        def record_outcome(request_id, response, exception):
+            errors[int(request_id)] = exception
+
+        batch = service.new_batch_http_request(callback=record_outcome)
+        for position, track in enumerate(tracks):
+            add_action_body = \
+            {
+                'snippet':
+                {
+                    'playlistId': track.playlist_id,
+                    'resourceId':
+                    {
+                        'kind': 'youtube#video',
+                        'videoId': track.id
+                    }
+                }
+            }
+            batch.add(service.playlistItems().insert(part='snippet', body=add_action_body),
+                      request_id=str(position))
+        # The batch may mix tracks posted in Slack with tracks from a backfill, which must not hold the former back
+        tracks[0].execute_request(batch, 'playlistItems.insert', len(tracks),
+                                  all(track.deferrable for track in tracks))
+        return errors
 
     def __init__(self, video_id, video_title, username, service, playlist='PLDQ8Lg2Wj2nGKAL_7nLp8ELghxJgxVdRM'):
         # TODO: Make playlist IDs gettable from a config file / create a playlist with a set name if doesn't exist to
@@ -148,67 +492,106 @@ class SpotifyTrack(Track):
     submission or parsed from a search result
     """
 
+    max_batch_size = 100
+    # Shared TrackMetadataCache, set by the bot, from which track details are read when present
+    metadata_cache = None
+
     @staticmethod
     def format_spotify_search_string(search_string):
         """
-        Strip out anything between square brackets, as it's usually shite.
-        Clear out any sets of parentheses which have certain keywords in to avoid fouling the Spotify search
+        Strip out anything between square brackets, as it's usually shite, along with anything else describing the
+        upload rather than the song, to avoid fouling the Spotify search
         (But not clear everything in brackets, due to some tracks featuring other artists etc)
         :return: Search string formatted to be suitable to provide to a Spotify track search
         """
-        search_string = search_string.lower()
-        search_string = regex_substitute(r' *\[[^)]*\] *', '', search_string)
-        search_string = regex_substitute(r'\(.*official.*\)', '', search_string)
-        search_string = regex_substitute(r'\(.*lyric.*\)', '', search_string)
-        search_string = regex_substitute(r'\(.*new.*\)', '', search_string)
-        return search_string
+        return normalise_title(search_string)
 
+    def normalise_search_title(self, title):
+        return self.format_spotify_search_string(title)
+
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='Spotify', operation='search')
     def search_own_service_for_track_title(self):
         """
-        Performs cross-searching of Spotify when the user has supplied a Youtube link
+        Performs cross-searching of Spotify when the user has supplied a Youtube link. A handful of candidate tracks are
+        fetched in a single request and ranked locally against the title searched for.
         :return: True / False for success / failure of finding a relevant item in the cross - search
         """
         search_string = self.format_spotify_search_string(self.title)
-        search_response = None
-        attempt_successful = False
-
-        while not attempt_successful:
-            try:
-                search_response = self.service.search(search_string, limit=1, type='track')
-                attempt_successful = True
-            except SpotifyException:
-                self.service = GetSpotifyService()
+        search_response = self.service.search(search_string, limit=DEFAULT_CANDIDATE_COUNT, type='track')
 
+        candidates = []
+        isrcs = {}
+        artists = {}
         if 'tracks' in search_response:
-            if len(search_response['tracks']['items']) > 0:
-                found_track = search_response['tracks']['items'][0]
-                self.id = found_track['id']
-                self.title = '{} {} {}'.format(found_track['artists'][0]['name'], '-', found_track['name'])
-                return True
+            for found_track in search_response['tracks']['items']:
+                isrcs[found_track['id']] = found_track.get('external_ids', {}).get('isrc')
+                artists[found_track['id']] = found_track['artists'][0]['name']
+                if self.metadata_cache is not None:
+                    self.metadata_cache.put(TrackMetadata.from_json(found_track))
+                candidates.append(Candidate(found_track['id'],
+                                            '{} {} {}'.format(found_track['artists'][0]['name'], '-',
+                                                              found_track['name']),
+                                            found_track.get('duration_ms')))
+
+        found_track, best_candidate = choose_best_candidate(self.title, candidates, self.duration_ms)
+        if found_track is None:
+            if best_candidate is not None:
+                Logger.cross_search_candidate_rejected(self.service_name, self.title, best_candidate.title,
+                                                       best_candidate.score)
+            return False
 
-        return False
+        self.id = found_track.id
+        self.title = found_track.title
+        self.duration_ms = found_track.duration_ms
+        self.isrc = isrcs.get(found_track.id)
+        self.artist = artists.get(found_track.id)
+        self.format_link()
+        return True
 
     def format_link(self):
         self.link = 'https://open.spotify.com/track/{}'.format(self.id)
 
+    @staticmethod
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='Spotify', operation='track_info')
+    def get_tracks_info(service, track_ids):
+        """
+        Fetches the details of several tracks in a single request.
+        :param service: Spotify service object
+        :param track_ids: List of track IDs, at most 50
+        :return: List holding the track JSON for each ID, or None for those that do not exist
+        """
+        return service.tracks(track_ids)['tracks']
+
     def get_full_track_info(self):
-        track_info = None
-        attempt_successful = False
-        while not attempt_successful:
-            try:
-                track_info = self.service.track(self.id)
-                attempt_successful = True
-            except SpotifyException:
-                self.service = GetSpotifyService()
-        print(track_info)
+        """
+        Fills in the duration and ISRC of the held track, and its title if not known, from the shared metadata cache.
+        Tracks not held by the cache are fetched together with any others asked for at the same time. The title is left
+        as None if the track does not exist.
+        """
+        if self.metadata_cache is not None:
+            metadata = self.metadata_cache.get(self.id)
+        else:
+            track_info = self.get_tracks_info(self.service, [self.id])[0]
+            metadata = TrackMetadata.from_json(track_info) if track_info is not None else None
+        if metadata is None:
+            return
+        self.duration_ms = metadata.duration_ms
+        self.isrc = metadata.isrc
+        if metadata.artists:
+            self.artist = metadata.artists[0]
+        if self.title is None:
+            self.title = metadata.title
+
+    def load_track_metadata(self):
+        self.get_full_track_info()
 
     def __init__(self, track_id, track_title, username, service, playlist='3RBeSdvsH57tbsqNZHS44A'):
         super().__init__(track_id, track_title, username, service, playlist)
         if track_id is not None:
             self.format_link()
-            self.get_full_track_info()
         self.service_name = 'Spotify'
 
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='Spotify', operation='list')
     def get_own_current_playlist(self):
         """
         Retrieves list of all tracks currently present in the Spotify playlist. Used to prevent attempting to add 
@@ -216,33 +599,95 @@ class SpotifyTrack(Track):
         :return: List of unique track IDs currently present in the playlist
         """
         track_list = []
-        attempt_successful = False
-        while not attempt_successful:
-            try:
-                playlist_tracks = \
-                self.service.user_playlist('strongohench', self.playlist_id, fields='tracks, next')[
-                    'tracks']
-                tracks = playlist_tracks['items']
-                for track in tracks:
-                    track_list.append(track['track']['id'])
-                    pass
-                while playlist_tracks['next']:
-                    playlist_tracks = self.service.next(playlist_tracks)
-                    tracks = playlist_tracks['items']
-                    for track in tracks:
-                        track_list.append(track['track']['id'])
-                        pass
-                attempt_successful = True
-            except SpotifyException:
-                self.service = GetSpotifyService()
+        playlist_tracks = \
+        self.service.user_playlist('strongohench', self.playlist_id, fields='tracks, next')[
+            'tracks']
+        tracks = playlist_tracks['items']
+        for track in tracks:
+            track_list.append(track['track']['id'])
+            pass
+        while playlist_tracks['next']:
+            playlist_tracks = self.service.next(playlist_tracks)
+            tracks = playlist_tracks['items']
+            for track in tracks:
+                track_list.append(track['track']['id'])
+                pass
         return track_list
 
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='Spotify', operation='list_page')
+    def get_own_playlist_page(self, page_token=None):
+        """
+        Retrieves a single page of the Spotify playlist, for working through the playlist a page at a time.
+        :param page_token: Offset of the page to retrieve, as returned with the previous page. None for the first page.
+        :return: PlaylistPage holding the tracks on the page
+        """
+        offset = int(page_token) if page_token is not None else 0
+        playlist_tracks = self.service.user_playlist_tracks(
+            'strongohench', self.playlist_id, limit=100, offset=offset,
+            fields='items(track(id,name,duration_ms,artists(name))),next'
+        )
+
+        entries = [PlaylistEntry(item['track']['id'],
+                                 item['track']['artists'][0]['name'] + ' - ' + item['track']['name'],
+                                 item['track'].get('duration_ms'))
+                   for item in playlist_tracks['items'] if item['track'] is not None]
+        next_page_token = str(offset + len(playlist_tracks['items'])) if playlist_tracks['next'] else None
+        return PlaylistPage(entries, next_page_token)
+
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='Spotify', operation='sync')
+    def sync_playlist_mirror(self):
+        """
+        Brings the local mirror of the Spotify playlist up to date. The playlist's snapshot ID changes whenever its
+        contents do, so the tracks are only downloaded again when it differs from the one the mirror was synced with.
+        :return: None
+        """
+        mirror = self.playlist_mirror
+        snapshot_id = self.service.user_playlist('strongohench', self.playlist_id, fields='snapshot_id')['snapshot_id']
+        if snapshot_id == mirror.get_sync_version(self.playlist_id):
+            return
+
+        page_number = 0
+        playlist_tracks = self.service.user_playlist_tracks(
+            'strongohench', self.playlist_id, limit=100,
+            fields='items(added_at,added_by.id,track(id,name,artists(name))),next'
+        )
+        while playlist_tracks:
+            tracks = [MirrorTrack(item['track']['id'],
+                                  item['track']['artists'][0]['name'] + ' - ' + item['track']['name'],
+                                  (item.get('added_by') or {}).get('id'),
+                                  item.get('added_at'),
+                                  self.service_name)
+                      for item in playlist_tracks['items'] if item['track'] is not None]
+            mirror.replace_page(self.playlist_id, self.service_name, page_number, tracks)
+            page_number += 1
+            playlist_tracks = self.service.next(playlist_tracks) if playlist_tracks['next'] else None
+
+        mirror.truncate_pages(self.playlist_id, page_number)
+        mirror.set_sync_version(self.playlist_id, self.service_name, snapshot_id)
+
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='Spotify', operation='insert')
     def add_self_to_own_service(self):
         """
         Adds the supplied track to the playlist (if not already present).
         """
         self.service.user_playlist_add_tracks('strongohench', self.playlist_id, [self.id])
 
+    @staticmethod
+    @instrumented(TRACK_CALL_SECONDS, TRACK_CALL_ERRORS, service='Spotify', operation='batch_insert')
+    def add_tracks_to_own_service(tracks):
+        """
+        Adds several tracks to their playlist in a single request. All of the tracks are expected to share the same
+        service and playlist. The request succeeds or fails as a whole, so every track shares its outcome.
+        :param tracks: List of SpotifyTrack objects to be added, at most 100
+        :return: List holding None for each track added, or the exception raised for it
+        """
+        try:
+            tracks[0].service.user_playlist_add_tracks('strongohench', tracks[0].playlist_id,
+                                                       [track.id for track in tracks])
+        except SpotifyException as error:
+            return [error] * len(tracks)
+        return [None] * len(tracks)
+
 
 class GooglePlayTrack(Track):
     """
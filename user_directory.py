@@ -0,0 +1,94 @@
+import threading
+import time
+
+from event_logger import Logger
+
+DEFAULT_REFRESH_INTERVAL = 60 * 60
+DEFAULT_PAGE_SIZE = 200
+USER_EVENT_TYPES = ('user_change', 'team_join')
+
+
+class UserDirectory:
+    """
+    Local copy of the names of every user in the workspace, so that looking up who posted a track does not need a
+    round trip to Slack. Loaded in bulk at startup, refreshed periodically in the background and kept current from the
+    user events received over RTM in between.
+    """
+
+    def __init__(self, api_call, refresh_interval=DEFAULT_REFRESH_INTERVAL, page_size=DEFAULT_PAGE_SIZE):
+        """
+        :param api_call: Callable used to make Slack API calls, taking the method name and keyword arguments
+        :param refresh_interval: Number of seconds between full reloads of the directory
+        :param page_size: Number of users requested per page of users.list
+        """
+        self.api_call = api_call
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self.usernames = {}
+        self.lock = threading.Lock()
+        self.refresh_thread = None
+
+    def load(self):
+        """
+        Replaces the directory with the full list of users, paging through users.list.
+        :return: None
+        """
+        usernames = {}
+        cursor = None
+        while True:
+            response = self.api_call('users.list', limit=self.page_size, cursor=cursor)
+            if response is None or not response.get('ok', False):
+                raise RuntimeError('users.list failed: {}'.format(None if response is None else response.get('error')))
+            for member in response['members']:
+                usernames[member['id']] = member['name']
+            cursor = response.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                break
+        with self.lock:
+            self.usernames = usernames
+
+    def start_refreshing(self):
+        """
+        Starts reloading the directory in the background every refresh interval, if not already doing so.
+        :return: None
+        """
+        if self.refresh_thread is not None:
+            return
+        self.refresh_thread = threading.Thread(target=self._refresh, daemon=True, name='user-directory-refresh')
+        self.refresh_thread.start()
+
+    def _refresh(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.load()
+            except Exception as error:
+                Logger.user_directory_refresh_failed(error)
+
+    def handle_event(self, event):
+        """
+        Updates the directory from a user_change or team_join RTM event.
+        :param event: The source inbound Slack event JSON
+        :return: None
+        """
+        if event.get('type') in USER_EVENT_TYPES and 'user' in event:
+            with self.lock:
+                self.usernames[event['user']['id']] = event['user']['name']
+
+    def get_username(self, user_id):
+        """
+        Looks up the name of a user, only asking Slack directly for users not yet known to the directory.
+        :param user_id: The unique Slack ID of the user in question
+        :return: String value of the user's name, or None if Slack does not know of them either
+        """
+        with self.lock:
+            username = self.usernames.get(user_id)
+        if username is not None:
+            return username
+
+        user_info = self.api_call('users.info', user=user_id)
+        if user_info is None or 'user' not in user_info:
+            return None
+        with self.lock:
+            self.usernames[user_id] = user_info['user']['name']
+        return user_info['user']['name']
@@ -0,0 +1,172 @@
+from datetime import date, datetime, timedelta
+from json import dump as json_dump, load as json_load
+from os import path, replace
+import threading
+import time
+
+DEFAULT_QUOTA_LOCATION = 'youtube_quota.json'
+DEFAULT_DAILY_QUOTA = 10000
+DEFAULT_QUOTA_RESERVE = 2000
+DEFAULT_QUOTA_SAVE_INTERVAL = 10
+
+# Units charged against the daily quota by each YouTube Data API call the bot makes
+QUOTA_COSTS = {
+    'search.list': 100,
+    'videos.list': 1,
+    'playlists.list': 1,
+    'playlistItems.list': 1,
+    'playlistItems.insert': 50
+}
+
+
+class QuotaExhaustedException(Exception):
+    """
+    Raised in place of making a YouTube call when what is left of the day's quota would not cover it
+    """
+    pass
+
+
+def get_pacific_utc_offset(utc_time):
+    """
+    US Pacific time is UTC-7 from 2am on the second Sunday of March to 2am on the first Sunday of November, and UTC-8
+    the rest of the year. Worked out here rather than from a time zone database, which is not always installed.
+    :param utc_time: Naive datetime in UTC
+    :return: timedelta to add to the UTC time to give Pacific time
+    """
+    year = utc_time.year
+    second_sunday_of_march = 8 + (6 - date(year, 3, 8).weekday()) % 7
+    first_sunday_of_november = 1 + (6 - date(year, 11, 1).weekday()) % 7
+    daylight_saving_starts = datetime(year, 3, second_sunday_of_march, 10)
+    daylight_saving_ends = datetime(year, 11, first_sunday_of_november, 9)
+    if daylight_saving_starts <= utc_time < daylight_saving_ends:
+        return timedelta(hours=-7)
+    return timedelta(hours=-8)
+
+
+def get_quota_day(timestamp):
+    """
+    :param timestamp: Unix timestamp
+    :return: The date in US Pacific time at that moment, on which YouTube's daily quota is reckoned, in ISO format
+    """
+    utc_time = datetime.utcfromtimestamp(timestamp)
+    return (utc_time + get_pacific_utc_offset(utc_time)).date().isoformat()
+
+
+def get_next_reset(timestamp):
+    """
+    :param timestamp: Unix timestamp
+    :return: Unix timestamp of the next Pacific midnight, at which YouTube resets the daily quota
+    """
+    utc_time = datetime.utcfromtimestamp(timestamp)
+    pacific_time = utc_time + get_pacific_utc_offset(utc_time)
+    next_midnight = datetime.combine(pacific_time.date() + timedelta(days=1), datetime.min.time())
+    # The offset at midnight is the one in force after the clocks change, should they change before then
+    reset_time = next_midnight - get_pacific_utc_offset(next_midnight - get_pacific_utc_offset(utc_time))
+    return timestamp + (reset_time - utc_time).total_seconds()
+
+
+class YoutubeQuota:
+    """
+    Running total of the YouTube Data API quota used today, charged by every YouTube call the bot makes and written to
+    disk so that it survives restarts. The total is reset at midnight Pacific time, as YouTube's own is. Work that can
+    wait is held back once what is left falls below the reserve, keeping it for links as they are posted.
+    """
+
+    def __init__(self, filepath=DEFAULT_QUOTA_LOCATION, daily_quota=DEFAULT_DAILY_QUOTA, reserve=DEFAULT_QUOTA_RESERVE,
+                 save_interval=DEFAULT_QUOTA_SAVE_INTERVAL):
+        """
+        :param filepath: Location of the file the total is persisted to. None to keep it in memory only.
+        :param daily_quota: Number of units the project is allowed each day
+        :param reserve: Number of units below which the quota is considered low
+        :param save_interval: Minimum number of seconds between writes of the total to disk
+        """
+        self.filepath = filepath
+        self.daily_quota = daily_quota
+        self.reserve = reserve
+        self.save_interval = save_interval
+        self.day = get_quota_day(time.time())
+        self.used = 0
+        self.last_saved = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.load()
+
+    def _roll_over(self):
+        day = get_quota_day(time.time())
+        if day != self.day:
+            self.day = day
+            self.used = 0
+            self.dirty = True
+
+    def charge(self, operation, count=1, deferrable=False):
+        """
+        Records calls about to be made, refusing them if they would take the total over the daily quota.
+        :param operation: The API method called, as named in QUOTA_COSTS
+        :param count: Number of calls made
+        :param deferrable: Whether the calls are for work that can wait, which is refused rather than use the reserve
+        :return: None
+        """
+        cost = QUOTA_COSTS[operation] * count
+        with self.lock:
+            self._roll_over()
+            limit = self.daily_quota - self.reserve if deferrable else self.daily_quota
+            if self.used + cost > limit:
+                raise QuotaExhaustedException('{} needs {} YouTube quota units, {} left{}'.format(
+                    operation, cost, self.daily_quota - self.used, ' above the reserve' if deferrable else ''))
+            self.used += cost
+            self.dirty = True
+        if time.time() - self.last_saved >= self.save_interval:
+            self.save()
+
+    def exhaust(self):
+        """
+        Records the quota as used up, for when YouTube has rejected a call for exceeding it whatever the total here says.
+        :return: None
+        """
+        with self.lock:
+            self._roll_over()
+            self.used = self.daily_quota
+            self.dirty = True
+        self.save()
+
+    def remaining(self):
+        with self.lock:
+            self._roll_over()
+            return self.daily_quota - self.used
+
+    def is_low(self):
+        """
+        :return: Whether what is left of the quota has fallen below the reserve, so work that can wait should
+        """
+        return self.remaining() < self.reserve
+
+    @staticmethod
+    def seconds_until_reset():
+        return get_next_reset(time.time()) - time.time()
+
+    def load(self):
+        if self.filepath is None or not path.isfile(self.filepath):
+            return
+        with open(self.filepath, 'r') as file_in:
+            data = json_load(file_in)
+        with self.lock:
+            if data['day'] == self.day:
+                self.used = data['used']
+
+    def save(self):
+        """
+        Writes the total to disk, if it has changed since it was last saved.
+        :return: None
+        """
+        with self.save_lock:
+            with self.lock:
+                self.last_saved = time.time()
+                if self.filepath is None or not self.dirty:
+                    return
+                data = {'day': self.day, 'used': self.used}
+                self.dirty = False
+            temp_filepath = self.filepath + '.tmp'
+            with open(temp_filepath, 'w') as file_out:
+                json_dump(data, file_out)
+            replace(temp_filepath, self.filepath)